@@ -5,15 +5,14 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 
+from BV_experiments.src.general_platform.Analysis.anal_file_index import get_export_index
+
 # from BV_experiments.anal_Chromatogram import Chromatogram
 # from BV_experiments.anal_hplc_chromatogram import fir_filter, parse_header
 
 def find_files_with_text(directory, text):
-    matching_files = []
-    for path in directory.iterdir():
-        if path.is_file() and text in path.name:
-            matching_files.append(path)
-    return matching_files
+    # the names are searched in the (persistent) index of the folder, the folder is only listed if it changed
+    return get_export_index(directory, file_extension="").find(text)
 
 def check_find_files(matching_files: list):
     # Display the results
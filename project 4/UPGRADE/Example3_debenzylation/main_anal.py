@@ -6,8 +6,10 @@ from loguru import logger
 import socket
 
 from BV_experiments.src.general_platform.Analysis.anal_file_watcher import FileWatch
+from BV_experiments.src.general_platform.Analysis import MultiChannelChromatogram, AnalysisProcessor
+from BV_experiments.src.general_platform.Analysis.anal_result_cache import cached_align
 
-from BV_experiments.src.general_platform.Librarian import DatabaseMongo, ExperimentState
+from BV_experiments.src.general_platform.Librarian import DatabaseMongo, ExperimentState, HplcConfig
 from BV_experiments.src.general_platform.platform_error import IncompleteAnalysis
 
 
@@ -59,7 +61,7 @@ async def analysis_manager(DB: DatabaseMongo,
                     try:
                         # process from txt file to yield and conversion.
                         # fixme
-                        hplc_results = total_analysis(mongo_id)
+                        hplc_results = total_analysis(mongo_id, condition)
                         break
                     except PermissionError:
                         attempts += 1
@@ -67,7 +69,7 @@ async def analysis_manager(DB: DatabaseMongo,
                         await asyncio.sleep(10)
 
                 # fixme: set the fail
-                if not hplc_results["parsed_result_280"]:
+                if not hplc_results.get("channel_3", {}).get("parsed"):
                     logger.error(f'hplc analysis was failed at both wavelength...')
 
                     # TODO: the reason failing might more likely the assigment is fails
@@ -94,15 +96,41 @@ async def analysis_manager(DB: DatabaseMongo,
 
 def total_analysis(mongo_id: str,
                    condition: dict,
-                   cc_is: str = None,
+                   cc_is: str = "is",
+                   hplc_config: HplcConfig | None = None,
+                   use_is_peak: bool = True,
                    ) -> dict:
-    # todo: process from txt file to yield and conversion.
-
-    performance_result_254 = {"Yield_1": 0.8, "Conversion_1": 0.9, "Selectivity_1": 0.95, "Space_time_yield_1": 0.7}
-
-    hplc_results = {"channel_1": {"raw": raw_result_254, "parsed": parse_result_254, "result": performance_result_254},
-                    "channel_2": {"raw": raw_result_215, "parsed": parse_result_215, "result": performance_result},
-                    "channel_3": {"raw": raw_result_280, "parsed": parse_result_280, "result": performance_result}}
+    """
+    process the exported chromatograms of all channels (one pass) to the raw and the aligned peaks and the
+    yield, conversion and space-time yield by the calibration of each channel (False if it fails)
+    :param cc_is: internal standard of the calibration
+    :param hplc_config: default: SecondDebenzylation.hplc_config_info
+    :param use_is_peak: check the internal standard peak in the chromatograms
+    """
+    if hplc_config is None:
+        from BV_experiments.Example3_debenzylation.db_doc import SecondDebenzylation
+        hplc_config = SecondDebenzylation.hplc_config_info
+
+    chroms = MultiChannelChromatogram(mongo_id, hplc_config)
+    raw_results = chroms.txt_to_peaks(use_is_peak=use_is_peak)
+
+    hplc_results = {}
+    for channel, raw_result in raw_results.items():
+        parsed_result = cached_align(chroms.chromatograms[channel].result_key, raw_result,
+                                     hplc_config) if raw_result else False
+        performance_result = False
+        if parsed_result:
+            try:
+                processor = AnalysisProcessor(channel, parsed_result, raw_result, hplc_config)
+                yield_val, conversion = processor.yield_conv_by_cc(cc_is=cc_is)
+                performance_result = {f"Yield_{channel}": yield_val, f"Conversion_{channel}": conversion}
+                if "concentration" in condition and "time" in condition:
+                    performance_result[f"Space_time_yield_{channel}"] = processor.space_time_yield(yield_val,
+                                                                                                   condition)
+            except (IncompleteAnalysis, KeyError) as e:
+                # KeyError: no calibration of the channel
+                logger.error(f"channel {channel}: yield and conversion failed. {e!r}")
+        hplc_results[f"channel_{channel}"] = {"raw": raw_result, "parsed": parsed_result, "result": performance_result}
     return hplc_results
 
 
@@ -1,10 +1,12 @@
 from .anal_file_watcher import FileWatch
 from .anal_hplc_chromatogram import DadChromatogram
+from .anal_multichannel import MultiChannelChromatogram
 from .anal_hplc_result import PeakAlignment, AnalysisProcessor
 
 __all__ = [
     "FileWatch",
     "DadChromatogram",
+    "MultiChannelChromatogram",
     "PeakAlignment",
     "AnalysisProcessor",
 ]
\ No newline at end of file
@@ -1,8 +1,12 @@
 """
 class for  processing chromatograms
+time axis and signal are kept as float64 arrays, the peaks as a structured array (PEAK_DTYPE);
+derived arrays (smoothed, derivative, baseline) are calculated when needed and kept, no DataFrame is copied
 """
 import types
 
+import numpy as np
+from numpy import ndarray
 from scipy.signal import (
     find_peaks,
     peak_widths,
@@ -15,13 +19,48 @@ from scipy.signal import (
 )
 from scipy.integrate import trapezoid
 from pandas import DataFrame
-from numpy import diff, append
 # import pybeads
-import pybaselines
+
+from BV_experiments.src.general_platform.Analysis.anal_baseline import modpoly_baseline
+from BV_experiments.src.general_platform.Analysis.anal_peak_boundary import find_peak_boundaries
+from BV_experiments.src.general_platform.Analysis.anal_smoothing import fir_filter, smooth_region
+
+# one row per peak; lower/upper are positional indices of the peak start/end (inclusive)
+PEAK_DTYPE = np.dtype([
+    ("index", np.int64),
+    ("time", np.float64),
+    ("height", np.float64),
+    ("width", np.float64),
+    ("lower", np.int64),
+    ("upper", np.int64),
+    ("lower_t", np.float64),
+    ("upper_t", np.float64),
+    ("area", np.float64),
+])
+
+
+def _as_array(values) -> ndarray:
+    """float64 array without copy if possible; read-only, so the source (e.g. a DataFrame) is never modified"""
+    array = np.asarray(values, dtype=np.float64).view()
+    array.flags.writeable = False
+    return array
 
 
 class Chromatogram:
     # ideally should inherit from spectrum or sth -> spectrochempy
+    __slots__ = (
+        "time",
+        "signal",
+        "y_ax",
+        "x_ax",
+        "roi",
+        "peaks",
+        "_smoothed",
+        "_baseline",
+        "_derivatives",
+        "_peak_properties",
+        "_processing",
+    )
 
     def __init__(
         self,
@@ -30,14 +69,36 @@ class Chromatogram:
         x_ax: str or int,
         region_of_interest: list = None,
     ):
-        self.chromatogram = chromatogram  # d.raw
+        """
+        :param chromatogram: DataFrame with the signal column y_ax and the time in column (or index) x_ax
+        """
+        time = chromatogram[x_ax] if x_ax in chromatogram.columns else chromatogram.index
+        self._init_arrays(time, chromatogram[y_ax], y_ax, x_ax, region_of_interest)
+
+    @classmethod
+    def from_arrays(
+        cls,
+        time: ndarray,
+        signal: ndarray,
+        region_of_interest: list = None,
+        y_ax: str = "Absorbance [mAu]",
+        x_ax: str = "time (min.)",
+    ) -> "Chromatogram":
+        chrom = cls.__new__(cls)
+        chrom._init_arrays(time, signal, y_ax, x_ax, region_of_interest)
+        return chrom
+
+    def _init_arrays(self, time, signal, y_ax, x_ax, region_of_interest):
+        self.time = _as_array(time)
+        self.signal = _as_array(signal)  # d.raw
         self.y_ax = y_ax
         self.x_ax = x_ax
 
-        self.peaks = None
-        self._peaks = None
+        self.peaks: ndarray | None = None  # structured array (PEAK_DTYPE)
         self._peak_properties = None
-        self.mod_chrom = chromatogram.copy()
+        self._smoothed: ndarray | None = None
+        self._baseline: ndarray | None = None
+        self._derivatives: dict[int, ndarray] = {}
 
         # if given, chromatogram is trimmed to this region
         self.roi = region_of_interest
@@ -51,8 +112,40 @@ class Chromatogram:
             "width": False,
         }
 
-    def process_chromatogram(self, detector_frequency=30):
-        self.smooth_chromatogram(self.smooth_by_fir)
+    # derived arrays
+    @property
+    def smoothed(self) -> ndarray:
+        """median + FIR filtered signal (default parameters if smooth_chromatogram was not called)"""
+        if self._smoothed is None:
+            self.smooth_chromatogram(self.smooth_by_fir)
+        return self._smoothed
+
+    @property
+    def baseline(self) -> ndarray | None:
+        return self._baseline
+
+    @property
+    def mod_signal(self) -> ndarray:
+        """the processed signal: smoothed (if done) and baseline corrected (if done)"""
+        signal = self._smoothed if self._smoothed is not None else self.signal
+        return signal - self._baseline if self._baseline is not None else signal
+
+    @property
+    def derivative(self) -> ndarray:
+        """1st derivative of the processed signal (calculated once)"""
+        return self.get_derivative(1)
+
+    @property
+    def mod_chrom(self) -> DataFrame:
+        """processed chromatogram as DataFrame (built on demand, e.g. for plotting)"""
+        frame = DataFrame({self.x_ax: self.time, self.y_ax: self.mod_signal})
+        for degree, derivative in self._derivatives.items():
+            frame[f"{degree}_deriv"] = derivative
+        return frame
+
+    def process_chromatogram(self, detector_frequency=30, trim=False):
+        """:param trim: process the region of interest only (see smooth_chromatogram)"""
+        self.smooth_chromatogram(self.smooth_by_fir, trim=trim)
         self.global_maximum()
         self.find_peaks(
             fraction_of_largest_peak=80,
@@ -65,14 +158,16 @@ class Chromatogram:
         self.peak_area()
         return self.peaks
 
-    def _trim_chromatogram(self, chrom):
-        try:
-            start = chrom.loc[chrom[self.x_ax] == self.roi[0]].index.values[0]
-            end = chrom.loc[chrom[self.x_ax] == self.roi[1]].index.values[0]
-            chrom = chrom.loc[start:end]
-            return chrom
-        except IndexError:
+    def _roi_slice(self) -> slice:
+        """positional slice of the region of interest"""
+        start, end = np.searchsorted(self.time, self.roi[0]), np.searchsorted(self.time, self.roi[1], side="right")
+        if start >= end or start == len(self.time):
             raise ValueError("Experiment did not contain Chromatogram of valid size")
+        return slice(start, end)
+
+    def _trim_chromatogram(self, signal: ndarray) -> ndarray:
+        # after smooth_chromatogram(trim=True) the time axis is the ROI: the slice is the whole signal
+        return signal[self._roi_slice()]
 
     def _butterworth_lowpass_coeffs(self, cutoff=0.5, sample_rate=30, order=6):
         nyq = 0.5 * sample_rate
@@ -124,18 +219,8 @@ class Chromatogram:
         transition_width: width of transition from path to stop in Hz, rel to nyqvist rate
         attenuation: attenuation of stopband in dB
         """
-
-        nyq_rate = sample_rate / 2.0
-        width = transition_width / nyq_rate
-
-        # Compute the order and Kaiser parameter for the FIR filter.
-        N, beta = kaiserord(attenuation, width)
-
-        # Use firwin with a Kaiser window to create a lowpass FIR filter.
-        taps = firwin(N, cutoff / nyq_rate, window=("kaiser", beta))
-
-        # Use lfilter to filter x with the FIR filter.
-        return lfilter(taps, 1.0, data_to_smooth)
+        # the taps are designed once per parameter set
+        return fir_filter(data_to_smooth, cutoff, sample_rate, transition_width, attenuation)
 
     def median_filter(self, data_to_smooth, window_size=19):
         # perform median filtering, this removes artefacts
@@ -146,35 +231,41 @@ class Chromatogram:
         self,
         smoothing_function: types.MethodType,
         *smoothing_args: list,
+        trim: bool = False,
         **smoothing_kwargs,
     ):
         """
         Different smoothing functions can be plugged in to smooth the chromatogram
         Performs median filtering before other filter to remove artefacts
+        trim: cut the chromatogram to the region of interest. Only the ROI and the margins of the median and FIR
+        filter are smoothed, the smoothed values are the same as smoothing the whole chromatogram (smooth_by_fir only)
         """
         assert isinstance(smoothing_function, types.MethodType)
         assert not self._processing[
             "smoothed"
         ], "you are smoothing your chromatogram multiple times - while that doesn't necessarily do harm, its better to select better parameters."
-        self.mod_chrom[self.y_ax] = self.median_filter(self.mod_chrom[self.y_ax].values, window_size=19)
-        self.mod_chrom[self.y_ax] = smoothing_function(
-            self.mod_chrom[self.y_ax].values, *smoothing_args, **smoothing_kwargs
-        )
+        if trim and self.roi:
+            if smoothing_function.__func__ is not Chromatogram.smooth_by_fir:
+                raise ValueError("only the FIR smoothing can be trimmed to the region of interest.")
+            region = self._roi_slice()
+            fir_kwargs = dict(zip(("cutoff", "sample_rate", "transition_width", "attenuation"), smoothing_args),
+                              **smoothing_kwargs)
+            self._smoothed = smooth_region(self.signal, region, kernel_size=19, **fir_kwargs)
+            self.time, self.signal = self.time[region], self.signal[region]
+        else:
+            smoothed = self.median_filter(self.signal, window_size=19)
+            self._smoothed = np.asarray(smoothing_function(smoothed, *smoothing_args, **smoothing_kwargs),
+                                        dtype=np.float64)
+        self._derivatives.clear()
         self._processing["smoothed"] = True
-        return self.mod_chrom
+        return self._smoothed
 
     def global_maximum(self):
         # no need
         # TODO check for min height or only allow max number of peaks
         # only trim if specified
-        signal = (
-            self.mod_chrom[self.y_ax]
-            if not self.roi
-            else self._trim_chromatogram(self.mod_chrom)[self.y_ax]
-        )
-        signal = list(signal)
-        signal.sort(reverse=True)
-        maximum_y = signal[0]
+        signal = self.mod_signal if not self.roi else self._trim_chromatogram(self.mod_signal)
+        maximum_y = signal.max()
         self._processing["maximum_y"] = maximum_y
         return maximum_y
 
@@ -195,15 +286,20 @@ class Chromatogram:
         assert self._processing[
             "maximum_y"
         ], "Be sure to run Chromatogram.global_maximum() before, otherwise not reference peak height is given."
+        signal = self.mod_signal
         # multiply by 60 to get seconds
-        self._peaks, self._peak_properties = find_peaks(
-            self.mod_chrom[self.y_ax],
+        peaks, self._peak_properties = find_peaks(
+            signal,
             height=self._processing["maximum_y"] / fraction_of_largest_peak,
             prominence=self._processing["maximum_y"] / fraction_of_largest_peak,
             width=[round(minimum_width * detector_frequency * 60), round(maximum_width * detector_frequency * 60)],
             rel_height=0.8,
         )
-        self.peaks = self.mod_chrom.iloc[self._peaks].copy()
+        self.peaks = np.zeros(len(peaks), dtype=PEAK_DTYPE)
+        self.peaks["index"] = peaks
+        self.peaks["time"] = self.time[peaks]
+        self.peaks["height"] = signal[peaks]
+        self.peaks["area"] = np.nan
         self._processing["peaks_detected"] = True
 
     def get_peakwidth(self):
@@ -212,78 +308,54 @@ class Chromatogram:
         assert self._processing[
             "peaks_detected"
         ], "Be sure to run Chromatogram.find_peaks before."
-        widths = peak_widths(
-            self.mod_chrom[self.y_ax], self.peaks.index, rel_height=0.5
-        )
-        self.peaks.insert(2, "width", widths[0])
+        widths = peak_widths(self.mod_signal, self.peaks["index"], rel_height=0.5)
+        self.peaks["width"] = widths[0]
         self._processing["width"] = True
 
-    def get_derivative(self, degree: int = 1):
+    def get_derivative(self, degree: int = 1) -> ndarray:
         """
-
+        derivative of the processed signal, calculated once per degree
         :param degree:
         :return:
         """
-        deriv = diff(self.mod_chrom[self.y_ax], degree)
-        self.mod_chrom[f"{degree}_deriv"] = append(
-            deriv, degree * [0]
-        )  # fill missing values with trailing zeros
+        if degree not in self._derivatives:
+            deriv = np.diff(self.mod_signal, degree)
+            # fill missing values with trailing zeros
+            self._derivatives[degree] = np.append(deriv, degree * [0])
         self._processing["derivative"] = True
+        return self._derivatives[degree]
+
+    def _set_start_end(self, position: int, lower: int | None = None, upper: int | None = None):
+        if lower is not None:
+            self.peaks["lower"][position] = lower
+            self.peaks["lower_t"][position] = self.time[lower]
+        if upper is not None:
+            self.peaks["upper"][position] = upper
+            self.peaks["upper_t"][position] = self.time[upper]
 
     def mod_find_peak_start_end(self):
         # tested, works as replacement
-        from numpy import flip
-
-        for center, base_left, base_right in zip(
-            self._peaks,
+        # Start from find_peaks positions (i.e. width at 80% max)
+        # We rely on the chromatogram to be smoothed at this point!
+        starts, ends = find_peak_boundaries(
+            self.get_derivative(1),
             self._peak_properties["left_ips"],
             self._peak_properties["right_ips"],
-        ):
-            # Start from find_peaks positions (i.e. width at 80% max)
-            left_in_min = self.mod_chrom["1_deriv"].index[int(base_left)]
-            right_in_min = self.mod_chrom["1_deriv"].index[int(base_right)]
-
-            # Failsafe to ensure these are set
-            peak_start = self.mod_chrom["1_deriv"].index[0]
-            peak_end = self.mod_chrom["1_deriv"].index[-1]
-
-            # We rely on the chromatogram to be smoothed at this point!
-            # Iterate left side of peak from right to left (i.e. np.flip)
-            for steps, derivative_value in enumerate(
-                flip(self.mod_chrom["1_deriv"][:left_in_min])
-            ):
-                if derivative_value < 1e-3:
-                    peak_start = self.mod_chrom["1_deriv"].index[
-                        int(base_left) - steps + 1
-                    ]  # +1 ensures non-overlapping peaks
-                    break
-
-            # Iterate right side from left to right
-            for steps, derivative_value in enumerate(
-                self.mod_chrom["1_deriv"][right_in_min:]
-            ):
-                if derivative_value > -1e-3:
-                    peak_end = self.mod_chrom["1_deriv"].index[int(base_right) + steps]
-                    break
-            self.peaks.loc[center, "lower"] = peak_start
-            self.peaks.loc[center, "upper"] = peak_end
-            self.peaks.loc[center, "lower_t"] = self.mod_chrom.loc[peak_start][
-                self.x_ax
-            ]
-            self.peaks.loc[center, "upper_t"] = self.mod_chrom.loc[peak_end][self.x_ax]
+            threshold=1e-3,
+            positional=True,
+        )
+        self.peaks["lower"], self.peaks["upper"] = starts, ends
+        self.peaks["lower_t"], self.peaks["upper_t"] = self.time[starts], self.time[ends]
 
         # clean up: in chromatogram "64675c3048c97f8ffdcc4d4d" a split peak occurs, for which the peak end is
         # determined far to far away, after another peak starts even
         # also a problem: 646b918fae2b3954ff6ccd5d
-        for index, index_next in zip(self.peaks.index, self.peaks.index[1:]):
-            if self.peaks.loc[index, "lower"] >= self.peaks.loc[index_next, "lower"]:
-                self.peaks.loc[index_next, "lower"] = self.peaks.loc[index, "upper"] + 1
-                self.peaks.loc[index, "lower_t"] = self.mod_chrom.loc[self.peaks.loc[index_next, "lower"]][
-                    self.x_ax
-                ]
-            if self.peaks.loc[index, "upper"] >= self.peaks.loc[index_next, "lower"]:
-                self.peaks.loc[index, "upper"] = self.peaks.loc[index_next, "lower"] - 1
-                self.peaks.loc[index, "upper_t"] = self.mod_chrom.loc[self.peaks.loc[index, "upper"]][self.x_ax]
+        for position in range(len(self.peaks) - 1):
+            current, following = self.peaks[position], self.peaks[position + 1]
+            if current["lower"] >= following["lower"]:
+                self._set_start_end(position + 1, lower=current["upper"] + 1)
+            if current["upper"] >= following["lower"]:
+                self._set_start_end(position, upper=following["lower"] - 1)
 
         self._processing["start_end"] = True
 
@@ -298,37 +370,39 @@ class Chromatogram:
             "width"
         ], "Be sure to run Chromatogram.get_peakwidth before. Peak start and end detection takes peakwidth into account."
 
+        deriv = self.get_derivative(1)
+        signal = self.mod_signal
+        peak = self.peaks[self.peaks["index"] == peak_index][0]
         # 3 is ambiguasly added for peaks with a flat base
-        smaller = self.mod_chrom["1_deriv"][: peak_index - 3]
-        larger = self.mod_chrom["1_deriv"][peak_index + 3:]
+        smaller = deriv[: peak_index - 3]
+        larger_start = peak_index + 3
         # initialize w lowest value
-        lower_bound = smaller.argsort()[0]
-        for index in smaller[::-1].index:
+        lower_bound = int(smaller.argsort()[0])
+        for index in range(len(smaller) - 1, -1, -1):
             if (
                 abs(smaller[index]) < max_slope
-                or smaller[index] <= 0 <= smaller[index + 1]
+                or smaller[index] <= 0 <= deriv[index + 1]
             ):
                 lower_bound = index
                 # check if peak end is at least lower in intensity than 50 % of full peak height, also check if it is within half of peak width away from center at least
                 if (
-                    index < (peak_index - self.peaks.loc[peak_index, "width"] / 2)
-                    or self.mod_chrom.loc[lower_bound, self.y_ax]
-                    < 0.5 * self.peaks.loc[peak_index, self.y_ax]
+                    index < (peak_index - peak["width"] / 2)
+                    or signal[lower_bound] < 0.5 * peak["height"]
                 ):
                     break
         # initialize w lowest value
-        for index in larger.index:
+        upper_bound = None
+        for index in range(larger_start, len(deriv)):
             # the slope is positive at the beginning of peak, but negative after maximum, therefore the abs
             if (
-                abs(larger[index]) < max_slope
-                or larger[index] >= 0 >= larger[index - 1]
+                abs(deriv[index]) < max_slope
+                or deriv[index] >= 0 >= deriv[index - 1]
             ):
                 upper_bound = index
                 # check if peak end is at least lower in intensity than 50 % of full peak height, also check if it is within half of peak width away from center at least
                 if (
-                    index > (peak_index + self.peaks.loc[peak_index, "width"] / 2)
-                    or self.mod_chrom.loc[upper_bound, self.y_ax]
-                    < 0.5 * self.peaks.loc[peak_index, self.y_ax]
+                    index > (peak_index + peak["width"] / 2)
+                    or signal[upper_bound] < 0.5 * peak["height"]
                 ):
                     break
         return lower_bound, upper_bound
@@ -338,67 +412,40 @@ class Chromatogram:
             "derivative"
         ], "Be sure to run Chromatogram.get_derivative() before. Peak start and end detection works on derivative."
         # iterate through the peaks found so far and append the peak starta nd end
-        for peak_index in self.peaks.index:
+        for position, peak_index in enumerate(self.peaks["index"]):
             lower, upper = self.find_peak_start_end(peak_index)
-            self.peaks.loc[peak_index, "lower"] = lower
-            self.peaks.loc[peak_index, "upper"] = upper
-            self.peaks.loc[peak_index, "lower_t"] = self.mod_chrom.loc[lower][self.x_ax]
-            self.peaks.loc[peak_index, "upper_t"] = self.mod_chrom.loc[upper][self.x_ax]
+            self._set_start_end(position, lower=lower, upper=upper)
             self._processing["start_end"] = True
 
         # check for split_peaks
-        if len(self.peaks["lower"]) != len(set(self.peaks["lower"])) or len(
-            self.peaks["upper"]
-        ) != len(set(self.peaks["upper"])):
-            print("Split peak detected. Pls inspect visually")
-            if unite_split:
-                # find which one is a duplicate
-                print("Split peak detected. Will try to assume as one peak")
-                if not self.peaks.loc[self.peaks.duplicated(subset="lower")].empty:
-                    duplicate_value = self.peaks.loc[
-                        self.peaks.duplicated(subset="lower")
-                    ]["lower"].values[0]
-                    duplicate_rows = self.peaks[
-                        self.peaks["lower"] == duplicate_value
-                    ].sort_values(by="width")
-                    self.peaks.drop(
-                        duplicate_rows.index[:-1], axis="index", inplace=True
-                    )
-                    print("drop from lower")
-                elif not self.peaks.loc[self.peaks.duplicated(subset="upper")].empty:
-                    duplicate_value = self.peaks.loc[
-                        self.peaks.duplicated(subset="upper")
-                    ]["upper"].values[0]
-                    duplicate_rows = self.peaks[
-                        self.peaks["upper"] == duplicate_value
-                    ].sort_values(by="width")
-                    self.peaks.drop(
-                        duplicate_rows.index[:-1], axis="index", inplace=True
-                    )
-                    print("drop from upper")
-                else:
-                    print(
-                        "No split peak found with same start or same end. Probably start-end between peaks same. check!"
-                    )
+        for bound in ("lower", "upper"):
+            values, counts = np.unique(self.peaks[bound], return_counts=True)
+            if (counts > 1).any():
+                break
+        else:
+            return
+        print("Split peak detected. Pls inspect visually")
+        if unite_split:
+            # find which one is a duplicate
+            print("Split peak detected. Will try to assume as one peak")
+            duplicate_value = values[counts > 1][0]
+            duplicate_rows = np.flatnonzero(self.peaks[bound] == duplicate_value)
+            # keep the widest peak
+            keep = duplicate_rows[np.argmax(self.peaks["width"][duplicate_rows])]
+            self.peaks = np.delete(self.peaks, duplicate_rows[duplicate_rows != keep])
+            print(f"drop from {bound}")
 
     def plot_results(self):
         # simple for now -> only to quickly check reuslts
-        testplot = self.chromatogram.plot(y=self.y_ax, x=self.x_ax)
-        self.mod_chrom.plot(y=self.y_ax, ax=testplot, x=self.x_ax)
-        self.peaks.plot(y=self.y_ax, style="o", ax=testplot, x=self.x_ax)
-        self.mod_chrom.plot(y="1_deriv", ax=testplot, x=self.x_ax)
-        for i in self.peaks.index:
-            testplot.vlines(
-                self.mod_chrom.loc[self.peaks.loc[i, "lower"], self.x_ax], 0, 100
-            )
-            testplot.vlines(
-                self.mod_chrom.loc[self.peaks.loc[i, "upper"], self.x_ax], 0, 100
-            )
-            testplot.text(
-                self.peaks.loc[i, self.x_ax],
-                self.peaks.loc[i, self.y_ax],
-                round(self.peaks.loc[i, "area"], 2),
-            )
+        mod_chrom = self.mod_chrom
+        testplot = DataFrame({self.x_ax: self.time, self.y_ax: self.signal}).plot(y=self.y_ax, x=self.x_ax)
+        mod_chrom.plot(y=self.y_ax, ax=testplot, x=self.x_ax)
+        self.return_peak_table().plot(y=self.y_ax, style="o", ax=testplot, x=self.x_ax)
+        mod_chrom.plot(y="1_deriv", ax=testplot, x=self.x_ax)
+        for peak in self.peaks:
+            testplot.vlines(peak["lower_t"], 0, 100)
+            testplot.vlines(peak["upper_t"], 0, 100)
+            testplot.text(peak["time"], peak["height"], round(peak["area"], 2))
 
     def _baseline_peak_start_end(self, peak_start, peak_end):
         """
@@ -406,10 +453,10 @@ class Chromatogram:
         """
         # take start and end and simply do trapezoidal rule on these 2 point
         # put y values and x values
-        chrom = self.mod_chrom
+        signal = self.mod_signal
         baseline_area = trapezoid(
-            [chrom.loc[peak_start, self.y_ax], chrom.loc[peak_end, self.y_ax]],
-            x=[chrom.loc[peak_start, self.x_ax], chrom.loc[peak_end, self.x_ax]],
+            [signal[peak_start], signal[peak_end]],
+            x=[self.time[peak_start], self.time[peak_end]],
         )
         return baseline_area
 
@@ -419,50 +466,45 @@ class Chromatogram:
         assert (
             False not in self._processing.values()
         ), "Be sure to run peakdetection, smothing and so on before"
-        chrom = self.mod_chrom if on_smoothed else self.chromatogram
+        signal = self.mod_signal if on_smoothed else self.signal
         # hand a slice of chromatogram to trapezoid function
-        for peak in self.peaks.index:
-            current_peak = chrom.loc[
-                self.peaks.loc[peak, "lower"] : self.peaks.loc[peak, "upper"]
-            ]
-            area = trapezoid(current_peak[self.y_ax], x=current_peak[self.x_ax])
+        for peak in self.peaks:
+            current_peak = slice(peak["lower"], peak["upper"] + 1)
+            area = trapezoid(signal[current_peak], x=self.time[current_peak])
             if _peak_start_end_baseline:
                 print(
                     "You are using a baseline subtraction that only gives reasonable results if peaks are baseline "
                     "separated. The only really good usecase are small peaks sitting on a big lump"
                 )
-                area -= self._baseline_peak_start_end(
-                    self.peaks.loc[peak, "lower"], self.peaks.loc[peak, "upper"]
-                )
+                area -= self._baseline_peak_start_end(peak["lower"], peak["upper"])
 
-            self.peaks.loc[peak, "area"] = area
+            peak["area"] = area
 
     def baseline_correction(self, order=1):
-        from numpy import ones
-
         assert self._processing["start_end"], (
             "Make sure to determine peak start and end before baseline calculation. "
             "The peak regions are weighted for the baseline caluculation to get a better baseline"
         )
         # works decently
         # get peak weights - create a mask for the peaks
-        weights = ones(len(self.chromatogram.index))
-        for i in self.peaks.index:
-            weights[
-                int(self.peaks.loc[i, "lower"]) : int(self.peaks.loc[i, "upper"])
-            ] = 0
+        weights = np.ones(len(self.time))
+        for peak in self.peaks:
+            weights[int(peak["lower"]): int(peak["upper"])] = 0
         # perform baseline determination on modified chromatogram
-        baseline = pybaselines.polynomial.modpoly(
-            self.mod_chrom[self.y_ax],
-            self.mod_chrom[self.x_ax],
+        baseline = modpoly_baseline(
+            self.mod_signal,
+            self.time,
             poly_order=order,
             weights=weights,
         )
-        self.mod_chrom[self.y_ax] = self.mod_chrom[self.y_ax] - baseline[0]
+        self._baseline = baseline if self._baseline is None else self._baseline + baseline
+        # the derivatives were taken of the signal before the correction
+        self._derivatives.clear()
         self._processing["baseline"] = True
 
     def return_peak_table(self):
-        return self.peaks[[self.x_ax, self.y_ax, "area"]]
+        return DataFrame({self.x_ax: self.peaks["time"], self.y_ax: self.peaks["height"], "area": self.peaks["area"]},
+                         index=self.peaks["index"])
 
 if __name__ == "__main__":
     from pathlib import Path
@@ -470,15 +512,12 @@ if __name__ == "__main__":
         # r"W:\BS-FlowChemistry\data\exported_chromatograms\6492c295a7f28250ff34bb24 - DAD 2.1L- Channel 1.txt")
         r"W:\BS-FlowChemistry\data\exported_chromatograms\06_10_2024_std_case_3_sugarStock_1mM_10_6_2024 11_53_45 AM_349 - DAD 2.1L- Channel 1.txt")
 
-    from .anal_hplc_chromatogram import parse_header, create_dataset
-
-    header_data, header_lines = parse_header(file_path)
+    from BV_experiments.src.general_platform.Analysis.anal_clarity_reader import read_clarity_ascii
 
-    chromatogram = create_dataset(file_path, header_lines)
-    sp = Chromatogram(
-        chromatogram,
-        "Absorbance [mAu]",
-        "time (min.)",
+    export = read_clarity_ascii(file_path)
+    sp = Chromatogram.from_arrays(
+        export.time,
+        export.signal,
         region_of_interest=[10, 31]
     )
-    sp.process_chromatogram()
\ No newline at end of file
+    sp.process_chromatogram()
@@ -0,0 +1,170 @@
+"""
+store of the parsed background (blank) chromatograms
+the background of a campaign does not change, so it is parsed once per
+(file path, mtime, channel, hplc config) and kept in memory.
+raw and background are aligned on one uniform time grid by linear interpolation (np.interp)
+"""
+import hashlib
+import json
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from numpy import ndarray
+
+from BV_experiments.src.general_platform.Librarian import HplcConfig
+from BV_experiments.src.general_platform.Analysis.anal_clarity_reader import read_clarity_ascii
+
+
+def hplc_config_hash(hplc_config: HplcConfig | dict[str, Any] | None) -> str:
+    """stable hash of the hplc configuration (same content -> same hash, for HplcConfig and its dict)"""
+    if hplc_config is None:
+        return "none"
+    if isinstance(hplc_config, HplcConfig):
+        hplc_config = hplc_config.model_dump()
+    content = json.dumps(hplc_config, sort_keys=True, default=str)
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+class BackgroundChromatogram:
+    """
+    parsed background on its raw time grid
+    (it is subtracted before the smoothing, which is not linear (median filter): no smoothed background is kept)
+    """
+
+    def __init__(self,
+                 file_path: Path,
+                 channel: int,
+                 time: ndarray,
+                 signal: ndarray,
+                 ):
+        self.file_path = file_path
+        self.channel = channel
+        self.time = time
+        self.signal = signal
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({"Absorbance [mAu]": self.signal},
+                            index=pd.Index(self.time, name="time (min.)"))
+
+
+class BackgroundStore:
+    """
+    LRU store of BackgroundChromatogram.
+    key: (file path, mtime, channel, hplc config hash)
+    """
+
+    def __init__(self, maxsize: int = 16):
+        self.maxsize = maxsize
+        self._store: OrderedDict[tuple[str, int, int, str], BackgroundChromatogram] = OrderedDict()
+
+    def get(self,
+            bg_file_path: Path | str,
+            channel: int,
+            hplc_config: HplcConfig | dict[str, Any] | None = None,
+            ) -> BackgroundChromatogram:
+        bg_file_path = Path(bg_file_path)
+        key = (str(bg_file_path), bg_file_path.stat().st_mtime_ns, channel, hplc_config_hash(hplc_config))
+
+        if key in self._store:
+            self._store.move_to_end(key)
+            return self._store[key]
+
+        export = read_clarity_ascii(bg_file_path)
+        background = BackgroundChromatogram(bg_file_path, channel, export.time, export.signal)
+        self._store[key] = background
+        while len(self._store) > self.maxsize:
+            self._store.popitem(last=False)
+        return background
+
+    def clear(self):
+        self._store.clear()
+
+    def __len__(self):
+        return len(self._store)
+
+
+_background_store: BackgroundStore | None = None
+
+
+def get_background_store(maxsize: int = 16) -> BackgroundStore:
+    """shared store of the process"""
+    global _background_store
+    if _background_store is None:
+        _background_store = BackgroundStore(maxsize=maxsize)
+    return _background_store
+
+
+def time_step(time: ndarray) -> float:
+    """mean sampling interval of a (nearly) uniform time axis"""
+    return float(time[-1] - time[0]) / (len(time) - 1) if len(time) > 1 else 0.0
+
+
+def uniform_grid(time: ndarray,
+                 rtol: float = 1e-3) -> ndarray:
+    """
+    Uniform time grid covering the time axis.
+    An axis that is already uniform (the interval deviates < rtol of the step) is returned as it is,
+    so the signal on it needs no resampling.
+    """
+    step = time_step(time)
+    if len(time) < 3 or np.abs(np.diff(time) - step).max() <= rtol * step:
+        return time
+    return np.linspace(time[0], time[-1], len(time))
+
+
+def resample(time: ndarray,
+             signal: ndarray,
+             grid: ndarray,
+             shift: float = 0.0,
+             fill: float = 0.0,
+             ) -> ndarray:
+    """
+    Linear interpolation of the signal on the grid, moved by shift data points (may be a fraction).
+    Grid points outside the signal (more than 1 % of a step) are filled with fill.
+    """
+    step = time_step(time)
+    x = grid + shift * step if shift else grid
+    values = np.interp(x, time, signal)
+    tol = 0.01 * step
+    values[(x < time[0] - tol) | (x > time[-1] + tol)] = fill
+    return values
+
+
+def align_background(raw_time: ndarray,
+                     raw_signal: ndarray,
+                     background: BackgroundChromatogram,
+                     shift: float = 0,
+                     ) -> tuple[ndarray, ndarray, ndarray]:
+    """
+    Put the raw signal and the background on one uniform time grid, ready for subtraction.
+    The grid is the raw time axis (resampled if it is not uniform) within the time range of the background,
+    so slightly different time stamps of the two files do not drop data points.
+    The background is moved by shift data points (a fraction is interpolated; the missing end is 0).
+    :return: time, raw signal and background on the grid
+    """
+    bg_time, bg_signal = background.time, background.signal
+    if raw_time.shape == bg_time.shape and np.array_equal(raw_time, bg_time) and float(shift).is_integer():
+        # same acquisition and whole data points: no interpolation needed
+        shift = int(shift)
+        if shift:
+            moved = np.zeros_like(bg_signal)
+            if shift > 0:
+                moved[:-shift] = bg_signal[shift:]
+            else:
+                moved[-shift:] = bg_signal[:shift]
+            bg_signal = moved
+        return raw_time, raw_signal, bg_signal
+
+    grid = uniform_grid(raw_time)
+    if grid is not raw_time:
+        raw_signal = resample(raw_time, raw_signal, grid)
+
+    # only the time range of both chromatograms is kept (like an inner merge on the retention time)
+    tol = 0.01 * time_step(bg_time)
+    in_range = (grid >= bg_time[0] - tol) & (grid <= bg_time[-1] + tol)
+    grid, raw_signal = grid[in_range], raw_signal[in_range]
+
+    return grid, raw_signal, resample(bg_time, bg_signal, grid, shift=shift)
@@ -0,0 +1,131 @@
+"""
+polynomial baseline (modpoly) for chromatograms on a fixed time grid
+all runs of one hplc method share the ROI time grid: the (QR-factorized) Vandermonde matrix of the grid is made
+once, then the masked least squares of a whole stack of chromatograms are solved together.
+same algorithm as pybaselines.polynomial.modpoly, which is used when the grids differ.
+"""
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+import pybaselines
+from loguru import logger
+from numpy import ndarray
+
+_MIN_FLOAT = np.finfo(float).eps
+
+
+class PolynomialBaseline:
+    """modpoly baseline engine for one time grid and polynomial order"""
+
+    def __init__(self,
+                 x: ndarray,
+                 poly_order: int = 3):
+        self.x = np.array(x, dtype=np.float64)
+        self.x.flags.writeable = False
+        self.poly_order = poly_order
+
+        # like pybaselines: x is mapped to [-1, 1] for a well conditioned Vandermonde matrix
+        x_scaled = np.polynomial.polyutils.mapdomain(self.x, (self.x.min(), self.x.max()), (-1.0, 1.0))
+        vandermonde = np.polynomial.polynomial.polyvander(x_scaled, poly_order)
+        # the baseline is a combination of the orthonormal columns Q (same space as the Vandermonde matrix)
+        self._q, _ = np.linalg.qr(vandermonde)
+        m = poly_order + 1
+        # Q_i * Q_j per point: Q^T W Q of every chromatogram is then one matrix product with the weights
+        self._q_outer = (self._q[:, :, None] * self._q[:, None, :]).reshape(len(self.x), m * m)
+
+    def modpoly(self,
+                data: ndarray,
+                weights: ndarray | None = None,
+                tol: float = 1e-3,
+                max_iter: int = 250,
+                ) -> ndarray:
+        """
+        modified polynomial baseline of one chromatogram (n_points) or a stack (n_chromatograms x n_points)
+        :param weights: 0 = ignored for the baseline (peak), 1 = baseline; same shape as data
+        :return: baseline(s), same shape as data
+        """
+        y = np.array(data, dtype=np.float64, ndmin=2)
+        k, n = y.shape
+        m = self.poly_order + 1
+        w = np.ones((k, n)) if weights is None else np.broadcast_to(np.asarray(weights, dtype=np.float64), (k, n))
+
+        gram = (w @ self._q_outer).reshape(k, m, m)
+        singular = np.linalg.cond(gram) > 1 / np.finfo(float).eps ** 0.5
+        baseline = np.empty_like(y)
+        if singular.any():
+            # too few points left for the fit: pybaselines solves it with the pseudo-inverse
+            for row in np.flatnonzero(singular):
+                baseline[row] = pybaselines.polynomial.modpoly(y[row], self.x, poly_order=self.poly_order, tol=tol,
+                                                               max_iter=max_iter, weights=w[row])[0]
+        active = np.flatnonzero(~singular)
+        if not active.size:
+            return baseline if np.ndim(data) > 1 else baseline[0]
+        gram_inv = np.linalg.inv(gram[active])
+
+        def fit(rows: ndarray, inverse: ndarray) -> ndarray:
+            coef = np.einsum("kij,kj->ki", inverse, (w[rows] * y[rows]) @ self._q)
+            return coef @ self._q.T
+
+        baseline[active] = fit(active, gram_inv)
+        for _ in range(max_iter):
+            baseline_old = baseline[active]
+            y[active] = np.minimum(y[active], baseline_old)
+            baseline_new = fit(active, gram_inv)
+            baseline[active] = baseline_new
+            # relative difference per chromatogram; converged ones are not fitted again
+            difference = (np.linalg.norm(baseline_new - baseline_old, axis=1)
+                          / np.maximum(np.linalg.norm(baseline_old, axis=1), _MIN_FLOAT))
+            keep = difference >= tol
+            active, gram_inv = active[keep], gram_inv[keep]
+            if not active.size:
+                break
+        return baseline if np.ndim(data) > 1 else baseline[0]
+
+
+_engines: OrderedDict[tuple, PolynomialBaseline] = OrderedDict()
+_ENGINES_SIZE = 8
+
+
+def get_baseline_engine(x: ndarray,
+                        poly_order: int = 3) -> PolynomialBaseline:
+    """engine of the time grid (kept for the next chromatograms on the same grid)"""
+    x = np.ascontiguousarray(x, dtype=np.float64)
+    key = (len(x), poly_order, hashlib.blake2b(x.tobytes(), digest_size=16).digest())
+    if key in _engines:
+        _engines.move_to_end(key)
+        return _engines[key]
+    engine = PolynomialBaseline(x, poly_order)
+    _engines[key] = engine
+    while len(_engines) > _ENGINES_SIZE:
+        _engines.popitem(last=False)
+    return engine
+
+
+def modpoly_baseline(data: ndarray | list[ndarray],
+                     x: ndarray | list[ndarray],
+                     poly_order: int = 3,
+                     weights: ndarray | list[ndarray] | None = None,
+                     tol: float = 1e-3,
+                     max_iter: int = 250,
+                     ) -> ndarray:
+    """
+    modpoly baseline of one chromatogram or a stack of chromatograms.
+    :param data: one chromatogram, a stack (n_chromatograms x n_points) or a list of chromatograms
+    :param x: time grid shared by all chromatograms, or one grid per chromatogram
+        (if the grids differ, each chromatogram is fitted by pybaselines)
+    :return: baseline(s), same shape as data (a list of chromatograms: a stack, or a list if the grids differ)
+    """
+    if isinstance(x, list) or np.ndim(x) > 1:
+        grids = [np.asarray(grid, dtype=np.float64) for grid in x]
+        if any(grid.shape != grids[0].shape or not np.array_equal(grid, grids[0]) for grid in grids[1:]):
+            logger.debug("different time grids: baselines are fitted one by one.")
+            weights = [None] * len(grids) if weights is None else weights
+            return [pybaselines.polynomial.modpoly(row, grid, poly_order=poly_order, tol=tol,
+                                                   max_iter=max_iter, weights=row_weights)[0]
+                    for row, grid, row_weights in zip(data, grids, weights)]
+        x = grids[0]
+    if isinstance(data, list):
+        data = np.stack(data)
+        weights = None if weights is None else np.stack(weights)
+    return get_baseline_engine(x, poly_order).modpoly(data, weights=weights, tol=tol, max_iter=max_iter)
@@ -0,0 +1,222 @@
+"""
+batch re-analysis of archived hplc runs (e.g. after changing the peak windows or the calibration)
+the runs are processed in a process pool; the results are written as parquet parts while the workers finish,
+so an interrupted batch is resumed by running it again with the same output folder.
+"""
+import json
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from beanie import PydanticObjectId
+from loguru import logger
+
+from BV_experiments.src.general_platform.Librarian import HplcConfig
+from BV_experiments.src.general_platform.Analysis.anal_background import hplc_config_hash
+from BV_experiments.src.general_platform.Analysis.anal_hplc_result import evaluate_experiments
+from BV_experiments.src.general_platform.Analysis.anal_multichannel import MultiChannelChromatogram
+from BV_experiments.src.general_platform.Analysis.anal_result_cache import cached_align
+from BV_experiments.src.general_platform.Analysis.anal_timing import STAGES
+
+_EXPORT = re.compile(r"^(?P<mongo_id>.+) - DAD 2\.1L- Channel (?P<channel>\d+)$")
+_TEXT_COLUMNS = ("mongo_id", "file", "config_hash", "status", "raw_peaks")
+
+
+def find_runs(folder_path: Path | str,
+              pattern: str | None = None,
+              mongo_ids: list[str | PydanticObjectId] | None = None,
+              file_extension: str = ".txt",
+              ) -> dict[str, dict[int, Path]]:
+    """
+    scan the export folder once and group the channel exports by run
+    :param pattern: glob of the mongo_id part of the file name (e.g. "*ctrl_073*"). default: all runs
+    :param mongo_ids: only these runs
+    :return: {mongo_id: {channel: file_path}}
+    """
+    file_extension = file_extension.strip(".")
+    wanted = {str(mongo_id) for mongo_id in mongo_ids} if mongo_ids is not None else None
+
+    runs: dict[str, dict[int, Path]] = {}
+    for file_path in Path(folder_path).rglob(f"{pattern or '*'} - DAD 2.1L- Channel *.{file_extension}"):
+        match = _EXPORT.match(file_path.stem)
+        if match is None:
+            continue
+        mongo_id = match["mongo_id"]
+        if wanted is not None and mongo_id not in wanted:
+            continue
+        channels = runs.setdefault(mongo_id, {})
+        if int(match["channel"]) in channels:
+            logger.error(f"Multiple files found for {mongo_id} channel {match['channel']}. {file_path} is skipped.")
+            continue
+        channels[int(match["channel"])] = file_path
+
+    if wanted is not None and len(runs) < len(wanted):
+        logger.warning(f"no exports found for {sorted(wanted - runs.keys())}")
+    return runs
+
+
+def _done_runs(output_dir: Path, config_hash: str) -> set[str]:
+    """runs already in the output folder (with the same hplc config); runs that raised an error are tried again"""
+    done = set()
+    for part in sorted(output_dir.glob("part-*.parquet")):
+        table = pd.read_parquet(part, columns=["mongo_id", "config_hash", "status"])
+        finished = (table["config_hash"] == config_hash) & ~table["status"].fillna("").str.startswith("error")
+        done.update(table.loc[finished, "mongo_id"])
+    return done
+
+
+def _write_part(output_dir: Path, rows: list[dict]) -> Path | None:
+    """write one part; it is renamed at the end, so a part is either complete or absent. No part without rows."""
+    if not rows:
+        return None
+    # after the last part (a part of an earlier batch may have been deleted)
+    index = max((int(part.stem.split("-")[1]) for part in output_dir.glob("part-*.parquet")), default=-1) + 1
+    part = output_dir / f"part-{index:05d}.parquet"
+    tmp = part.with_suffix(".tmp")
+    table = pd.DataFrame(rows)
+    # fixed column types, so all parts have the same schema (even if a column is empty in one part)
+    for column in table.columns:
+        if column in _TEXT_COLUMNS:
+            table[column] = table[column].astype("string")
+        elif column != "channel":
+            table[column] = table[column].astype("float64")
+    table.to_parquet(tmp, index=False)
+    tmp.replace(part)
+    return part
+
+
+def reanalyse_run(mongo_id: str,
+                  file_paths: dict[int, Path],
+                  hplc_config: HplcConfig | dict[str, Any],
+                  folder_path: Path | str,
+                  bg_sub: bool = True,
+                  use_is_peak: bool = True,
+                  cc_is: str = "is",
+                  y2: list = ["product"],
+                  conv2: list = ["sm"],
+                  ) -> list[dict]:
+    """
+    peaks of all channels of one run, one row per channel
+    raw peaks are kept as json {rt: area}; the aligned areas are one column per peak of PEAK_RT, followed by the
+    yield and conversion of the calibration (see evaluate_experiments; None without calibration of the channel),
+    the stage timings one column per stage (t_<stage>)
+    """
+    config_hash = hplc_config_hash(hplc_config)
+    peak_rt = hplc_config.PEAK_RT if type(hplc_config) is HplcConfig else hplc_config["PEAK_RT"]
+    calibration = hplc_config.CALIBRATION if type(hplc_config) is HplcConfig else hplc_config.get("CALIBRATION", {})
+
+    try:
+        chroms = MultiChannelChromatogram(mongo_id, hplc_config, folder_path=str(folder_path),
+                                          channels=sorted(file_paths))
+        chroms.file_paths = dict(file_paths)
+        raw_results = chroms.txt_to_peaks(bg_sub=bg_sub, use_is_peak=use_is_peak, render="none")
+    except Exception as e:
+        logger.error(f"{mongo_id}: {e}")
+        return [{"mongo_id": mongo_id, "channel": channel, "file": str(file_path), "config_hash": config_hash,
+                 "status": f"error: {e}", "raw_peaks": None, **{name: None for name in peak_rt},
+                 "yield": None, "conversion": None, "t_total": None, **{f"t_{stage}": None for stage in STAGES}}
+                for channel, file_path in file_paths.items()]
+
+    records = chroms.processing_records
+    rows = []
+    for channel, raw_result in raw_results.items():
+        status, aligned = ("ok", {}) if raw_result else ("failed", {})
+        if raw_result:
+            try:
+                aligned = cached_align(chroms.chromatograms[channel].result_key, raw_result, hplc_config)
+            except Exception as e:
+                logger.error(f"{mongo_id} channel {channel}: peak alignment failed. {e}")
+                status = f"alignment failed: {e}"
+        evaluation = {"yield": None, "conversion": None}
+        if aligned and f"channel_{channel}" in calibration:
+            areas = pd.DataFrame([{name: aligned.get(name, np.nan) for name in peak_rt}], dtype="float64")
+            result = evaluate_experiments(areas, hplc_config, channel, cc_is=cc_is, y2=y2, conv2=conv2)
+            evaluation = {key: None if np.isnan(value) else float(value) for key, value in result.iloc[0].items()}
+        rows.append({"mongo_id": mongo_id,
+                     "channel": channel,
+                     "file": str(file_paths[channel]),
+                     "config_hash": config_hash,
+                     "status": status,
+                     "raw_peaks": json.dumps({str(rt): area for rt, area in raw_result.items()}) if raw_result else None,
+                     **{name: aligned.get(name) for name in peak_rt},
+                     **evaluation,
+                     # wall time (s) of the processing stages
+                     "t_total": records[channel]["total"],
+                     **{f"t_{stage}": entry["wall_time"] if entry else None
+                        for stage, entry in records[channel]["stages"].items()}})
+    return rows
+
+
+def reanalyse(hplc_config: HplcConfig | dict[str, Any],
+              output_dir: Path | str,
+              pattern: str | None = None,
+              mongo_ids: list[str | PydanticObjectId] | None = None,
+              folder_path: Path | str = r"W:\BS-FlowChemistry\data\exported_chromatograms",
+              bg_sub: bool = True,
+              use_is_peak: bool = True,
+              cc_is: str = "is",
+              y2: list = ["product"],
+              conv2: list = ["sm"],
+              max_workers: int | None = None,
+              chunk_size: int = 1,
+              ) -> Path:
+    """
+    re-analyse the archived runs in parallel.
+    The rows are written to output_dir/part-NNNNN.parquet every chunk_size runs; runs already in output_dir with
+    the same hplc config are skipped (not the runs that raised an error), so an interrupted batch continues where
+    it stopped. Read the result with pd.read_parquet(output_dir).
+
+    :param pattern: glob of the mongo_id part of the file name (e.g. "*ctrl_073*")
+    :param mongo_ids: runs to re-analyse (instead of/together with pattern)
+    :param cc_is: internal standard, y2: peaks of the yield, conv2: peaks of the conversion (see evaluate_experiments)
+    :param max_workers: worker processes. default: number of cpu
+    :param chunk_size: runs per part, i.e. at most chunk_size - 1 finished runs are lost by an interruption
+    :return: output_dir
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for tmp in output_dir.glob("part-*.tmp"):  # unfinished part of an interrupted batch
+        tmp.unlink()
+
+    config_hash = hplc_config_hash(hplc_config)
+    runs = find_runs(folder_path, pattern=pattern, mongo_ids=mongo_ids)
+    # the background (blank) runs are not re-analysed
+    bg_files = (hplc_config.BACKGROUND_FILES if type(hplc_config) is HplcConfig
+                else hplc_config["BACKGROUND_FILES"]).values()
+    runs = {mongo_id: files for mongo_id, files in runs.items()
+            if not any(file_path.name in bg_files for file_path in files.values())}
+    done = _done_runs(output_dir, config_hash)
+    todo = {mongo_id: files for mongo_id, files in runs.items() if mongo_id not in done}
+    logger.info(f"{len(runs)} runs found, {len(runs) - len(todo)} already done, {len(todo)} to process.")
+
+    rows, finished = [], 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(reanalyse_run, mongo_id, files, hplc_config, folder_path, bg_sub, use_is_peak,
+                                   cc_is, y2, conv2): mongo_id for mongo_id, files in todo.items()}
+        for future in as_completed(futures):
+            finished += 1
+            try:
+                rows.extend(future.result())
+            except Exception as e:
+                # not saved, so the run is tried again in the next batch
+                logger.error(f"{futures[future]}: {e}")
+            if finished % chunk_size == 0:
+                _write_part(output_dir, rows)
+                rows = []
+            if finished % 50 == 0:
+                logger.info(f"{finished}/{len(todo)} runs processed.")
+        _write_part(output_dir, rows)
+    logger.info(f"re-analysis of {len(todo)} runs saved in {output_dir}")
+    return output_dir
+
+
+if __name__ == "__main__":
+    from BV_experiments.Example3_debenzylation.db_doc import SecondDebenzylation
+
+    result_dir = reanalyse(SecondDebenzylation.hplc_config_info,
+                           output_dir=r"W:\BS-FlowChemistry\data\exported_chromatograms\plots_wei\reanalysis_ctrl_073",
+                           pattern="*ctrl_073*")
+    print(pd.read_parquet(result_dir))
@@ -0,0 +1,287 @@
+"""
+benchmark of the hplc pipeline on synthetic chromatograms (offline, no instrument or network share needed)
+clarity ASCII exports with known peaks (gaussian / exponentially modified gaussian), drift, noise, a background
+(blank) file and retention time shifts are written to a temporary folder, then DadChromatogram, Chromatogram and
+PeakAlignment.align are timed per stage and the found areas are compared with the true areas.
+
+python -m BV_experiments.src.general_platform.Analysis.anal_benchmark --runs 20 --cases small typical dense
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+from numpy import ndarray
+from scipy import stats
+
+from BV_experiments.src.general_platform.Analysis.anal_Chromatogram import Chromatogram
+from BV_experiments.src.general_platform.Analysis.anal_clarity_reader import read_clarity_ascii
+from BV_experiments.src.general_platform.Analysis.anal_hplc_chromatogram import DadChromatogram
+from BV_experiments.src.general_platform.Analysis.anal_hplc_result import PeakAlignment
+from BV_experiments.src.general_platform.Analysis.anal_timing import STAGES
+
+SAMPLE_RATE = 10  # Hz, as the DAD method
+IS_RT = 1.9  # min
+
+# number of compounds and run time (min) of the synthetic methods
+CASES = {
+    "small": {"n_peaks": 4, "runtime": 10.0},
+    "typical": {"n_peaks": 12, "runtime": 20.0},
+    "dense": {"n_peaks": 40, "runtime": 30.0},
+}
+
+
+def peak_shape(time: ndarray,
+               rt: float,
+               area: float,
+               width: float,
+               tau: float = 0.0) -> ndarray:
+    """gaussian (tau = 0) or exponentially modified gaussian (tailing tau, min) with the area in mAu*min"""
+    if tau:
+        return area * stats.exponnorm.pdf(time, tau / width, loc=rt, scale=width)
+    return area * stats.norm.pdf(time, loc=rt, scale=width)
+
+
+def write_clarity_ascii(file_path: Path,
+                        time: ndarray,
+                        signal: ndarray,
+                        channel: int = 1):
+    """export in the clarity ASCII format (header, empty line, column titles, tab separated values)"""
+    header = ["Sample Name : benchmark",
+              f"Channel : DAD 2.1L- Channel {channel}",
+              "Detector : DAD",
+              "X Axis Title : time (min.)",
+              "Y Axis Title : Absorbance [mAu]"]
+    values = "\n".join(f"{t:.6f}\t{y:.6f}" for t, y in zip(time, signal))
+    file_path.write_text("\n".join(header) + "\n\ntime (min.)\tAbsorbance [mAu]\n" + values + "\n", encoding="cp852")
+
+
+class SyntheticMethod:
+    """one hplc method: the compounds (retention time, width, tailing), background and the exports of its runs"""
+
+    def __init__(self,
+                 folder_path: Path,
+                 name: str,
+                 n_peaks: int,
+                 runtime: float,
+                 seed: int = 0,
+                 noise: float = 0.05,
+                 ):
+        self.folder_path = Path(folder_path)
+        self.name = name
+        self.runtime = runtime
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+        self.time = np.round(np.arange(0, runtime, 1 / (SAMPLE_RATE * 60)), 6)
+        self.roi = [1.5, runtime - 1.5]
+
+        # compounds spread over the ROI, at least 5 widths apart
+        rts = np.linspace(IS_RT + 0.6, self.roi[1] - 0.5, n_peaks) + self.rng.uniform(-0.1, 0.1, n_peaks)
+        self.compounds = {"is": {"rt": IS_RT, "width": 0.03, "tau": 0.0}}
+        for i, rt in enumerate(rts):
+            self.compounds[f"c{i:02d}"] = {"rt": float(rt),
+                                           "width": float(self.rng.uniform(0.02, 0.04)),
+                                           "tau": float(self.rng.choice([0.0, 0.02, 0.05]))}
+
+        # blank: system peaks and the drift of the gradient
+        self.background = (0.3 * np.sin(self.time / 5)
+                           + peak_shape(self.time, 1.0, 0.8, 0.04)
+                           + peak_shape(self.time, runtime - 1.0, 0.5, 0.05))
+        self.bg_file = f"{name}_blank - DAD 2.1L- Channel 1.txt"
+        write_clarity_ascii(self.folder_path / self.bg_file, self.time,
+                            self.background + self.rng.normal(0, noise / 2, self.time.size))
+
+    @property
+    def hplc_config(self) -> dict[str, Any]:
+        return {"HPLC_RUNTIME": self.runtime,
+                "ACQUISITION": {"wavelength": {"channel_1": "254"}, "sampling_frequency": f"{SAMPLE_RATE} Hz"},
+                "ASCII_FILE_FORMAT": {},
+                "ROI": self.roi,
+                "PEAK_RT": {name: compound["rt"] for name, compound in self.compounds.items()},
+                "PEAK_RT_2": {},
+                "ACCEPTED_SHIFT": 0.22,
+                "CALIBRATION": {},
+                "BACKGROUND_FILES": {"channel_1": self.bg_file}}
+
+    def make_run(self, index: int) -> tuple[Path, pd.DataFrame]:
+        """
+        one run: random areas, a retention time shift and a linear drift on top of the background
+        :return: the export and the true peaks (name, rt of the apex, area)
+        """
+        shift = self.rng.uniform(-0.08, 0.08)
+        signal = self.background + self.rng.uniform(-0.02, 0.02) * self.time
+        truth = []
+        for name, compound in self.compounds.items():
+            area = 3.0 if name == "is" else float(self.rng.uniform(0.2, 6.0))
+            peak = peak_shape(self.time, compound["rt"] + shift, area, compound["width"], compound["tau"])
+            signal = signal + peak
+            truth.append({"name": name, "rt": self.time[peak.argmax()], "area": area})
+        signal = signal + self.rng.normal(0, self.noise, self.time.size)
+
+        file_path = self.folder_path / f"{self.name}_{index:04d} - DAD 2.1L- Channel 1.txt"
+        write_clarity_ascii(file_path, self.time, signal)
+        return file_path, pd.DataFrame(truth)
+
+
+def area_errors(found: dict[float, float],
+                truth: pd.DataFrame,
+                tolerance: float = 0.05) -> ndarray:
+    """relative area error of each true peak (nan: no peak found within tolerance min of the apex)"""
+    errors = np.full(len(truth), np.nan)
+    if not found:
+        return errors
+    rts = np.array(list(found), dtype=np.float64)
+    areas = np.array(list(found.values()), dtype=np.float64)
+    for i, (rt, area) in enumerate(zip(truth["rt"], truth["area"])):
+        nearest = np.abs(rts - rt).argmin()
+        if abs(rts[nearest] - rt) <= tolerance:
+            errors[i] = (areas[nearest] - area) / area
+    return errors
+
+
+def _time_chromatogram(file_path: Path, method: SyntheticMethod) -> tuple[dict[str, float], dict[float, float]]:
+    """Chromatogram.process_chromatogram step by step on the background subtracted signal"""
+    export = read_clarity_ascii(file_path)
+    signal = export.signal - np.interp(export.time, method.time, method.background)
+    timings = {}
+
+    start = time.perf_counter()
+    chrom = Chromatogram.from_arrays(export.time, signal, region_of_interest=method.roi)
+    chrom.smooth_chromatogram(chrom.smooth_by_fir)
+    timings["smoothed"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    chrom.global_maximum()
+    chrom.find_peaks(fraction_of_largest_peak=80, detector_frequency=SAMPLE_RATE)
+    chrom.get_derivative()
+    chrom.get_peakwidth()
+    chrom.mod_find_peak_start_end()
+    timings["peaks_detected"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    chrom.baseline_correction(order=3)
+    timings["baseline"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    chrom.peak_area()
+    timings["integration"] = time.perf_counter() - start
+    return timings, dict(zip(chrom.peaks["time"], chrom.peaks["area"]))
+
+
+def run_case(case: str,
+             runs: int,
+             folder_path: Path,
+             seed: int = 0,
+             ) -> tuple[list[dict], list[dict], list[dict]]:
+    """
+    :return: rows of the throughput, stage and accuracy tables of one case
+    """
+    method = SyntheticMethod(folder_path, case, seed=seed, **CASES[case])
+    exports = [method.make_run(index) for index in range(runs)]
+    config = method.hplc_config
+
+    wall = {"DadChromatogram": 0.0, "Chromatogram": 0.0, "PeakAlignment.align": 0.0}
+    stages: dict[tuple[str, str], list[float]] = {}
+    errors: dict[str, list[ndarray]] = {"DadChromatogram": [], "Chromatogram": [], "PeakAlignment.align": []}
+    failed = 0
+    for file_path, truth in exports:
+        chrom = DadChromatogram(case, config, folder_path=str(folder_path), channel=1, file_path=file_path)
+        start = time.perf_counter()
+        raw_result = chrom.txt_to_peaks(file_path, render="none", use_cache=False)
+        wall["DadChromatogram"] += time.perf_counter() - start
+        for stage, entry in chrom.processing_record["stages"].items():
+            if entry is not None:
+                stages.setdefault(("DadChromatogram", stage), []).append(entry["wall_time"])
+        if not raw_result:
+            failed += 1
+            continue
+        errors["DadChromatogram"].append(area_errors(raw_result, truth))
+
+        start = time.perf_counter()
+        aligned = PeakAlignment(raw_result, config).align()
+        wall["PeakAlignment.align"] += time.perf_counter() - start
+        # area 0: the peak was not assigned
+        errors["PeakAlignment.align"].append(np.array([(aligned[name] - area) / area if aligned.get(name) else np.nan
+                                                       for name, area in zip(truth["name"], truth["area"])]))
+
+        start = time.perf_counter()
+        timings, peaks = _time_chromatogram(file_path, method)
+        wall["Chromatogram"] += time.perf_counter() - start
+        for stage, wall_time in timings.items():
+            stages.setdefault(("Chromatogram", stage), []).append(wall_time)
+        errors["Chromatogram"].append(area_errors(peaks, truth))
+    if failed:
+        logger.warning(f"{case}: {failed} of {runs} runs failed the quality check.")
+
+    n_points = len(method.time)
+    throughput = [{"case": case, "component": component, "runs": runs, "n_points": n_points,
+                   "total_s": total, "per_second": runs / total if total else np.nan,
+                   "mean_ms": 1000 * total / runs}
+                  for component, total in wall.items()]
+    stage_rows = [{"case": case, "component": component, "stage": stage, "mean_ms": 1000 * float(np.mean(values))}
+                  for (component, stage), values in stages.items()]
+    accuracy = []
+    for component, component_errors in errors.items():
+        values = np.concatenate(component_errors) if component_errors else np.array([np.nan])
+        found = values[~np.isnan(values)]
+        accuracy.append({"case": case, "component": component,
+                         "recovered": len(found) / len(values),
+                         "median_abs_error": float(np.median(np.abs(found))) if len(found) else np.nan,
+                         "p90_abs_error": float(np.percentile(np.abs(found), 90)) if len(found) else np.nan,
+                         "mean_error": float(found.mean()) if len(found) else np.nan})
+    return throughput, stage_rows, accuracy
+
+
+def run_benchmark(cases: list[str] | None = None,
+                  runs: int = 20,
+                  seed: int = 0,
+                  folder_path: Path | str | None = None,
+                  ) -> dict[str, pd.DataFrame]:
+    """
+    run the benchmark cases
+    :param cases: names in CASES. default: all
+    :param folder_path: folder for the synthetic exports. default: a temporary folder (removed at the end)
+    :return: tables "throughput" (chromatograms per second per component), "stages" (mean ms per stage) and
+        "accuracy" (found peaks and relative area error against the true areas)
+    """
+    cases = cases or list(CASES)
+    with tempfile.TemporaryDirectory() as tmp:
+        folder_path = Path(folder_path or tmp)
+        folder_path.mkdir(parents=True, exist_ok=True)
+        throughput, stage_rows, accuracy = [], [], []
+        for i, case in enumerate(cases):
+            rows = run_case(case, runs, folder_path, seed=seed + i)
+            throughput += rows[0]
+            stage_rows += rows[1]
+            accuracy += rows[2]
+
+    stages = pd.DataFrame(stage_rows).pivot_table(index=["case", "component"], columns="stage", values="mean_ms")
+    stages = stages[[stage for stage in STAGES if stage in stages.columns]]
+    return {"throughput": pd.DataFrame(throughput).set_index(["case", "component"]),
+            "stages": stages,
+            "accuracy": pd.DataFrame(accuracy).set_index(["case", "component"])}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark of the hplc pipeline on synthetic chromatograms")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--runs", type=int, default=20, help="chromatograms per case")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--folder", type=Path, default=None, help="keep the synthetic exports in this folder")
+    parser.add_argument("--json", type=Path, default=None, help="save the tables as json")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(lambda message: print(message, end=""), level="WARNING")
+    tables = run_benchmark(args.cases, runs=args.runs, seed=args.seed, folder_path=args.folder)
+    with pd.option_context("display.width", 200, "display.max_columns", 20, "display.precision", 4):
+        for table_name, table in tables.items():
+            print(f"\n{table_name}\n{table}")
+    if args.json:
+        args.json.write_text(json.dumps({table_name: json.loads(table.reset_index().to_json(orient="records"))
+                                         for table_name, table in tables.items()}, indent=1))
@@ -0,0 +1,159 @@
+"""
+calibration curves from a series of standards
+the standard exports are processed in a process pool (same pipeline as the experiments: DadChromatogram +
+PeakAlignment), then one linear curve area / area_is = a * conc + b is fitted per channel and compound.
+the result is a new CALIBRATION block for the HplcConfig and a table of the fit statistics.
+"""
+import copy
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from BV_experiments.src.general_platform.Librarian import HplcConfig
+from BV_experiments.src.general_platform.Analysis.anal_hplc_chromatogram import DadChromatogram
+from BV_experiments.src.general_platform.Analysis.anal_hplc_result import PeakAlignment
+
+_STANDARD_COLUMNS = ("file", "channel")
+
+
+def measure_standard(file_path: Path | str,
+                     channel: int,
+                     hplc_config: HplcConfig | dict[str, Any],
+                     folder_path: Path | str,
+                     bg_sub: bool = True,
+                     use_is_peak: bool = True,
+                     ) -> dict[str, float]:
+    """
+    aligned peak areas of one standard export
+    :return: {peak name: area}; empty if the chromatogram failed the quality check
+    """
+    file_path = Path(file_path)
+    chrom = DadChromatogram(file_path.stem.split(" - ")[0], hplc_config, folder_path=str(folder_path),
+                            channel=channel, file_path=file_path)
+    raw_result = chrom.txt_to_peaks(file_path, bg_sub=bg_sub, use_is_peak=use_is_peak, render="none")
+    if not raw_result:
+        return {}
+    return PeakAlignment(raw_result, hplc_config).align()
+
+
+def fit_curve(conc: np.ndarray,
+              ratio: np.ndarray,
+              ) -> dict[str, float]:
+    """
+    linear least squares ratio = a * conc + b with the residual statistics
+    :return: a, b, n, r2, rmse, max_residual and the standard errors se_a, se_b (nan with less than 2 points)
+    """
+    n = len(conc)
+    if n < 2 or np.ptp(conc) == 0:
+        return {"a": np.nan, "b": np.nan, "n": n, "r2": np.nan, "rmse": np.nan, "max_residual": np.nan,
+                "se_a": np.nan, "se_b": np.nan}
+    a, b = np.polyfit(conc, ratio, 1)
+    residual = ratio - (a * conc + b)
+    sse = float(residual @ residual)
+    sxx = float(((conc - conc.mean()) ** 2).sum())
+    syy = float(((ratio - ratio.mean()) ** 2).sum())
+    # n - 2 degrees of freedom for the standard errors
+    s2 = sse / (n - 2) if n > 2 else np.nan
+    return {"a": float(a), "b": float(b), "n": n,
+            "r2": 1 - sse / syy if syy else 1.0,
+            "rmse": np.sqrt(sse / n),
+            "max_residual": float(np.abs(residual).max()),
+            "se_a": np.sqrt(s2 / sxx),
+            "se_b": np.sqrt(s2 * (1 / n + conc.mean() ** 2 / sxx))}
+
+
+def fit_curves(points: pd.DataFrame) -> pd.DataFrame:
+    """
+    :param points: columns channel, compound, conc, ratio (area / area_is), one row per standard and compound
+    :return: the fit (see fit_curve) per (channel, compound)
+    """
+    fits = {key: fit_curve(group["conc"].to_numpy(), group["ratio"].to_numpy())
+            for key, group in points.groupby(["channel", "compound"], sort=True)}
+    return pd.DataFrame.from_dict(fits, orient="index").rename_axis(["channel", "compound"])
+
+
+def build_calibration(standards: pd.DataFrame | list[dict],
+                      hplc_config: HplcConfig | dict[str, Any],
+                      folder_path: Path | str = r"W:\BS-FlowChemistry\data\exported_chromatograms",
+                      cc_is: str | None = None,
+                      bg_sub: bool = True,
+                      use_is_peak: bool = True,
+                      max_workers: int | None = None,
+                      ) -> tuple[dict, pd.DataFrame]:
+    """
+    process the standards in parallel and fit the calibration curves.
+
+    :param standards: one row per standard export: "file" (path of the channel export), "channel" and one column
+        per compound with its concentration in the standard (same unit as channel_N_initial_conc)
+    :param cc_is: internal standard peak. default: CALIBRATION["cc_is"] or "is"
+    :param use_is_peak: check the internal standard peak in the chromatograms (see DadChromatogram.txt_to_peaks)
+    :param max_workers: worker processes. default: number of cpu
+    :return: the new CALIBRATION block (the curves of the fitted compounds replaced, the rest kept) and the fit
+        statistics per (channel, compound). Use it as hplc_config.model_copy(update={"CALIBRATION": block}).
+    """
+    standards = pd.DataFrame(standards).reset_index(drop=True)
+    compounds = [column for column in standards.columns if column not in _STANDARD_COLUMNS]
+    calibration = hplc_config.CALIBRATION if type(hplc_config) is HplcConfig else hplc_config["CALIBRATION"]
+    cc_is = cc_is or calibration.get("cc_is", "is")
+
+    areas: dict[int, dict[str, float]] = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(measure_standard, row.file, int(row.channel), hplc_config, folder_path, bg_sub,
+                                   use_is_peak): row_index for row_index, row in enumerate(standards.itertuples(index=False))}
+        for future in as_completed(futures):
+            row_index = futures[future]
+            try:
+                areas[row_index] = future.result()
+            except Exception as e:
+                logger.error(f"{standards['file'].iloc[row_index]}: {e}")
+                areas[row_index] = {}
+
+    # one point per standard and compound: ratio to the internal standard vs concentration
+    points = []
+    for row_index, row in standards.iterrows():
+        found = areas[row_index]
+        if not found.get(cc_is):
+            logger.error(f"{row['file']}: no internal standard peak '{cc_is}', the standard is not used.")
+            continue
+        for compound in compounds:
+            if pd.isna(row[compound]) or compound not in found:
+                continue
+            if not found[compound] and row[compound] > 0:
+                # peak not assigned (area 0 from the alignment), not a point of the curve
+                logger.warning(f"{row['file']}: no peak of {compound}, the point is not used.")
+                continue
+            points.append({"channel": int(row["channel"]), "compound": compound, "file": str(row["file"]),
+                           "conc": float(row[compound]), "ratio": found[compound] / found[cc_is]})
+    if not points:
+        raise ValueError("no standard could be used for the calibration.")
+
+    fits = fit_curves(pd.DataFrame(points))
+    new_calibration = copy.deepcopy(calibration)
+    new_calibration["cc_is"] = cc_is
+    for (channel, compound), fit in fits.iterrows():
+        if np.isnan(fit["a"]):
+            logger.warning(f"channel {channel} {compound}: less than 2 standards, the curve is not changed.")
+            continue
+        new_calibration.setdefault(f"channel_{channel}", {})[compound] = (float(fit["a"]), float(fit["b"]))
+        logger.info(f"channel {channel} {compound}: a = {fit['a']:.4g}, b = {fit['b']:.4g}, r2 = {fit['r2']:.4f}")
+    return new_calibration, fits
+
+
+if __name__ == "__main__":
+    import re
+    from BV_experiments.Example3_debenzylation.db_doc import SecondDebenzylation
+
+    # concentration series of the product and the starting material, e.g. "cc_2mM_sm_product - DAD 2.1L- Channel 1"
+    folder = Path(r"W:\BS-FlowChemistry\data\exported_chromatograms")
+    standard_series = []
+    for file in folder.glob("cc_*mM_sm_product - DAD 2.1L- Channel *.txt"):
+        conc = float(re.search(r"cc_(\d+(?:\.\d+)?)mM", file.name).group(1))
+        standard_series.append({"file": file, "channel": int(file.stem.split("Channel")[-1]),
+                                "sm": conc, "product": conc})
+    block, statistics = build_calibration(standard_series, SecondDebenzylation.hplc_config_info)
+    print(statistics)
+    print(block)
@@ -0,0 +1,113 @@
+"""
+single pass reader of the clarity exported ASCII chromatogram (.txt)
+header (dict) + time and signal as contiguous float64 arrays, cached by (path, size, mtime)
+"""
+import io
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+from loguru import logger
+from numpy import ndarray
+
+# Empty line signifies end of header
+_HEADER_END = re.compile(r"\r?\n\r?\n")
+
+
+@dataclass(frozen=True)
+class ClarityExport:
+    """one parsed clarity export. the arrays are shared with the cache and read-only."""
+    file_path: Path
+    header: dict = field(repr=False)
+    header_lines: int  # lines to skip before the column titles (header + empty line)
+    time: ndarray = field(repr=False)  # retention time (min.)
+    signal: ndarray = field(repr=False)  # absorbance (mAu)
+
+
+_cache: OrderedDict[tuple[str, int, int], ClarityExport] = OrderedDict()
+_CACHE_SIZE = 64
+
+
+def _parse_header(header_text: str) -> dict:
+    header_data = {}
+    for content in header_text.splitlines():
+        try:
+            field_name, field_content = content.split(" : ")
+        except ValueError:  # field with no content
+            try:
+                field_name, field_content = content.split(": ")
+            except ValueError:
+                continue
+        header_data[field_name] = field_content.strip()
+    return header_data
+
+
+def _read_bytes(file_path: Path, attempts: int = 6) -> bytes:
+    # PermissionError [Errno 13] Permission denied will happened when clarity is still writing. try again
+    for attempt in range(attempts):
+        try:
+            return file_path.read_bytes()
+        except PermissionError as e:
+            logger.error(f"{e}")
+            if attempt < attempts - 1:
+                time.sleep(5)
+    raise PermissionError("cannot read the clarity txt file.")
+
+
+def _parse_export(file_path: Path, raw: bytes) -> ClarityExport:
+    text = raw.decode("cp852")
+
+    end = _HEADER_END.search(text)
+    if text.startswith(("\n", "\r\n")):
+        header_text, body = "", text.split("\n", 1)[1]
+    elif end is None:
+        logger.warning(f"no data found in {file_path.name}")
+        header_text, body = text, ""
+    else:
+        header_text, body = text[:end.start()], text[end.end():]
+    header_lines = header_text.count("\n") + 2 if header_text else 1
+
+    # first line of the body holds the column titles
+    body = body.split("\n", 1)[1] if "\n" in body else ""
+    if body.strip():
+        values = np.loadtxt(io.StringIO(body, newline=None), delimiter="\t", usecols=(0, 1), ndmin=2, dtype=np.float64)
+    else:
+        values = np.empty((0, 2), dtype=np.float64)
+
+    rt = np.ascontiguousarray(values[:, 0])
+    signal = np.ascontiguousarray(values[:, 1])
+    rt.flags.writeable = False
+    signal.flags.writeable = False
+    return ClarityExport(file_path, _parse_header(header_text), header_lines, rt, signal)
+
+
+def read_clarity_ascii(file_path: Path | str,
+                       use_cache: bool = True) -> ClarityExport:
+    """
+    Read a clarity exported ASCII chromatogram in one pass.
+    A file that was not changed (same size and mtime) is only read once.
+    :param file_path: ASCII file to be analyzed
+    :param use_cache: look up/store the parsed file in the cache
+    :return: ClarityExport with header dict, header length (in lines) and the two data columns
+    """
+    file_path = Path(file_path)
+    stat = file_path.stat()
+    key = (str(file_path), stat.st_size, stat.st_mtime_ns)
+
+    if use_cache and key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key]
+
+    export = _parse_export(file_path, _read_bytes(file_path))
+    if use_cache:
+        _cache[key] = export
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return export
+
+
+def clear_clarity_cache():
+    _cache.clear()
@@ -0,0 +1,192 @@
+"""
+persistent index of the exported chromatograms: (mongo_id, channel) -> file
+the export folder (tens of thousands of files on the network share) is listed once; afterwards the folder is only
+listed again when its mtime changed (a file was added, removed or renamed), and only the difference is applied.
+a run not in the index lists the folder again at most every min_rescan_interval seconds (new exports are registered
+by add), and before lookup raises FileNotFoundError.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+from pathlib import Path
+
+from loguru import logger
+
+# "<mongo_id> - DAD 2.1L- Channel <n>" + anything clarity adds to a second export of the same run, e.g. " (1)"
+_EXPORT = re.compile(r"^(?P<mongo_id>.+?) - DAD 2\.1L- Channel (?P<channel>\d+)(?P<suffix>.*)$")
+
+
+def _default_index_path(folder_path: Path, file_extension: str) -> Path:
+    """the index is kept locally (not on the share), one file per folder"""
+    name = hashlib.sha1(f"{folder_path.resolve()}|{file_extension}".encode()).hexdigest()[:16]
+    return Path.home() / ".cache" / "BV_experiments" / f"export_index_{name}.json"
+
+
+class ExportIndex:
+    """
+    index of one export folder.
+    lookup is a dict access; before it, one stat of the folder tells whether the index is still current.
+    """
+
+    def __init__(self,
+                 folder_path: Path | str,
+                 file_extension: str = ".txt",
+                 index_path: Path | str | None = None,
+                 min_rescan_interval: float = 5.0,
+                 ):
+        """
+        :param min_rescan_interval: seconds between two listings of the folder for runs not in the index
+        """
+        self.folder_path = Path(folder_path)
+        self.file_extension = file_extension.strip(".")
+        self.index_path = Path(index_path) if index_path else _default_index_path(self.folder_path,
+                                                                                  self.file_extension)
+        self.min_rescan_interval = min_rescan_interval
+        self._dir_mtime_ns: int | None = None
+        self._listed_at: float | None = None  # time.monotonic() of the last listing
+        self._names: set[str] = set()
+        self._by_key: dict[tuple[str, int], list[str]] = {}
+        self._load()
+
+    def _key(self, name: str) -> tuple[str, int] | None:
+        match = _EXPORT.match(Path(name).stem)
+        if match is None:
+            return None
+        return match["mongo_id"], int(match["channel"])
+
+    def _add(self, name: str):
+        self._names.add(name)
+        key = self._key(name)
+        if key is not None:
+            names = self._by_key.setdefault(key, [])
+            if name not in names:
+                names.append(name)
+                if len(names) > 1:
+                    logger.warning(f"ambiguous export for {key[0]} channel {key[1]}: {sorted(names)}")
+
+    def _remove(self, name: str):
+        self._names.discard(name)
+        key = self._key(name)
+        if key is not None and key in self._by_key:
+            self._by_key[key].remove(name)
+            if not self._by_key[key]:
+                del self._by_key[key]
+
+    def _load(self):
+        try:
+            stored = json.loads(self.index_path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if stored.get("folder") != str(self.folder_path) or stored.get("file_extension") != self.file_extension:
+            return
+        self._dir_mtime_ns = stored["dir_mtime_ns"]
+        for name in stored["files"]:
+            self._add(name)
+
+    def _save(self):
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_suffix(f".{os.getpid()}.tmp")  # worker processes may save the same index
+        tmp.write_text(json.dumps({"folder": str(self.folder_path),
+                                   "file_extension": self.file_extension,
+                                   "dir_mtime_ns": self._dir_mtime_ns,
+                                   "files": sorted(self._names)}))
+        tmp.replace(self.index_path)
+
+    def _listing(self) -> set[str]:
+        suffix = f".{self.file_extension}" if self.file_extension else ""
+        with os.scandir(self.folder_path) as entries:
+            return {entry.name for entry in entries if entry.name.endswith(suffix) and entry.is_file()}
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        bring the index up to date (mtime scan)
+        :return: True if the folder was listed again
+        """
+        dir_mtime_ns = self.folder_path.stat().st_mtime_ns
+        if not force and dir_mtime_ns == self._dir_mtime_ns:
+            return False
+
+        names = self._listing()
+        removed, added = self._names - names, names - self._names
+        for name in removed:
+            self._remove(name)
+        for name in added:
+            self._add(name)
+        self._dir_mtime_ns = dir_mtime_ns
+        self._listed_at = time.monotonic()
+        logger.debug(f"export index of {self.folder_path}: {len(added)} files added, {len(removed)} removed.")
+        self._save()
+        return True
+
+    def add(self, file_path: Path | str):
+        """register a new export (e.g. found by FileWatch) without listing the folder"""
+        self._add(Path(file_path).name)
+
+    def paths(self,
+              mongo_id: str,
+              channel: int) -> list[Path]:
+        """
+        all exports of (mongo_id, channel)
+        the mtime of a folder on the share may be cached (SMB), so the folder is listed again on a miss, at most every
+        min_rescan_interval seconds (misses are common while polling for an export)
+        """
+        key = (str(mongo_id), int(channel))
+        if not self.refresh() and key not in self._by_key and self._rescan_due():
+            self.refresh(force=True)
+        return self._paths(key)
+
+    def _paths(self, key: tuple[str, int]) -> list[Path]:
+        return [self.folder_path / name for name in self._by_key.get(key, [])]
+
+    def _rescan_due(self) -> bool:
+        return self._listed_at is None or time.monotonic() - self._listed_at >= self.min_rescan_interval
+
+    def lookup(self,
+               mongo_id: str,
+               channel: int) -> Path:
+        """
+        the export of (mongo_id, channel).
+        If multiple files are found, raise ValueError; if none, FileNotFoundError.
+        """
+        listed_at = self._listed_at
+        fitted_files = self.paths(mongo_id, channel)
+        if not fitted_files and self._listed_at == listed_at:
+            # not listed for this lookup (rate limited): list the folder before giving up
+            self.refresh(force=True)
+            fitted_files = self._paths((str(mongo_id), int(channel)))
+        if len(fitted_files) == 1:
+            return fitted_files[0]
+        elif len(fitted_files) > 1:
+            logger.error(f"{len(fitted_files)} files found: {fitted_files}")
+            raise ValueError(f"Multiple files found for {mongo_id} channel {channel}.")
+        else:
+            logger.error(f"No files found for {mongo_id} channel {channel}.")
+            raise FileNotFoundError(f"No files found for {mongo_id} channel {channel}.")
+
+    def ambiguous(self) -> dict[tuple[str, int], list[Path]]:
+        """(mongo_id, channel) with more than one export"""
+        self.refresh()
+        return {key: [self.folder_path / name for name in names]
+                for key, names in self._by_key.items() if len(names) > 1}
+
+    def find(self, text: str) -> list[Path]:
+        """files with text in the name (searched in the index, not on the share)"""
+        self.refresh()
+        return sorted(self.folder_path / name for name in self._names if text in name)
+
+    def __len__(self):
+        return len(self._names)
+
+
+_export_indexes: dict[tuple[str, str], ExportIndex] = {}
+
+
+def get_export_index(folder_path: Path | str,
+                     file_extension: str = ".txt") -> ExportIndex:
+    """shared index of the folder in the process"""
+    key = (str(folder_path), file_extension.strip("."))
+    if key not in _export_indexes:
+        _export_indexes[key] = ExportIndex(folder_path, file_extension)
+    return _export_indexes[key]
@@ -4,6 +4,7 @@ process hplc data(.txt) -> dict of peak
 """
 from typing import Dict, Any
 
+import math
 import time
 import numpy as np
 import pandas as pd
@@ -11,15 +12,24 @@ import datetime
 from pathlib import Path
 from loguru import logger
 
-import pybaselines
 from matplotlib import pyplot as plt
 from numpy import ndarray
 from scipy import signal
-from scipy.integrate import trapezoid
-from scipy.signal import firwin, kaiserord, lfilter
 from beanie import PydanticObjectId
 
 from BV_experiments.src.general_platform.Librarian import HplcConfig
+from BV_experiments.src.general_platform.Analysis.anal_clarity_reader import read_clarity_ascii
+from BV_experiments.src.general_platform.Analysis.anal_background import (get_background_store, align_background,
+                                                                        uniform_grid, resample, time_step)
+from BV_experiments.src.general_platform.Analysis.anal_shift import estimate_shift
+from BV_experiments.src.general_platform.Analysis.anal_file_index import get_export_index
+from BV_experiments.src.general_platform.Analysis.anal_baseline import modpoly_baseline
+from BV_experiments.src.general_platform.Analysis.anal_result_cache import get_result_cache
+from BV_experiments.src.general_platform.Analysis.anal_timing import (new_processing_record, timed_stage, total_time,
+                                                                    get_stage_stats)
+from BV_experiments.src.general_platform.Analysis.anal_peak_boundary import find_peak_boundaries, integrate_peaks
+from BV_experiments.src.general_platform.Analysis.anal_smoothing import smooth_region, region_slice, fir_filter
+from BV_experiments.src.general_platform.Analysis.anal_plot_render import render_plot_spec, get_render_pool
 # from BV_experiments.src.general_platform.Analysis.anal_Chromatogram import Chromatogram
 
 class DadChromatogram:
@@ -79,20 +89,14 @@ class DadChromatogram:
             self.bg_file_path: dict = hplc_config["BACKGROUND_FILES"][f"channel_{channel}"]
 
         self.chromatogram = None
-        self._processing = {
-            "bg_sub": False,
-            "smoothed": False,
-            "maximum_y": False,
-            "peaks_detected": False,
-            "derivative": False,
-            "baseline": False,
-            "start_end": False,
-            "width": False,
-        }
+        # wall time and size of each processing stage of the last run (see anal_timing)
+        self._processing = new_processing_record()
         self.header_data = None
         self.header_lines = None
         self.dataset = None
         self.file_path = file_path
+        self.plot_spec = None  # serializable plot of the last txt_to_peaks
+        self.result_key = None  # result cache key of the last txt_to_peaks
 
     def file_process(self, file_path: Path | None = None) -> pd.DataFrame:
         """
@@ -108,6 +112,7 @@ class DadChromatogram:
                 self.file_path = self.folder_path / Path(
                     f"{self.mongo_id} - DAD 2.1L- Channel {self.channel}.{self.file_extension}")
 
+        # both read from the same parsed export
         self.header_data, self.header_lines = self.parse_header(self.file_path)
         self.dataset = self.create_dataset(self.file_path)
 
@@ -119,17 +124,15 @@ class DadChromatogram:
         """
         if search_string is None:
             search_string = self.mongo_id
-
-        fitted_files = []
-        # Iterate over each file in the directory
-        for file_path in self.folder_path.iterdir():
-            if file_path.is_file():
-                if search_string in file_path.name:
-                    if self.channel:
-                        if f"Channel {self.channel}" in file_path.name:
-                            fitted_files.append(file_path)
-                    else:
-                        fitted_files.append(file_path)
+        search_string = str(search_string)
+
+        # the folder is not listed for every file: (mongo_id, channel) is looked up in the export index
+        index = get_export_index(self.folder_path, self.file_extension)
+        fitted_files = index.paths(search_string, self.channel) if self.channel else []
+        if not fitted_files:
+            # not a mongo_id (e.g. part of a file name): search the names in the index
+            fitted_files = [file_path for file_path in index.find(search_string)
+                            if not self.channel or f"Channel {self.channel}" in file_path.name]
         if len(fitted_files) == 1:
             return fitted_files[0]
         elif len(fitted_files) > 1:
@@ -152,57 +155,19 @@ class DadChromatogram:
         :param clarity_file: ASCII file to be analyzed
         :return: dict with header fields and length in lines
         """
-        header_data = {}
-
-        attempts = 0
-        # PermissionError [Errno 13] Permission denied will happened. try 3 time
-        # @tenacity.retry(stop=tenacity.stop_after_attempt(3), wait=tenacity.wait_fixed(10), reraise=True)
-        while attempts < 6:
-            try:
-                with file_name.open("r") as fh:
-
-                    for line_num, content in enumerate(fh):
-
-                        # Empty line signifies end of header
-                        if content == "\n":
-                            break
-
-                        try:
-                            field_name, field_content = content.split(" : ")
-                        except ValueError:  # field with no content
-                            try:
-                                field_name, field_content = content.split(": ")
-                            except ValueError:
-                                continue
-
-                        header_data[field_name] = field_content.strip()
-
-                return header_data, line_num + 1
-
-            except PermissionError as e:
-                attempts += 1
-                logger.error(f"{e}")
-                time.sleep(5)
-
-        raise PermissionError("cannot read the clarity txt file.")
+        export = read_clarity_ascii(file_name)
+        return export.header, export.header_lines
 
     def create_dataset(self,
                        file_name: Path) -> pd.DataFrame:
         """read in the hplc txt file"""
-
-        header_data, header_lines = self.parse_header(file_name)
+        export = read_clarity_ascii(file_name)
 
         # X dimension is retention time with units as minute in the source file
-        d = pd.read_csv(
-            file_name,
-            delimiter="\t",
-            skiprows=header_lines,
-            index_col="time (min.)",
-            header=0,
-            names=["time (min.)", "Absorbance [mAu]"],
-            encoding="cp852")
+        d = pd.DataFrame({"Absorbance [mAu]": export.signal},
+                         index=pd.Index(export.time, name="time (min.)"))
         # save header_data as metadata
-        d._metadata = header_data
+        d._metadata = export.header
         return d
 
     def process_chromatogram(self, ):
@@ -249,29 +214,38 @@ class DadChromatogram:
                     d_bg: pd.DataFrame,
                     d_raw: pd.DataFrame,
                     ROP: list | None = None,
-                    ):
+                    max_shift: float | None = None,
+                    ) -> float:
         """
-        Find the shift between the background and the raw data.
+        Find the shift between the background and the raw data by cross-correlation (anal_shift).
         :param d_bg: data points of the background chromatogram
         :param d_raw: data of the raw chromatogram
-        :param ROP: time region of peak to find the shift (IS)  # [start, end] of the peak
-        :return:
+        :param ROP: time region [start, end] compared to find the shift. default: the whole chromatogram
+        :param max_shift: largest shift searched (min). default: ACCEPTED_SHIFT
+        :return: shift of the background in its data points (may be a fraction), as used by align_background
         """
         if ROP is None:
-            ROP = self.peak_rt_range["IS"]
-
-        # find the target peak in both background and raw data
-        d_bg_shift = d_bg[ROP[0]:ROP[1]]
-        peaks_bg, properties_bg = self._find_peaks(d_bg_shift)
-        d_raw_shift = d_raw[ROP[0]:ROP[1]]
-        peaks_raw, properties_raw = self._find_peaks(d_raw_shift)
-
-        # find the shift between the background and raw data
-        shift = peaks_bg[0] - peaks_raw[0]
-        shift_time = d_bg_shift.index[peaks_bg[0]] - d_raw_shift.index[peaks_raw[0]]
-        logger.debug(f"Shift between background and raw data: {shift} data points ({shift_time} min).")
-
-        return shift
+            ROP = [-math.inf, math.inf]
+        if max_shift is None:
+            max_shift = self.ACCEPTED_SHIFT
+
+        # both chromatograms on the uniform grid of the raw data within the region
+        raw_time, bg_time = d_raw.index.to_numpy(), d_bg.index.to_numpy()
+        grid = uniform_grid(raw_time)
+        grid = grid[(grid >= ROP[0]) & (grid <= ROP[1])]
+        raw_signal = resample(raw_time, d_raw["Absorbance [mAu]"].to_numpy(), grid)
+        bg_signal = resample(bg_time, d_bg["Absorbance [mAu]"].to_numpy(), grid)
+
+        step = time_step(grid)
+        max_lag = math.ceil(max_shift / step)
+        shift = estimate_shift(raw_signal, bg_signal, max_lag=max_lag)
+        if abs(shift) >= max_lag:
+            # the best match at the limit: no common peak in the region
+            logger.warning(f"no shift found within {max_shift} min. The background is not shifted.")
+            return 0
+        shift_time = shift * step
+        logger.debug(f"Shift between background and raw data: {shift:.2f} data points ({shift_time:.4f} min).")
+        return shift_time / time_step(bg_time)
 
     def bg_subtraction(self,
                        file_path: Path,
@@ -280,24 +254,29 @@ class DadChromatogram:
                        plot: bool = False) -> tuple[pd.DataFrame, pd.DataFrame]:
 
         logger.info(f"Processing background subtraction.")
-        # parse the background file and raw file to dataframes
-        d_bg = self.create_dataset(bg_file_path)
-        d_raw = self.create_dataset(file_path)
-
-        if bg_shift:
-            logger.debug("Shift the background data to match the raw data.")
-            # fixme: shift the background data or raw data?
-            # shift the background data
-            shift = self._find_shift(d_bg, d_raw)
-            d_bg = d_bg.shift(-shift)
-
-        merged_df = pd.merge(d_raw, d_bg, left_index=True, right_index=True, suffixes=("_raw", "_bg"))
-        merged_df.fillna(0, inplace=True)
-
-        # merged_df["Absorbance [mAu]"] = merged_df["Absorbance [mAu]_raw"] - merged_df["Absorbance [mAu]_bg"]
-        col_names = merged_df.columns.to_list()
-        # subtract the background from the raw data
-        sub_d = pd.DataFrame(merged_df[col_names[0]] - merged_df[col_names[1]], columns=["Absorbance [mAu]"])
+        with timed_stage(self._processing, "read") as stage:
+            # the background is parsed once per campaign and kept in the store
+            background = get_background_store().get(bg_file_path, self.channel, self._hplc_config)
+            d_raw = self.create_dataset(file_path)
+            stage["n_points"] = len(d_raw)
+
+        with timed_stage(self._processing, "bg_sub") as stage:
+            shift = 0
+            if bg_shift:
+                logger.debug("Shift the background data to match the raw data.")
+                # shift the background data
+                shift = self._find_shift(background.to_frame(), d_raw)
+
+            rt, raw_signal, bg_signal = align_background(d_raw.index.to_numpy(),
+                                                         d_raw["Absorbance [mAu]"].to_numpy(),
+                                                         background,
+                                                         shift=shift)
+            rt = pd.Index(rt, name="time (min.)")
+            merged_df = pd.DataFrame({"Absorbance [mAu]_raw": raw_signal, "Absorbance [mAu]_bg": bg_signal}, index=rt)
+
+            # subtract the background from the raw data
+            sub_d = pd.DataFrame({"Absorbance [mAu]": raw_signal - bg_signal}, index=rt)
+            stage["n_points"] = len(sub_d)
 
         if plot:
             # Plot raw chromatogram (in gray)
@@ -317,16 +296,18 @@ class DadChromatogram:
 
     def signal_smooth(self,
                       d: pd.DataFrame):
-        # Apply median and FIR filter (set!)
-        d = d.apply(signal.medfilt, raw=True, kernel_size=19)
-
-        d = d.apply(self._smooth_by_fir_filter,
-                    raw=True,
-                    cutoff=1,
-                    sample_rate=int(self.dad_method["sampling_frequency"].split()[0]),
-                    transition_width=5,
-                    attenuation=60)
-        return d
+        # Apply median and FIR filter (set!) on all columns at once
+        # only the ROI (and the margins of the filters) is smoothed: same values as smoothing the whole run
+        region = region_slice(d.index.to_numpy(), self.roi)
+        with timed_stage(self._processing, "smoothed", n_points=d.size):
+            smoothed = smooth_region(d.to_numpy().T,
+                                     region,
+                                     sample_rate=int(self.dad_method["sampling_frequency"].split()[0]),
+                                     kernel_size=19,
+                                     cutoff=1,
+                                     transition_width=5,
+                                     attenuation=60)
+        return pd.DataFrame(smoothed.T, index=d.index[region], columns=d.columns)
 
     def _smooth_by_fir_filter(self,
                               ndarray,
@@ -343,17 +324,8 @@ class DadChromatogram:
         transition_width: width of transition from path to stop in Hz, rel to nyqvist rate
         attenuation: attenuation of stopband in dB
         """
-        nyq_rate = sample_rate / 2.0
-        width = transition_width / nyq_rate
-
-        # Compute the order and Kaiser parameter for the FIR filter.
-        N, beta = kaiserord(attenuation, width)
-
-        # Use firwin with a Kaiser window to create a lowpass FIR filter.
-        taps = firwin(N, cutoff / nyq_rate, window=('kaiser', beta))
-
-        # Use lfilter to filter x with the FIR filter.
-        return lfilter(taps, 1.0, ndarray)
+        # the taps are designed once per parameter set
+        return fir_filter(ndarray, cutoff, sample_rate, transition_width, attenuation)
 
     def check_quality(self,
                       d: pd.DataFrame,
@@ -384,7 +356,9 @@ class DadChromatogram:
                      file_path: Path | None = None,
                      bg_sub: bool = True,
                      bg_shift: bool = False,
-                     use_is_peak: bool = True
+                     use_is_peak: bool = True,
+                     render: str = "sync",
+                     use_cache: bool = True,
                      ) -> bool | dict[float, float]:
         """
         process the hplc data and return the peaks
@@ -392,76 +366,169 @@ class DadChromatogram:
         :param bg_sub: whether to use background subtraction
         :param bg_shift: whether to use background shift
         :param use_is_peak: whether to use IS peak to find the peaks
+        :param render: how to draw the plot of the result.
+            "sync": save the svg before returning (default), "background": save the svg in a worker process,
+            "none": no plotting. The plot spec is kept in self.plot_spec (not for a result from the cache).
+        :param use_cache: return the result of an identical analysis (same file contents, config and code) from the
+            result cache without parsing the file, and store new results in it.
 
         :return: the peak dictionary {retention_time: area} for further analysis
 
         """
+        if render not in ("sync", "background", "none"):
+            raise ValueError(f"render should be 'sync', 'background' or 'none', not {render}.")
+
         if file_path is None:
             if self.file_path is None:
                 self.file_process(file_path=self.file_path)
             file_path = self.file_path  # use the initailize path
+        self.reset_processing()
+
+        self.result_key = self.cache_key(file_path, bg_sub, bg_shift, use_is_peak) if use_cache else None
+        if self.result_key is not None:
+            cached = get_result_cache().get(self.result_key)
+            if cached is not None:
+                logger.info(f"result of {Path(file_path).name} from the result cache.")
+                return cached["peaks"]
+
+        d_raw, merged_db = self.load_raw(file_path, bg_sub, bg_shift)
+
+        # todo: change to Chromatogram class
+        # sp = Chromatogram(d_raw, "Absorbance [mAu]",  "time (min.)", region_of_interest=self.roi)
+
+        self.check_quality(d_raw)  # check (whole hplc exp time & performance of the experiment)
+        d = self.signal_smooth(d_raw)  # Apply median and FIR filter (set!) on the ROI
+
+        result = self.smoothed_to_peaks(d, d_raw, merged_db, use_is_peak=use_is_peak, render=render)
+        if self.result_key is not None:
+            get_result_cache().put(self.result_key, {"peaks": result})
+        return result
+
+    def cache_key(self,
+                  file_path: Path,
+                  bg_sub: bool = True,
+                  bg_shift: bool = False,
+                  use_is_peak: bool = True,
+                  ) -> str:
+        """result cache key: contents of the export and the background, hplc config, code version and options"""
+        file_paths = [file_path]
+        bg_file_path = self.folder_path / Path(self.bg_file_path)
+        if bg_sub and bg_file_path.exists():
+            file_paths.append(bg_file_path)
+        return get_result_cache().key(file_paths, self._hplc_config, channel=self.channel, bg_sub=bg_sub,
+                                      bg_shift=bg_shift, use_is_peak=use_is_peak)
+
+    def load_raw(self,
+                 file_path: Path,
+                 bg_sub: bool = True,
+                 bg_shift: bool = False,
+                 ) -> tuple[pd.DataFrame, pd.DataFrame | None]:
+        """
+        read the hplc data, with background subtraction if required
+        :return: the (subtracted) chromatogram and the merged raw/background data (None without bg_sub)
+        """
+        merged_db = None
         if bg_sub:
             try:
                 bg_file_path = self.folder_path / Path(self.bg_file_path)
                 d_raw, merged_db = self.bg_subtraction(file_path, bg_file_path, bg_shift)
             except FileNotFoundError as e:
                 logger.error(f"{e}")
-                bg_file_path = self._find_file(self.bg_file_path[f"channel_{self.channel}"])
+                bg_file_path = self._find_file(Path(self.bg_file_path).stem)
                 d_raw, merged_db = self.bg_subtraction(file_path, bg_file_path, bg_shift)
         else:
-            d_raw: pd.DataFrame = self.create_dataset(file_path)
-
-        # todo: change to Chromatogram class
-        # sp = Chromatogram(d_raw, "Absorbance [mAu]",  "time (min.)", region_of_interest=self.roi)
-
-        self.check_quality(d_raw)  # check (whole hplc exp time & performance of the experiment)
-        d = self.signal_smooth(d_raw)  # Apply median and FIR filter (set!)
-
+            with timed_stage(self._processing, "read") as stage:
+                d_raw: pd.DataFrame = self.create_dataset(file_path)
+                stage["n_points"] = len(d_raw)
+        return d_raw, merged_db
+
+    def reset_processing(self):
+        """start a new processing record"""
+        self._processing = new_processing_record()
+
+    @property
+    def processing_record(self) -> dict:
+        """stage timings of the last run: {"mongo_id", "channel", "total", "stages": {stage: {"wall_time", "n_points"}}}"""
+        return {"mongo_id": str(self.mongo_id),
+                "channel": self.channel,
+                "total": total_time(self._processing),
+                "stages": {stage: dict(entry) if entry else None for stage, entry in self._processing.items()}}
+
+    def smoothed_to_peaks(self,
+                          d: pd.DataFrame,
+                          d_raw: pd.DataFrame,
+                          merged_db: pd.DataFrame | None = None,
+                          use_is_peak: bool = True,
+                          render: str = "sync",
+                          ) -> bool | dict[float, float]:
+        """
+        from the smoothed chromatogram to the peaks: ROI, peak finding, baseline correction and integration
+        :param d: smoothed chromatogram
+        :param d_raw: chromatogram before smoothing (for the plot)
+        :param merged_db: raw and background data (for the plot)
+        :return: the peak dictionary {retention_time: area}
+        """
+        trim_d, peaks, properties, weights = self.baseline_weights(d)
+        with timed_stage(self._processing, "baseline"):
+            baseline = modpoly_baseline(trim_d["Absorbance [mAu]"].to_numpy(), trim_d.index.to_numpy(),
+                                        poly_order=3, weights=weights)
+        return self.baseline_to_peaks(trim_d, baseline, peaks, properties, d_raw, merged_db,
+                                      use_is_peak=use_is_peak, render=render)
+
+    def baseline_weights(self,
+                         d: pd.DataFrame,
+                         ) -> tuple[pd.DataFrame, np.ndarray, dict, np.ndarray]:
+        """
+        ROI of the smoothed chromatogram, first peak finding and the weights of the baseline fit
+        (the fit itself is done by smoothed_to_peaks or, for all channels at once, by MultiChannelChromatogram)
+        :return: trimmed chromatogram, peaks, peak properties and weights
+        """
         if not self.check_quality(d):
             raise ValueError("Chromatogram quality check failed.")  # check again
 
-        # Work on the region of interest: Cropping ROI after FIR prevents FIR-related boundary artifacts to affect baseline correction
+        # Work on the region of interest: the smoothing kept the filter margins outside the ROI, so there are no
+        # FIR-related boundary artifacts to affect baseline correction
         trim_d = d[self.roi[0]:self.roi[1]].copy()
 
-        # Plot raw chromatogram (in gray)
-        ax = merged_db.plot(
-            label="raw",  # the label for the plot that will be displayed in the legend
-            alpha=0.5,  # the transparency of the plot. 0 is completely transparent; 1 is completely opaque.
-            color="grey",
-            figsize=(20, 8),  # the size of the plot in inches (width, height
-            xlim=(0.1 * self.hplc_runtime, 0.9 * self.hplc_runtime),  # x limits of the current axes
-        )
-        d_raw.plot(label="subtracted", color="blue", linewidth=1.5, ax=ax)
-        # d["Absorbance [mAu]"].plot(label="smoothed", color="green", linewidth=1.5, ax=ax)  # PLOT smoothed graph
-        trim_d["Absorbance [mAu]"].plot(label="smoothed", color="green", linewidth=1.5, ax=ax)  # PLOT smoothed graph
-        ax.set_ylim(min(trim_d["Absorbance [mAu]"]) - 10,
-                    max(trim_d["Absorbance [mAu]"]) + 20)  # set y-axes of the current figure.
-
         # Find peaks after smoothed(first time....)
-        global_max = max(trim_d["Absorbance [mAu]"])
-        peaks, properties = self._find_peaks(
-            trim_d["Absorbance [mAu]"],
-            max_signal=global_max,
-            limit_height=global_max / 80,
-            limit_prominence=global_max / 45, )
-
-        # baseline correction
-        # Create a mask as weight for baseline calculation. 1=no peak, use for baseline 0=peak, ignore for baseline calc.
-        weights = np.ones(len(trim_d))
-        trim_d["dAbs"] = np.diff(trim_d["Absorbance [mAu]"], prepend=0)  # Calculate derivative
-        trim_d.fillna(0, inplace=True)
-
-        for base_left, base_right in zip(properties["left_ips"], properties["right_ips"]):
-            # Sets weights for baseline calculation to 0 in the peak range
-            weights[round(base_left): round(base_right)] = 0
-
-        trim_d["baseline_0"], _ = pybaselines.polynomial.modpoly(
-            trim_d["Absorbance [mAu]"], trim_d.index, poly_order=3, weights=weights
-        )
-        trim_d["corr_0"] = trim_d["Absorbance [mAu]"] - trim_d["baseline_0"]
-        trim_d["corr_0"].plot(
-            ax=ax, label="smoothed+baseline corrected_0", alpha=0.5, color="green", )
-        trim_d["dCorr"] = np.diff(trim_d["corr_0"], prepend=0)
+        with timed_stage(self._processing, "peaks_detected", n_points=len(trim_d)):
+            global_max = max(trim_d["Absorbance [mAu]"])
+            peaks, properties = self._find_peaks(
+                trim_d["Absorbance [mAu]"],
+                max_signal=global_max,
+                limit_height=global_max / 80,
+                limit_prominence=global_max / 45, )
+
+        with timed_stage(self._processing, "baseline", n_points=len(trim_d)):
+            # Create a mask as weight for baseline calculation. 1=no peak, use for baseline 0=peak, ignore for baseline calc.
+            weights = np.ones(len(trim_d))
+            trim_d["dAbs"] = np.diff(trim_d["Absorbance [mAu]"], prepend=0)  # Calculate derivative
+            trim_d.fillna(0, inplace=True)
+
+            for base_left, base_right in zip(properties["left_ips"], properties["right_ips"]):
+                # Sets weights for baseline calculation to 0 in the peak range
+                weights[round(base_left): round(base_right)] = 0
+        return trim_d, peaks, properties, weights
+
+    def baseline_to_peaks(self,
+                          trim_d: pd.DataFrame,
+                          baseline: np.ndarray,
+                          peaks: np.ndarray,
+                          properties: dict,
+                          d_raw: pd.DataFrame,
+                          merged_db: pd.DataFrame | None = None,
+                          use_is_peak: bool = True,
+                          render: str = "sync",
+                          ) -> bool | dict[float, float]:
+        """
+        baseline correction with the fitted baseline, IS check, peak finding and integration
+        :param baseline: modpoly baseline of trim_d (see baseline_weights)
+        :return: the peak dictionary {retention_time: area}
+        """
+        with timed_stage(self._processing, "baseline"):
+            trim_d["baseline_0"] = baseline
+            trim_d["corr_0"] = trim_d["Absorbance [mAu]"] - trim_d["baseline_0"]
+            trim_d["dCorr"] = np.diff(trim_d["corr_0"], prepend=0)
 
         # Find peaks after baseline correction (second time....)
         # global_max = max(trim_d["corr_0"])
@@ -480,93 +547,97 @@ class DadChromatogram:
                     trim_d["corr_0"][self.peak_rt_range['is'][0]:self.peak_rt_range["is"][1]],
                     minimum_signal=3.0):
                 logger.error(f"After baseline correction, IS peak is below 3.0 mAu, skipped.")
+                get_stage_stats().add(self._processing)
                 return False
 
-            peaks, properties = self._find_peaks(
-                trim_d["corr_0"],
-                max_signal=local_max,
-                limit_height=local_max / 50,
-                limit_prominence=local_max / 45, )
+            with timed_stage(self._processing, "peaks_detected"):
+                peaks, properties = self._find_peaks(
+                    trim_d["corr_0"],
+                    max_signal=local_max,
+                    limit_height=local_max / 50,
+                    limit_prominence=local_max / 45, )
 
         hplc_result_dic = {}
         # Define peak boundaries and integrate based on corrected spectrum
         # Also check https://github.com/HaasCP/mocca/blob/90a2143a889b28be96b0502ee107216e73870681/src/mocca/peak/expand.py#L14
-        for center, base_left, base_right in zip(
-                peaks, properties["left_ips"], properties["right_ips"]
-        ):
-            # Start from find_peaks positions (i.e. width at half max)
-            left_in_min = trim_d.index[int(base_left)]
-            right_in_min = trim_d.index[int(base_right)]
-
-            # Failsafe to ensure these are set
-            peak_start = trim_d.index[0]
-            peak_end = trim_d.index[-1]
-
-            # We rely on the chromatogram to be smoothed at this point!
-            # Iterate left side of peak from right to left (i.e. np.flip)
-            # for steps, derivative_value in enumerate(np.flip(d["dAbs"][:left_in_min])):
-            for steps, derivative_value in enumerate(np.flip(trim_d["dCorr"][:left_in_min])):
-                if derivative_value < 1e-2:  # original 1e-3
-                    peak_start = trim_d.index[
-                        int(base_left) - steps + 1
-                        ]  # +1 ensures non-overlapping peaks
-                    break
-
-            # Iterate right side from left to right
-            # for steps, derivative_value in enumerate(d["dAbs"][right_in_min:]):
-            for steps, derivative_value in enumerate(trim_d["dCorr"][right_in_min:]):
-                if derivative_value > -1e-2:  # original -1e-3
-                    peak_end = trim_d.index[int(base_right) + steps]
-                    break
-
+        # We rely on the chromatogram to be smoothed at this point!
+        with timed_stage(self._processing, "integration", n_points=len(peaks)):
+            rt = trim_d.index.to_numpy()
+            starts, ends = find_peak_boundaries(trim_d["dCorr"].to_numpy(),
+                                                properties["left_ips"],
+                                                properties["right_ips"],
+                                                threshold=1e-2)  # original 1e-3
             # Integrate peak based on signal after baseline correction
-            peak = trim_d["corr_0"][peak_start:peak_end]
-            area = trapezoid(y=peak, x=peak.index)
-
-            # print(f"peak{d.index[int(center)]}: {area}")
-            # save the analysis result to a dictionary
-            hplc_result_dic[trim_d.index[int(center)]] = area
-
-            # Annotate 註解 peak area
-            ax.annotate(
-                f"{trim_d.index[int(center)]:0.2f}/{area:0.2f}",
-                xy=(trim_d.index[int(center)], d["Absorbance [mAu]"].values[int(center)]),
-                xytext=(-5, 0),
-                rotation=90,
-                textcoords="offset points",
-            )
-
-            # Sets weights for baseline calculation to 0 in the peak range
-            weights[trim_d.index.get_loc(peak_start): trim_d.index.get_loc(peak_end)] = 0
-
-            # Plot integration limits
-            ax.axvspan(peak_start, peak_end, facecolor="pink", edgecolor="black", alpha=0.5)
-
-        # Plot initial peak width
-        for num, (height, left, right) in enumerate(
-                zip(
-                    properties["width_heights"], properties["left_ips"], properties["right_ips"]
-                )
-        ):
-            plt.hlines(  # 用於在圖表中畫一條水平線
-                height,
-                trim_d.index[int(left)],
-                trim_d.index[int(right)],
-                color=f"C{num}",
-                linewidth=4,
-            )
-        ax.legend(["raw", "smoothed", "baseline_correction"])
-
-        plot_file_name = f"{datetime.date.today()}_{self.mongo_id}_channel_{self.channel}.svg"
-        plot_folder_path = Path(r"W:\BS-FlowChemistry\data\exported_chromatograms\plots_wei")
-        plot_file_path = plot_folder_path / Path(plot_file_name)
-        plt.savefig(plot_file_path)
+            areas = integrate_peaks(trim_d["corr_0"].to_numpy(), rt, starts, ends)
+
+            for center, area in zip(peaks, areas):
+                # save the analysis result to a dictionary
+                hplc_result_dic[rt[center]] = area
+
+        with timed_stage(self._processing, "plot", n_points=len(trim_d)):
+            self.plot_spec = self._create_plot_spec(merged_db, d_raw, trim_d, peaks, properties, starts, ends, areas)
+            if render != "none":
+                plot_file_name = f"{datetime.date.today()}_{self.mongo_id}_channel_{self.channel}.svg"
+                plot_folder_path = Path(r"W:\BS-FlowChemistry\data\exported_chromatograms\plots_wei")
+                plot_file_path = plot_folder_path / Path(plot_file_name)
+                if render == "sync":
+                    render_plot_spec(self.plot_spec, plot_file_path)
+                else:
+                    get_render_pool().submit(self.plot_spec, plot_file_path)
+        get_stage_stats().add(self._processing)
         # csv_file_name = f"{datetime.date.today()}_{mongo_id}_{wavelength}.csv"
         # csv_file_path = plot_folder_path / Path(csv_file_name)
         # d.to_csv(csv_file_path, index=True)
 
         return hplc_result_dic
 
+    def _create_plot_spec(self,
+                          merged_db: pd.DataFrame | None,
+                          d_raw: pd.DataFrame,
+                          trim_d: pd.DataFrame,
+                          peaks: ndarray,
+                          properties: Dict[str, ndarray],
+                          starts: ndarray,
+                          ends: ndarray,
+                          areas: ndarray,
+                          ) -> dict:
+        """
+        collect everything for the plot of txt_to_peaks as a serializable dict (see anal_plot_render)
+        """
+        rt = trim_d.index.to_numpy()
+        lines = []
+        # raw chromatogram and background (in gray)
+        if merged_db is not None:
+            for col in merged_db.columns:
+                lines.append({"label": col, "x": merged_db.index.to_list(), "y": merged_db[col].to_list(),
+                              "color": "grey", "alpha": 0.5})
+        lines.append({"label": "subtracted", "x": d_raw.index.to_list(), "y": d_raw["Absorbance [mAu]"].to_list(),
+                      "color": "blue", "linewidth": 1.5})
+        lines.append({"label": "smoothed", "x": rt.tolist(), "y": trim_d["Absorbance [mAu]"].to_list(),
+                      "color": "green", "linewidth": 1.5})
+        lines.append({"label": "smoothed+baseline corrected_0", "x": rt.tolist(), "y": trim_d["corr_0"].to_list(),
+                      "color": "green", "alpha": 0.5})
+
+        return {
+            "mongo_id": str(self.mongo_id),
+            "channel": self.channel,
+            "figsize": (20, 8),
+            "xlim": (0.1 * self.hplc_runtime, 0.9 * self.hplc_runtime),
+            "ylim": (float(trim_d["Absorbance [mAu]"].min()) - 10, float(trim_d["Absorbance [mAu]"].max()) + 20),
+            "lines": lines,
+            "annotations": [{"text": f"{rt[center]:0.2f}/{area:0.2f}",
+                             "x": float(rt[center]),
+                             "y": float(trim_d["Absorbance [mAu]"].iat[center])}
+                            for center, area in zip(peaks, areas)],
+            "spans": [{"start": float(rt[start]), "end": float(rt[end])} for start, end in zip(starts, ends)],
+            "hlines": [{"y": float(height), "xmin": float(rt[int(left)]), "xmax": float(rt[int(right)]),
+                        "color": f"C{num}"}
+                       for num, (height, left, right) in enumerate(zip(properties["width_heights"],
+                                                                       properties["left_ips"],
+                                                                       properties["right_ips"]))],
+            "legend": ["raw", "smoothed", "baseline_correction"],
+        }
+
     def plot_chromatogram(self,
                           d_raw: pd.DataFrame,  # raw data
                           d: pd.DataFrame,
@@ -631,18 +702,15 @@ class DadChromatogram:
 
 if __name__ == "__main__":
     from BV_experiments.Example3_debenzylation.db_doc import SecondDebenzylation
+    from BV_experiments.src.general_platform.Analysis.anal_multichannel import MultiChannelChromatogram
 
     hplc_info_dict = SecondDebenzylation.hplc_config_info.dict()
     # hplc_info_dict = {attr: getattr(HPLCConfig, attr) for attr in dir(HPLCConfig) if
     #                   not callable(getattr(HPLCConfig, attr)) and not attr.startswith("__")}
 
 
-    for channel in range(3):
-        # fixme: should be general to all channel :(
-        chrom = DadChromatogram("yxy001_ctrl_153",
-                                SecondDebenzylation.hplc_config_info,
-                                channel=channel,
-                                file_path=Path(fr"W:\BS-FlowChemistry\data\exported_chromatograms\yxy001_ctrl_153 - DAD 2.1L- Channel {channel}.txt"),)
-        print(chrom.txt_to_peaks(use_is_peak=False))  # with saving the plot
-
-
+    # all channels in one pass (one directory scan, one smoothing call)
+    chrom = MultiChannelChromatogram("yxy001_ctrl_153",
+                                     SecondDebenzylation.hplc_config_info,
+                                     channels=[1, 2, 3])
+    print(chrom.txt_to_peaks(use_is_peak=False, render="sync"))  # with saving the plot
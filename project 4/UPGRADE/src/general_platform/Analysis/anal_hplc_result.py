@@ -7,8 +7,11 @@ from loguru import logger
 
 from typing import Any, List
 import math
+import numpy as np
+import pandas as pd
 from BV_experiments.src.general_platform import IncompleteAnalysis
 from BV_experiments.src.general_platform.Librarian import HplcConfig
+from BV_experiments.src.general_platform.Analysis.anal_shift import estimate_pattern_shift
 
 
 class AnalysisProcessor:
@@ -122,10 +125,105 @@ class AnalysisProcessor:
         if "concentration" not in condition:
             raise ValueError("Concentration not found in condition.")
 
-        sty = yield_val * condition["concentation"]/ condition["time"]
+        sty = yield_val * condition["concentration"] / condition["time"]
         return sty
 
 
+def calibration_arrays(hplc_config: HplcConfig | dict[str, Any],
+                       channel: int,
+                       species: list[str],
+                       ) -> tuple[np.ndarray, np.ndarray, float]:
+    """
+    calibration curves (area / area_is = a * conc + b) of the species as arrays
+    :return: a and b per species (nan: no curve for the species) and the initial concentration
+    """
+    if type(hplc_config) is HplcConfig:
+        calibration = hplc_config.CALIBRATION
+    else:
+        calibration = hplc_config["CALIBRATION"]
+    curves = calibration[f"channel_{channel}"]
+    a = np.array([curves[name][0] if name in curves else np.nan for name in species], dtype=np.float64)
+    b = np.array([curves[name][1] if name in curves else np.nan for name in species], dtype=np.float64)
+    return a, b, float(calibration[f"channel_{channel}_initial_conc"])
+
+
+def evaluate_experiments(areas: pd.DataFrame,
+                         hplc_config: HplcConfig | dict[str, Any],
+                         channel: int,
+                         cc_is: str = "is",
+                         y2: list = ["product"],
+                         conv2: list = ["sm"],
+                         conditions: pd.DataFrame | None = None,
+                         ) -> pd.DataFrame:
+    """
+    yield, conversion and space-time yield of many experiments at once (same calculation as
+    AnalysisProcessor.yield_conv_by_cc), e.g. to rebuild the training set after a new calibration.
+    :param areas: aligned peak areas, one row per experiment, one column per species (NaN or no column: not found)
+    :param conditions: "concentration" and "time" of the experiments (index as areas), for the space-time yield
+    :return: "yield" and "conversion" (and "sty") per experiment. NaN if the internal standard is missing or zero.
+    """
+    is_area = areas[cc_is].to_numpy(dtype=np.float64) if cc_is in areas else np.full(len(areas), np.nan)
+    is_area = np.where(is_area == 0, np.nan, is_area)
+
+    def total_conc(names: list[str]) -> tuple[np.ndarray, float]:
+        # species without peak column or calibration curve do not count
+        a, b, initial_conc = calibration_arrays(hplc_config, channel, names)
+        ratio = areas.reindex(columns=names).to_numpy(dtype=np.float64) / is_area[:, None]
+        return np.nansum((ratio - b) / a, axis=1), initial_conc
+
+    conc_conv_total, initial_conc = total_conc(list(conv2))
+    conc_yield_total, _ = total_conc(list(y2))
+    valid = ~np.isnan(is_area)
+
+    result = pd.DataFrame({"yield": np.where(valid, conc_yield_total / initial_conc, np.nan),
+                           "conversion": np.where(valid, (initial_conc - conc_conv_total) / initial_conc, np.nan)},
+                          index=areas.index)
+    if conditions is not None:
+        conditions = conditions.reindex(areas.index)
+        result["sty"] = result["yield"] * conditions["concentration"] / conditions["time"]
+    return result
+
+
+class RetentionTimeIndex:
+    """
+    retention times of the found peaks sorted once: the peaks in a window are a slice, found by two binary searches
+    """
+
+    def __init__(self, raw_peak_dict: dict):
+        self.areas: list = list(raw_peak_dict.values())
+        rt = np.array([float(key) for key in raw_peak_dict], dtype=np.float64)
+        self.order = np.argsort(rt, kind="stable")  # position in raw_peak_dict of each sorted peak
+        self.rt = rt[self.order]
+
+    def __len__(self):
+        return len(self.rt)
+
+    def windows(self,
+                rt_min: np.ndarray,
+                rt_max: np.ndarray,
+                closed: bool = True,
+                ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        peaks with rt_min <= rt <= rt_max (closed) or rt_min < rt < rt_max (any shape of windows)
+        :return: start and end (exclusive) of each window in the sorted retention times
+        """
+        if closed:
+            return np.searchsorted(self.rt, rt_min, side="left"), np.searchsorted(self.rt, rt_max, side="right")
+        return np.searchsorted(self.rt, rt_min, side="right"), np.searchsorted(self.rt, rt_max, side="left")
+
+    def nearest(self,
+                target_rt: float,
+                k: int = 2,
+                ) -> list[tuple[float, float]]:
+        """
+        the k peaks nearest to target_rt (only the neighbours of the insertion point are compared)
+        :return: [(rt, distance)] sorted by distance
+        """
+        position = int(np.searchsorted(self.rt, target_rt))
+        neighbours = self.rt[max(0, position - k):position + k]
+        return sorted(((float(rt), abs(float(rt) - target_rt)) for rt in neighbours), key=lambda x: x[1])[:k]
+
+
 class PeakAlignment:
     def __init__(self,
                  raw_peak_dict: dict[float: float],
@@ -166,6 +264,7 @@ class PeakAlignment:
         # process data storage
         self.new_rt: dict = {}
         self.found_shift = None
+        self.rt_index = RetentionTimeIndex(raw_peak_dict)
 
     def _calc_max_acpt_shift(self,
                              percentage: float = 0.02) -> float:
@@ -180,6 +279,24 @@ class PeakAlignment:
                      f"current used acceptable shift: {self.ACCEPTED_SHIFT}")
         return max_acpt_shift
 
+    def _accepted(self,
+                  shift: float,
+                  peak_rt: float | str) -> float:
+        """
+        the shift if it is within ACCEPTED_SHIFT, else 0: a peak found further away (e.g. a neighbour of the IS
+        when the IS is not among the top peaks) is not the checked peak, the whole table must not be moved onto it
+        :param peak_rt: the checked peak (retention time, or a description for the log)
+        """
+        if abs(shift) > self.ACCEPTED_SHIFT:
+            found_for = peak_rt if isinstance(peak_rt, str) else f"the peak found for {peak_rt} min"
+            logger.warning(f"{found_for} is shifted by {shift:.3f} min (accepted shift "
+                           f"{self.ACCEPTED_SHIFT} min): not used, no shift is applied.")
+            return 0
+        return shift
+
+    def _rt_index(self, check_dict: dict) -> RetentionTimeIndex:
+        return self.rt_index if check_dict is self.raw_peak_dict else RetentionTimeIndex(check_dict)
+
     def check_spec_peak(self,
                         check_dict: dict,
                         check_peak_rt: float,
@@ -195,14 +312,10 @@ class PeakAlignment:
 
         # check sampling by check tol peak
         check_rt_range = [check_peak_rt - shift, check_peak_rt + shift]
-        possible_peak = []
-
-        for found_peak_rt in check_dict.keys():
-            # found_peak_rt = float(list_peak_rt)  # str --> float
-            if check_rt_range[0] < found_peak_rt < check_rt_range[1]:
-                d_check = found_peak_rt - check_peak_rt
-                logger.debug(f"find a potential peak ({found_peak_rt} min), shifting of the peak is {d_check:.4f} min")
-                possible_peak.append([found_peak_rt, d_check])
+        rt_index = self._rt_index(check_dict)
+        start, end = rt_index.windows(check_rt_range[0], check_rt_range[1], closed=False)
+        possible_peak = [[float(found_peak_rt), float(found_peak_rt) - check_peak_rt]
+                         for found_peak_rt in rt_index.rt[start:end]]
 
         nos_peak = len(possible_peak)
         if nos_peak > 1:
@@ -221,17 +334,27 @@ class PeakAlignment:
                     step: float = 0.05
                     ) -> tuple[float, float] | bool:
         """
-        Iteratively find the right accepted_shift value that results in only one matched peak.
-        Returns: matched peak or False if not found.
+        find the smallest accepted_shift (int_shift, int_shift + step, ... max_shift) that results in only one matched peak.
+        The window check_peak_rt ± accepted_shift holds only the nearest peak if accepted_shift is larger than its
+        distance and not larger than the distance of the second nearest peak, so no window has to be scanned.
+        Returns: (found_peak_rt, shift of the peak) or False if not found.
         """
-        shift = int_shift if int_shift is not None else step
-
-        while shift <= max_shift:
-            possible_peak = self.check_spec_peak(check_dict, check_peak_rt, shift)
-            if len(possible_peak) == 1:
-                logger.info(f"Found a unique peak with accepted_shift = {shift:.2f}")
-                return possible_peak[0][0]  # reture found_peak_rt, shift
-            shift += step
+        # the accepted_shift steps (summed like a stepping loop would)
+        shift_steps = [int_shift if int_shift is not None else step]
+        while shift_steps[-1] + step <= max_shift:
+            shift_steps.append(shift_steps[-1] + step)
+        shift_steps = np.array(shift_steps if shift_steps[0] <= max_shift else [])
+
+        nearest = self._rt_index(check_dict).nearest(check_peak_rt, k=2)
+        if nearest and shift_steps.size:
+            # the window of a step holds only the nearest peak if the second nearest is outside of it
+            inside = [(check_peak_rt - shift_steps < rt) & (rt < check_peak_rt + shift_steps) for rt, _ in nearest]
+            unique = inside[0] & ~inside[1] if len(inside) > 1 else inside[0]
+            if unique.any():
+                found_peak_rt = nearest[0][0]
+                logger.info(f"Found a unique peak ({found_peak_rt} min) with accepted_shift = "
+                            f"{shift_steps[unique.argmax()]:.2f}")
+                return found_peak_rt, found_peak_rt - check_peak_rt
 
         logger.error(f"Could not find a unique peak within {max_shift} min shift range.")
         return False
@@ -254,15 +377,17 @@ class PeakAlignment:
         else:
             used_peak_rt = check_peak
         logger.debug(f"used peak rt: {used_peak_rt}")
+        return used_peak_rt
 
     def one_peak_range_gen(self,
                            check_dict: dict,
                            check_peak: str | float = "is",
                            int_shift: float | None = None,
                            max_shift: float = 0.9,  # in min
-                           ) -> None:
+                           ) -> float:
         """
-
+        find the shift of one peak and generate the new retention time dictionary (self.new_rt)
+        :return: the found shift (0 if the peak was not found)
         """
         # TODO: the hplc shifting issue cannot be solved now. the shift is not stable.
 
@@ -275,43 +400,46 @@ class PeakAlignment:
         if not check_peak_info:
             logger.error(f"fail to find the peak. check.")
 
-        new_peak_rt, shift = check_peak_info if check_peak_info else used_peak_rt, 0
+        new_peak_rt, shift = check_peak_info if check_peak_info else (used_peak_rt, 0)
         logger.debug(f"original peak ({check_peak})  {check_peak_info}")
+        shift = self._accepted(shift, used_peak_rt)
 
         # generate new retention time dictionary
         self.found_shift = shift
         self.new_rt = {key: (value + shift) for key, value in self.PEAK_RT.items()}
+        return shift
 
     def mul_peak_range_gen(self,
                            peak_1_rt: float,
                            peak_2_rt: float,
-                           ):
+                           ) -> float:
+        """
+        find the shift by the nearer found peak of two and generate the new retention time dictionary (self.new_rt)
+        :return: the found shift (0 if neither peak was found)
+        """
 
         # fixme: input should be both str or both float
 
         # check the peak
         check_peak1_info = self.peak_finder(self.raw_peak_dict, peak_1_rt, int_shift=0.25)
         check_peak2_info = self.peak_finder(self.raw_peak_dict, peak_2_rt, int_shift=0.25)
-        n_peak1_rt, shift1 = check_peak1_info if check_peak1_info else peak_1_rt, math.inf
-        n_peak2_rt, shift2 = check_peak2_info if check_peak2_info else peak_2_rt, math.inf
+        n_peak1_rt, shift1 = check_peak1_info if check_peak1_info else (peak_1_rt, math.inf)
+        n_peak2_rt, shift2 = check_peak2_info if check_peak2_info else (peak_2_rt, math.inf)
 
-        if abs(shift1) > abs(shift2):
+        if math.isinf(shift1) and math.isinf(shift2):
+            logger.error("both peaks are not found. check.")
+            shift = 0
+        elif abs(shift1) > abs(shift2):
             logger.debug(f"peak ({peak_2_rt}) was used")
             shift = shift2
-
-        elif abs(shift1) < abs(shift2):
+        else:
             logger.debug(f"peak ({peak_1_rt}) was used")
             shift = shift1
-
-        elif shift1 == shift2 and shift1 == 0:
-            logger.debug(f"shift1 is equal to shift2")
-            shift = shift1
-        else:
-            logger.error("both peaks are not found. check.")
-            shift = 0
+        shift = self._accepted(shift, peak_1_rt if shift == shift1 else peak_2_rt)
 
         self.found_shift = shift
         self.new_rt = {key: (value + shift) for key, value in self.PEAK_RT.items()}
+        return shift
 
     def _sort_top_peaks(self,
                         rt_range: list | None = None,
@@ -337,15 +465,14 @@ class PeakAlignment:
                            n: int = 5,
                            checked_peak: str | float = "is",
                            checking_shifting: float = 1.5,
-                           ):
+                           ) -> float:
 
         """
         idea of this is to find the shifting by the top 5 maximum peaks (which should be the IS peaks)
         find the shifting by the top 5 maximum peaks, and create a new retention time dictionary
 
         :param n: the number of peaks to find the shifting
-        :param hplc_result_dict:  the raw peak list from the hplc chromatogram parse
-        :return: a new retention time dictionary, and peak used to find the shifting
+        :return: the found shift (self.new_rt is the new retention time dictionary)
         """
         # process the peak name
         used_peak_rt = self._peak_name_processor(checked_peak)
@@ -367,12 +494,51 @@ class PeakAlignment:
         # use peak finder to find the shifting of one peak, and generate new retention time dictionary
         return self.one_peak_range_gen(potential_find_peaks, used_peak_rt, int_shift=0.25)
 
+    def xcorr_range_gen(self,
+                        max_shift: float | None = None,
+                        resolution: float = 0.002,
+                        match_tolerance: float = 0.05,
+                        ) -> float:
+        """
+        find the shift of all expected peaks at once: the expected retention times (PEAK_RT) and the found peaks are
+        cross-correlated (anal_shift), so one missing or extra peak does not decide the shift.
+        no shift is applied if the best match is at the end of the searched range, if no found peak is within
+        match_tolerance (min) of a shifted expected peak (no common peak, the correlation maximum is arbitrary) or if
+        the shift is larger than ACCEPTED_SHIFT.
+        :param max_shift: largest shift searched (min). default: 2 % of the hplc run time
+        :return: the found shift (self.new_rt is the new retention time dictionary)
+        """
+        if max_shift is None:
+            max_shift = self._calc_max_acpt_shift()
+        if len(self.rt_index) == 0 or not self.PEAK_RT:
+            logger.error("no peaks to find the shift. check.")
+            shift = 0
+        else:
+            expected = np.array(list(self.PEAK_RT.values()), dtype=np.float64)
+            shift = estimate_pattern_shift(expected, self.rt_index.rt, max_shift, resolution=resolution)
+            logger.debug(f"shift of the peaks by cross-correlation: {shift:.4f} min")
+            if abs(shift) >= max_shift:
+                # the best match at the limit: no common peak in the range
+                logger.warning(f"no shift found within {max_shift} min. no shift is applied.")
+                shift = 0
+            elif all(self.rt_index.nearest(rt + shift, k=1)[0][1] > match_tolerance for rt in expected):
+                logger.warning(f"no found peak matches the expected peaks shifted by {shift:.3f} min. "
+                               f"no shift is applied.")
+                shift = 0
+            else:
+                shift = self._accepted(shift, "the expected peaks")
+
+        self.found_shift = shift
+        self.new_rt = {key: (value + shift) for key, value in self.PEAK_RT.items()}
+        return shift
+
     def align(self,
               shift_levels: list = [0.35, 0.22, 0.15, 0.1, 0.05, 0.0],
               checked_shift_peak: str | float | None = "is",
               int_shift: float | None = None,
               max_shift: float | None = None,
               step: float = 0.05,
+              shift_method: str = "top_peaks",
               ):
         """
         original alignment method start from
@@ -380,6 +546,8 @@ class PeakAlignment:
         2. assign the peak by the new retention time dictionary (acceptable range 0.35, 0.22, 0.15)
         3. if 0.15 acceptable range failed. just used the highest peak in range of 0.22
 
+        :param shift_method: how the shift is found in step 1 (checked_shift_peak not None).
+            "top_peaks": by checked_shift_peak among the top 5 peaks, "xcorr": cross-correlation of all peaks
         :return:
         peaks: peaks used to calculate the result
         used_shift_peak: to check the is used for shift finding and result calculation is same
@@ -388,6 +556,8 @@ class PeakAlignment:
         if checked_shift_peak is None:
             self.found_shift = 0
             self.new_rt = self.PEAK_RT
+        elif shift_method == "xcorr":
+            self.xcorr_range_gen()  # update self.new_rt & self.shift
         else:
             self.top_peak_range_gen(checked_peak=checked_shift_peak)  # update self.new_rt & self.shift
 
@@ -401,43 +571,39 @@ class PeakAlignment:
             # find rest_acpted_shift
             max_shift = self._calc_max_acpt_shift()  # todo: acceptable shift calculation by percentage
 
-        # find the peaks in the range
-        for peak_name, expected_rt in self.new_rt.items():
-            assigned = False
-            final_candidates = []
-
-            for shift in shift_levels:
-                rt_min = expected_rt - shift
-                rt_max = expected_rt + shift
-
-                # Find peaks within range
-                candidates = [
-                    (float(rt), intensity)
-                    for rt, intensity in self.raw_peak_dict.items()
-                    if rt_min <= float(rt) <= rt_max
-                ]
-
-                if len(candidates) == 1:
-                    ali_peaks[peak_name] = candidates[0][1]
-                    assigned = True
-                    break
-
-                elif len(candidates) > 1:
-                    logger.warning(
-                        f"{len(candidates)} peaks found for '{peak_name}' in ±{shift} min. "
-                        f"Trying tighter range..."
-                    )
-                    final_candidates = candidates  # keep for fallback
-
-            if not assigned:
-                if final_candidates:
-                    logger.error(
-                        f"Multiple peaks remain for '{peak_name}' after all shifts. "
-                        f"Using highest intensity."
-                    )
-                    ali_peaks[peak_name] = max(final_candidates, key=lambda x: x[1])[1]
-                else:
-                    logger.error(f"No peaks found for '{peak_name}' in any range.")
+        if not self.new_rt:
+            return ali_peaks
+
+        # windows of all expected peaks x shift levels at once: number of peaks = end - start
+        names = list(self.new_rt)
+        expected = np.array([self.new_rt[name] for name in names], dtype=np.float64)[:, None]
+        shifts = np.array(shift_levels, dtype=np.float64)[None, :]
+        starts, ends = self.rt_index.windows(expected - shifts, expected + shifts)
+        counts = ends - starts
+
+        # the first shift level with exactly one peak
+        unique = counts == 1
+        first_unique = unique.argmax(axis=1)
+        multiple = counts > 1
+        for row, peak_name in enumerate(names):
+            if unique[row].any():
+                level = first_unique[row]
+                if multiple[row, :level].any():
+                    logger.warning(f"{counts[row, :level].max()} peaks found for '{peak_name}' in "
+                                   f"±{shift_levels[multiple[row, :level].argmax()]} min. Tighter range was used.")
+                ali_peaks[peak_name] = self.rt_index.areas[self.rt_index.order[starts[row, level]]]
+            elif multiple[row].any():
+                # the candidates of the last (tightest) shift level with more than one peak
+                level = len(shift_levels) - 1 - multiple[row, ::-1].argmax()
+                logger.error(
+                    f"Multiple peaks remain for '{peak_name}' after all shifts. "
+                    f"Using highest intensity."
+                )
+                # highest area, first in raw_peak_dict if equal
+                positions = np.sort(self.rt_index.order[starts[row, level]:ends[row, level]])
+                ali_peaks[peak_name] = max((self.rt_index.areas[pos] for pos in positions), key=float)
+            else:
+                logger.error(f"No peaks found for '{peak_name}' in any range.")
 
         return ali_peaks
 
@@ -0,0 +1,150 @@
+"""
+wavenumber axes of the IR instruments
+the axis of an instrument is kept once as a read-only float64 array, keyed by instrument and resolution (spacing of
+the data points, cm-1), with the index slices of the configured bands. The live processing (flowir) and the offline
+processing of saved spectra share the same axis, a spectrum is then only sliced.
+the bands are compiled once into a sparse (n_bands x n_points) matrix of trapezoid weights: all band areas of a
+spectrum, or of a stack of spectra, are one matrix product.
+"""
+import numpy as np
+from loguru import logger
+from numpy import ndarray
+from scipy import sparse
+
+# region of interest of the sulfoxide method (cm-1, from high to low wavenumber, both included)
+IR_ROI = (1783, 872)
+# bands of the sulfoxide method (cm-1, from high to low wavenumber, both included)
+IR_BANDS = {
+    "acetone_1": (1735, 1670),
+    "acetone_2": (1265, 1211),
+    "RB_1": (1650, 1558),
+    "RB_2": (1556, 1476),
+    "sulfoxide": (1056, 965),
+}
+
+# ReactIR (flowir): 900 points from 4001.39 to 648.87 cm-1
+REACTIR_AXIS = np.linspace(4001.3872542256963, 648.8736087932758, 900)
+
+
+def axis_resolution(wavenumber: ndarray) -> float:
+    """spacing of the data points (cm-1), the resolution part of the registry key"""
+    return round(abs(float(wavenumber[-1] - wavenumber[0])) / (len(wavenumber) - 1), 3)
+
+
+class WavenumberAxis:
+    """wavenumber axis of one instrument and the index slices of its bands"""
+
+    def __init__(self,
+                 wavenumber: ndarray,
+                 bands: dict[str, tuple[float, float]] | None = None,
+                 roi: tuple[float, float] = IR_ROI,
+                 anchored: tuple[str, ...] = (),
+                 ):
+        """
+        :param bands: {name: (high, low)} in cm-1. default: IR_BANDS
+        :param anchored: bands integrated above the straight baseline between their first and last point
+        """
+        self.wavenumber = np.array(wavenumber, dtype=np.float64)
+        self.wavenumber.flags.writeable = False
+        self.resolution = axis_resolution(self.wavenumber)
+        # point spacing for the integration (the axis is uniform)
+        self.dx = abs(float(self.wavenumber[-1] - self.wavenumber[0])) / (len(self.wavenumber) - 1)
+        self.bands = dict(IR_BANDS if bands is None else bands)
+        self.anchored = tuple(anchored)
+        self.roi_band = roi
+        self.roi = self.band_slice(*roi)
+        self.slices: dict[str, slice] = {name: self.band_slice(*band) for name, band in self.bands.items()}
+        self.band_names = list(self.slices)
+        self.weights = self._band_weights()
+
+    def __len__(self):
+        return len(self.wavenumber)
+
+    def band_slice(self,
+                   high: float,
+                   low: float) -> slice:
+        """positional slice of the wavenumbers in [low, high]"""
+        inside = np.flatnonzero((self.wavenumber >= min(low, high)) & (self.wavenumber <= max(low, high)))
+        if not inside.size:
+            raise ValueError(f"no data point between {low} and {high} cm-1.")
+        return slice(int(inside[0]), int(inside[-1]) + 1)
+
+    def _band_weights(self) -> sparse.csr_matrix:
+        """trapezoid weights of the bands: row i @ spectrum = area of band i"""
+        rows, columns, values = [], [], []
+        for row, name in enumerate(self.band_names):
+            band = self.slices[name]
+            n = band.stop - band.start
+            weights = np.full(n, self.dx)
+            weights[[0, -1]] = self.dx / 2 if n > 1 else 0.0
+            if name in self.anchored:
+                # minus the trapezoid under the straight line between the end points
+                weights[[0, -1]] -= (n - 1) * self.dx / 2
+            rows.append(np.full(n, row))
+            columns.append(np.arange(band.start, band.stop))
+            values.append(weights)
+        return sparse.csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+                                 shape=(len(self.band_names), len(self.wavenumber)))
+
+    def integrate(self, spectra: ndarray) -> ndarray:
+        """
+        areas of all bands
+        :param spectra: one spectrum (n_points) or a stack (n_spectra x n_points)
+        :return: n_bands (n_spectra x n_bands for a stack), in the order of band_names
+        """
+        spectra = np.asarray(spectra, dtype=np.float64)
+        return (self.weights @ spectra.T).T
+
+    def band_areas(self, spectrum: ndarray) -> dict[str, float]:
+        """{band: area} of one spectrum"""
+        return dict(zip(self.band_names, self.integrate(spectrum).tolist()))
+
+    def with_bands(self,
+                   bands: dict[str, tuple[float, float]],
+                   anchored: tuple[str, ...] = ()) -> "WavenumberAxis":
+        """same axis with other bands (e.g. a changed peak window)"""
+        return WavenumberAxis(self.wavenumber, bands, roi=self.roi_band, anchored=anchored)
+
+    def matches(self, wavenumber: ndarray) -> bool:
+        wavenumber = np.asarray(wavenumber, dtype=np.float64)
+        return wavenumber.shape == self.wavenumber.shape and np.allclose(wavenumber, self.wavenumber, atol=1e-6)
+
+
+_axes: dict[tuple[str, float], WavenumberAxis] = {}
+
+
+def register_ir_axis(instrument: str,
+                     wavenumber: ndarray,
+                     bands: dict[str, tuple[float, float]] | None = None) -> WavenumberAxis:
+    """register (or replace) the axis of the instrument at its resolution"""
+    axis = WavenumberAxis(wavenumber, bands)
+    _axes[(instrument, axis.resolution)] = axis
+    return axis
+
+
+def get_ir_axis(instrument: str = "flowir",
+                wavenumber: ndarray | None = None,
+                resolution: float | None = None) -> WavenumberAxis:
+    """
+    axis of the instrument
+    :param wavenumber: axis of a spectrum (e.g. from the background file or the flowir reply); registered at first
+        use, or if it differs from the registered axis
+    :param resolution: point spacing (cm-1) without wavenumber. default: the only (or first) axis of the instrument
+    """
+    if wavenumber is not None:
+        key = (instrument, axis_resolution(wavenumber))
+        axis = _axes.get(key)
+        if axis is None or not axis.matches(wavenumber):
+            if axis is not None:
+                logger.warning(f"{instrument}: new wavenumber axis at {key[1]} cm-1 resolution.")
+            axis = register_ir_axis(instrument, wavenumber)
+        return axis
+    if resolution is not None:
+        return _axes[(instrument, resolution)]
+    for (name, _), axis in _axes.items():
+        if name == instrument:
+            return axis
+    raise KeyError(f"no wavenumber axis of {instrument}.")
+
+
+register_ir_axis("flowir", REACTIR_AXIS)
@@ -0,0 +1,138 @@
+"""
+append-only log of IR spectra
+one binary file per run: a json header (wavenumber axis, band names) and one fixed size record per spectrum
+(time stamp, spectrum count, spectrum, band areas). An append writes one record (O(1), the file is never
+rewritten); the records are flushed to the disk every chunk_size spectra, so a crash loses at most the last chunk.
+the log is read back as a memory map of the records.
+"""
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from numpy import ndarray
+
+_MAGIC = b"IRLOG1\n"
+_HEADER_ALIGN = 4096
+
+
+def record_dtype(n_points: int, n_bands: int) -> np.dtype:
+    return np.dtype([("time", "<f8"), ("count", "<i8"), ("spectrum", "<f8", (n_points,)), ("bands", "<f8", (n_bands,))])
+
+
+def _read_header(file) -> tuple[dict, int]:
+    if file.read(len(_MAGIC)) != _MAGIC:
+        raise ValueError(f"{file.name} is not an IR spectral log.")
+    length = int.from_bytes(file.read(8), "little")
+    header = json.loads(file.read(length))
+    return header, header["offset"]
+
+
+class SpectralLog:
+    """append-only spectral log of one run (a context manager; close() flushes the last records)"""
+
+    def __init__(self,
+                 file_path: Path | str,
+                 wavenumber: ndarray,
+                 band_names: list[str] | tuple[str, ...] = (),
+                 chunk_size: int = 8,
+                 ):
+        """
+        :param file_path: the log; an existing log with the same axis and bands is continued
+        :param chunk_size: spectra between two flushes to the disk
+        """
+        self.file_path = Path(file_path)
+        self.wavenumber = np.asarray(wavenumber, dtype=np.float64)
+        self.band_names = list(band_names)
+        self.chunk_size = max(1, chunk_size)
+        self.dtype = record_dtype(len(self.wavenumber), len(self.band_names))
+        self._pending = 0
+
+        if self.file_path.exists() and self.file_path.stat().st_size:
+            with open(self.file_path, "rb") as file:
+                header, offset = _read_header(file)
+            stored = np.asarray(header["wavenumber"], dtype=np.float64)
+            if (header["n_points"] != len(self.wavenumber) or header["bands"] != self.band_names
+                    or stored.shape != self.wavenumber.shape or not np.allclose(stored, self.wavenumber, atol=1e-6)):
+                raise ValueError(f"{self.file_path} was written with another wavenumber axis or bands.")
+            # a record cut by a crash is dropped
+            n_records = (self.file_path.stat().st_size - offset) // self.dtype.itemsize
+            os.truncate(self.file_path, offset + n_records * self.dtype.itemsize)
+            self._file = open(self.file_path, "ab")
+        else:
+            # records start at an aligned offset, written in the header (until the offset fits its own header)
+            offset, header = 0, b""
+            while offset < len(_MAGIC) + 8 + len(header):
+                offset = -(-(len(_MAGIC) + 8 + len(header)) // _HEADER_ALIGN) * _HEADER_ALIGN
+                header = json.dumps({"n_points": len(self.wavenumber), "bands": self.band_names,
+                                     "wavenumber": self.wavenumber.tolist(), "offset": offset}).encode()
+            self._file = open(self.file_path, "wb")
+            self._file.write(_MAGIC + len(header).to_bytes(8, "little") + header)
+            self._file.write(b"\0" * (offset - self._file.tell()))
+            self._sync()
+
+    def append(self,
+               spectrum: ndarray,
+               bands: ndarray | dict[str, float] | None = None,
+               count: int = -1,
+               timestamp: float | None = None):
+        """
+        add one spectrum
+        :param bands: band areas, in the order of band_names (or a dict by name)
+        :param count: spectrum count of the instrument
+        :param timestamp: unix time. default: now
+        """
+        record = np.zeros(1, dtype=self.dtype)
+        record["time"] = time.time() if timestamp is None else timestamp
+        record["count"] = count
+        record["spectrum"] = spectrum
+        if bands is not None:
+            record["bands"] = [bands[name] for name in self.band_names] if isinstance(bands, dict) else bands
+        self._file.write(record.tobytes())
+        self._pending += 1
+        if self._pending >= self.chunk_size:
+            self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def close(self):
+        if not self._file.closed:
+            self._sync()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def read(file_path: Path | str) -> dict:
+        """
+        :return: {"wavenumber", "band_names", "time", "count", "spectra" (n_spectra x n_points),
+            "bands" (n_spectra x n_bands)}; the arrays are read-only memory maps of the file
+        """
+        file_path = Path(file_path)
+        with open(file_path, "rb") as file:
+            header, offset = _read_header(file)
+        dtype = record_dtype(header["n_points"], len(header["bands"]))
+        n_records = (file_path.stat().st_size - offset) // dtype.itemsize
+        records = (np.memmap(file_path, dtype=dtype, mode="r", offset=offset, shape=(n_records,))
+                   if n_records else np.zeros(0, dtype=dtype))
+        return {"wavenumber": np.array(header["wavenumber"]),
+                "band_names": header["bands"],
+                "time": records["time"],
+                "count": records["count"],
+                "spectra": records["spectrum"],
+                "bands": records["bands"]}
+
+
+def spectral_log_frame(file_path: Path | str) -> pd.DataFrame:
+    """the spectra of a log as a DataFrame (wavenumber index, one column per spectrum count), like the csv logs"""
+    log = SpectralLog.read(file_path)
+    return pd.DataFrame(np.asarray(log["spectra"]).T, index=log["wavenumber"], columns=np.asarray(log["count"]))
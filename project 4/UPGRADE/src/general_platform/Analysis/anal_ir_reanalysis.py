@@ -0,0 +1,188 @@
+"""
+batch re-integration of archived IR spectra (e.g. after changing the band windows)
+each spectrum file (csv: wavenumber index, one column per spectrum; or a spectral log, see anal_ir_log) is read once,
+the background is subtracted and all bands of all its spectra are integrated in one product with the band weights.
+the files are processed in a process pool, one parquet table per experiment (file). Files already done with the same
+band configuration and background are skipped, so an interrupted batch is resumed by running it again.
+"""
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from loguru import logger
+
+from BV_experiments.src.general_platform.Analysis.anal_ir_axis import IR_BANDS, IR_ROI, WavenumberAxis, get_ir_axis
+from BV_experiments.src.general_platform.Analysis.anal_ir_log import SpectralLog
+
+_IR_FOLDER = r"W:\BS-FlowChemistry\People\Wei-Hsin\GL_data\2_flowIR"
+_BG_FILE = _IR_FOLDER + r"\20231011_ir_bg_100.csv"
+
+
+def load_spectra(file_path: Path | str) -> dict:
+    """
+    all spectra of a file, read once (a spectral log as memory map)
+    :return: {"wavenumber", "label" (column name or spectrum count), "count", "time", "spectra" (n_spectra x n_points)}
+    """
+    file_path = Path(file_path)
+    if file_path.suffix == ".irlog":
+        log = SpectralLog.read(file_path)
+        return {"wavenumber": log["wavenumber"],
+                "label": np.asarray(log["count"]).astype(str),
+                "count": np.asarray(log["count"]),
+                "time": np.asarray(log["time"]),
+                "spectra": log["spectra"]}
+    frame = pd.read_csv(file_path, index_col=0, header=0)
+    labels = frame.columns.astype(str)
+    counts = pd.to_numeric(pd.Series(labels), errors="coerce").fillna(-1).astype(np.int64).to_numpy()
+    return {"wavenumber": frame.index.to_numpy(dtype=np.float64),
+            "label": labels.to_numpy(),
+            "count": counts,
+            "time": np.full(len(labels), np.nan),
+            "spectra": frame.to_numpy(dtype=np.float64).T}
+
+
+def _stat_signature(file_path: Path) -> str:
+    stat = file_path.stat()
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def band_config_hash(bands: dict[str, tuple[float, float]],
+                     roi: tuple[float, float],
+                     anchored: tuple[str, ...],
+                     bg_path: Path | str) -> str:
+    """hash of the band configuration and the background file (a change of either re-integrates the files)"""
+    content = {"bands": {name: list(band) for name, band in bands.items()}, "roi": list(roi),
+               "anchored": sorted(anchored), "bg": [Path(bg_path).name, _stat_signature(Path(bg_path))]}
+    return hashlib.sha1(json.dumps(content, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _result_path(output_dir: Path, file_path: Path) -> Path:
+    # with the suffix: a csv and a spectral log of the same run are two tables
+    return output_dir / f"{file_path.name}.parquet"
+
+
+def _is_done(result_path: Path, config_hash: str, source: str) -> bool:
+    """the table was written with this configuration from this file (also a file without spectra)"""
+    if not result_path.exists():
+        return False
+    metadata = pq.read_schema(result_path).metadata or {}
+    return metadata.get(b"config_hash") == config_hash.encode() and metadata.get(b"source") == source.encode()
+
+
+def reintegrate_file(file_path: Path | str,
+                     output_dir: Path | str,
+                     bg: Path | str | np.ndarray = _BG_FILE,
+                     bands: dict[str, tuple[float, float]] | None = None,
+                     roi: tuple[float, float] = IR_ROI,
+                     anchored: tuple[str, ...] = (),
+                     config_hash: str | None = None,
+                     ) -> Path:
+    """
+    band areas of all spectra of one file (background subtracted), one row per spectrum
+    columns: file, label, count, time, roi_max (highest raw intensity in the ROI), one column per band,
+    config_hash and source (size and mtime of the file, for the resume)
+    :param bg: background file, or the background spectrum (then config_hash is required)
+    :return: the parquet table
+    """
+    file_path, output_dir = Path(file_path), Path(output_dir)
+    bands = IR_BANDS if bands is None else bands
+    if not isinstance(bg, np.ndarray):
+        config_hash = config_hash or band_config_hash(bands, roi, anchored, bg)
+        bg = pd.read_csv(bg, index_col=0, header=0).to_numpy()[:, 0]
+    elif config_hash is None:
+        raise ValueError("config_hash is required with a background spectrum.")
+
+    data = load_spectra(file_path)
+    # the registered axis of the instrument with the bands of this batch
+    axis = WavenumberAxis(get_ir_axis("flowir", data["wavenumber"]).wavenumber, bands, roi=roi, anchored=anchored)
+    spectra = np.asarray(data["spectra"])
+    areas = axis.integrate(spectra - bg)
+
+    table = pd.DataFrame({"file": file_path.name,
+                          "label": data["label"],
+                          "count": data["count"],
+                          "time": data["time"],
+                          "roi_max": spectra[:, axis.roi].max(axis=1) if len(spectra) else np.zeros(0)})
+    for column, name in enumerate(axis.band_names):
+        table[name] = areas[:, column]
+    source = _stat_signature(file_path)
+    table["config_hash"] = config_hash
+    table["source"] = source
+
+    # the resume reads the configuration from the metadata, so an empty table counts as done as well
+    arrow_table = pa.Table.from_pandas(table, preserve_index=False)
+    arrow_table = arrow_table.replace_schema_metadata({**(arrow_table.schema.metadata or {}),
+                                                       b"config_hash": config_hash.encode(),
+                                                       b"source": source.encode()})
+    result_path = _result_path(output_dir, file_path)
+    tmp = result_path.with_suffix(".tmp")
+    pq.write_table(arrow_table, tmp)
+    tmp.replace(result_path)
+    return result_path
+
+
+def reintegrate(output_dir: Path | str,
+                file_paths: list[Path | str] | None = None,
+                pattern: str | tuple[str, ...] = ("*_ir_*.csv", "*_ir_*.irlog"),
+                folder_path: Path | str = _IR_FOLDER,
+                bg_path: Path | str = _BG_FILE,
+                bands: dict[str, tuple[float, float]] | None = None,
+                roi: tuple[float, float] = IR_ROI,
+                anchored: tuple[str, ...] = (),
+                max_workers: int | None = None,
+                ) -> Path:
+    """
+    re-integrate the IR files in parallel.
+    one table output_dir/<file name>.parquet per file; files already done with the same bands, ROI and background
+    (and unchanged since) are skipped. Read all results with pd.read_parquet(output_dir).
+
+    :param file_paths: files to process. default: the files of the pattern(s) in folder_path (csv and spectral
+        logs; the background files are left out)
+    :param bands: {name: (high, low)} in cm-1. default: IR_BANDS
+    :param anchored: bands integrated above the straight line between their end points
+    :param max_workers: worker processes. default: number of cpu
+    :return: output_dir
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for tmp in output_dir.glob("*.tmp"):  # unfinished table of an interrupted batch
+        tmp.unlink()
+
+    bands = IR_BANDS if bands is None else bands
+    if file_paths is None:
+        patterns = (pattern,) if isinstance(pattern, str) else pattern
+        file_paths = [file_path for file_path in sorted({found for pattern in patterns
+                                                         for found in Path(folder_path).glob(pattern)})
+                      if "_ir_bg_" not in file_path.name]
+    file_paths = [Path(file_path) for file_path in file_paths]
+    config_hash = band_config_hash(bands, roi, anchored, bg_path)
+    todo = [file_path for file_path in file_paths
+            if not _is_done(_result_path(output_dir, file_path), config_hash, _stat_signature(file_path))]
+    logger.info(f"{len(file_paths)} IR files found, {len(file_paths) - len(todo)} already done, "
+                f"{len(todo)} to process.")
+
+    bg = pd.read_csv(bg_path, index_col=0, header=0).to_numpy()[:, 0]  # read once for all workers
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(reintegrate_file, file_path, output_dir, bg, bands, roi, anchored,
+                                   config_hash): file_path for file_path in todo}
+        for finished, future in enumerate(as_completed(futures), start=1):
+            try:
+                future.result()
+            except Exception as e:
+                # no table, so the file is tried again in the next batch
+                logger.error(f"{futures[future].name}: {e}")
+            if finished % 50 == 0:
+                logger.info(f"{finished}/{len(todo)} IR files processed.")
+    logger.info(f"re-integration of {len(todo)} IR files saved in {output_dir}")
+    return output_dir
+
+
+if __name__ == "__main__":
+    result_dir = reintegrate(output_dir=_IR_FOLDER + r"\reintegration",
+                             bands={**IR_BANDS, "sulfoxide": (1060, 960)})
+    print(pd.read_parquet(result_dir))
@@ -0,0 +1,198 @@
+"""
+process all DAD channels of one hplc run together
+the exports are found in the export index, one 2-D array on the shared time axis, one smoothing call
+and one baseline solve for all channels
+"""
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from beanie import PydanticObjectId
+from loguru import logger
+
+from BV_experiments.src.general_platform.Librarian import HplcConfig
+from BV_experiments.src.general_platform.Analysis.anal_hplc_chromatogram import DadChromatogram
+from BV_experiments.src.general_platform.Analysis.anal_smoothing import smooth_region, region_slice
+from BV_experiments.src.general_platform.Analysis.anal_baseline import modpoly_baseline
+from BV_experiments.src.general_platform.Analysis.anal_result_cache import get_result_cache
+from BV_experiments.src.general_platform.Analysis.anal_file_index import get_export_index
+from BV_experiments.src.general_platform.Analysis.anal_timing import timed_stage
+
+
+class MultiChannelChromatogram:
+    def __init__(self,
+                 mongo_id: str | PydanticObjectId,
+                 hplc_config: HplcConfig | dict[str, Any],
+                 folder_path: str = r"W:\BS-FlowChemistry\data\exported_chromatograms",
+                 file_extension: str = ".txt",
+                 channels: list[int] | None = None,
+                 ):
+        """
+        all channels of one hplc run (mongo_id)
+        :param channels: channels to process. default: all channels with a wavelength in ACQUISITION
+        """
+        self.mongo_id = mongo_id
+        self.folder_path = Path(folder_path)
+        self.file_extension = file_extension.strip(".")
+        self._hplc_config = hplc_config
+
+        acquisition = hplc_config.ACQUISITION if type(hplc_config) is HplcConfig else hplc_config["ACQUISITION"]
+        self.sample_rate = int(acquisition["sampling_frequency"].split()[0])
+        if channels is None:
+            channels = [int(name.split("_")[-1]) for name, wavelength in acquisition["wavelength"].items()
+                        if wavelength]
+        self.channels = channels
+
+        # one DadChromatogram per channel for the channel settings (background, ROI, peak rt)
+        self.chromatograms: dict[int, DadChromatogram] = {
+            channel: DadChromatogram(mongo_id, hplc_config, folder_path=str(folder_path),
+                                     file_extension=file_extension, channel=channel)
+            for channel in channels
+        }
+        self.file_paths: dict[int, Path] = {}
+        self.time: np.ndarray | None = None
+        self.raw: np.ndarray | None = None  # n_channels x n_points
+        self.smoothed: np.ndarray | None = None  # n_channels x n_points of the ROI
+        self.roi_time: np.ndarray | None = None  # time axis of self.smoothed
+
+    def find_files(self) -> dict[int, Path]:
+        """
+        find the exports of all channels in the export index (the folder is only listed if it changed).
+        If multiple files are found for one channel, raise an error.
+        """
+        index = get_export_index(self.folder_path, self.file_extension)
+        search_string = str(self.mongo_id)
+        for channel in self.channels:
+            fitted_files = index.paths(search_string, channel)
+            if len(fitted_files) > 1:
+                logger.error(f"{len(fitted_files)} files found: {fitted_files}")
+                raise ValueError(f"Multiple files found for {search_string} channel {channel}.")
+            elif fitted_files:
+                self.file_paths[channel] = fitted_files[0]
+            else:
+                logger.error(f"No files found for {search_string} channel {channel}.")
+        if not self.file_paths:
+            raise FileNotFoundError(f"No files found for {search_string}.")
+        return self.file_paths
+
+    def load(self,
+             bg_sub: bool = True,
+             bg_shift: bool = False,
+             ) -> tuple[dict[int, pd.DataFrame], dict[int, pd.DataFrame | None]]:
+        """
+        read all channels (with background subtraction) and put them in one array on the shared time axis.
+        :return: the (subtracted) chromatogram and merged raw/background data per channel
+        """
+        if not self.file_paths:
+            self.find_files()
+
+        d_raws, merged_dbs = {}, {}
+        for channel, file_path in self.file_paths.items():
+            self.chromatograms[channel].reset_processing()
+            d_raws[channel], merged_dbs[channel] = self.chromatograms[channel].load_raw(file_path, bg_sub, bg_shift)
+
+        times = [d_raw.index.to_numpy() for d_raw in d_raws.values()]
+        rt = times[0]
+        if not all(t.shape == rt.shape and np.array_equal(t, rt) for t in times[1:]):
+            # only the time points of all channels are kept
+            rt = times[0]
+            for t in times[1:]:
+                rt = np.intersect1d(rt, t, assume_unique=True)
+            logger.warning(f"channels have different time axes. {len(rt)} shared time points are used.")
+            d_raws = {channel: d_raw.loc[rt] for channel, d_raw in d_raws.items()}
+
+        self.time = rt
+        self.raw = np.stack([d_raw["Absorbance [mAu]"].to_numpy() for d_raw in d_raws.values()])
+        return d_raws, merged_dbs
+
+    def smooth(self) -> np.ndarray:
+        """Apply median and FIR filter (set!) to all channels at once, on the ROI (see DadChromatogram.signal_smooth)"""
+        region = region_slice(self.time, next(iter(self.chromatograms.values())).roi)
+        processing = {}
+        with timed_stage(processing, "smoothed"):
+            self.smoothed = smooth_region(self.raw, region, sample_rate=self.sample_rate, kernel_size=19,
+                                          cutoff=1, transition_width=5, attenuation=60)
+        self.roi_time = self.time[region]
+        # the time of the common call is shared by the channels
+        for channel in self.file_paths:
+            self.chromatograms[channel]._processing["smoothed"] = {
+                "wall_time": processing["smoothed"]["wall_time"] / len(self.file_paths),
+                "n_points": self.raw.shape[1]}
+        return self.smoothed
+
+    @property
+    def processing_records(self) -> dict[int, dict]:
+        """stage timings of the last run per channel (see DadChromatogram.processing_record)"""
+        return {channel: self.chromatograms[channel].processing_record for channel in self.file_paths}
+
+    def txt_to_peaks(self,
+                     bg_sub: bool = True,
+                     bg_shift: bool = False,
+                     use_is_peak: bool = True,
+                     render: str = "none",
+                     use_cache: bool = True,
+                     ) -> dict[int, bool | dict[float, float]]:
+        """
+        process all channels and return the peaks per channel
+        a channel failing the quality check returns False (like DadChromatogram.txt_to_peaks), the others go on.
+        :param use_cache: if the results of all channels are in the result cache, return them without parsing
+        :return: {channel: {retention_time: area}}
+        """
+        if use_cache:
+            if not self.file_paths:
+                self.find_files()
+            cache = get_result_cache()
+            records = {}
+            for channel, file_path in self.file_paths.items():
+                chrom = self.chromatograms[channel]
+                chrom.reset_processing()
+                chrom.result_key = chrom.cache_key(file_path, bg_sub, bg_shift, use_is_peak)
+                records[channel] = cache.get(chrom.result_key)
+            if all(record is not None for record in records.values()):
+                logger.info(f"results of {self.mongo_id} from the result cache.")
+                return {channel: record["peaks"] for channel, record in records.items()}
+        else:
+            for chrom in self.chromatograms.values():
+                chrom.result_key = None
+
+        d_raws, merged_dbs = self.load(bg_sub, bg_shift)
+        self.smooth()
+
+        index = pd.Index(self.roi_time, name="time (min.)")
+        results, prepared = {}, {}
+        for row, channel in enumerate(d_raws):
+            chrom = self.chromatograms[channel]
+            chrom.file_path = self.file_paths[channel]
+            chrom.check_quality(d_raws[channel])  # check (whole hplc exp time & performance of the experiment)
+            d = pd.DataFrame({"Absorbance [mAu]": self.smoothed[row]}, index=index)
+            try:
+                prepared[channel] = chrom.baseline_weights(d)
+            except ValueError as e:
+                logger.error(f"channel {channel}: {e}")
+                results[channel] = False
+
+        # the baselines of all channels in one solve (one grid if the channels share the ROI)
+        processing = {}
+        with timed_stage(processing, "baseline"):
+            baselines = modpoly_baseline([trim_d["Absorbance [mAu]"].to_numpy() for trim_d, *_ in prepared.values()],
+                                         [trim_d.index.to_numpy() for trim_d, *_ in prepared.values()],
+                                         poly_order=3,
+                                         weights=[weights for *_, weights in prepared.values()]) if prepared else []
+
+        for (channel, (trim_d, peaks, properties, _)), baseline in zip(prepared.items(), baselines):
+            chrom = self.chromatograms[channel]
+            # the time of the common solve is shared by the channels
+            chrom._processing["baseline"]["wall_time"] += processing["baseline"]["wall_time"] / len(prepared)
+            try:
+                results[channel] = chrom.baseline_to_peaks(trim_d, baseline, peaks, properties,
+                                                           d_raws[channel], merged_dbs[channel],
+                                                           use_is_peak=use_is_peak, render=render)
+            except ValueError as e:
+                logger.error(f"channel {channel}: {e}")
+                results[channel] = False
+
+        if use_cache:
+            for channel in prepared:
+                get_result_cache().put(self.chromatograms[channel].result_key, {"peaks": results[channel]})
+        return {channel: results[channel] for channel in d_raws}
@@ -12,7 +12,9 @@ from matplotlib import pyplot as plt
 from numpy import ndarray
 from scipy import signal
 from scipy.integrate import trapezoid
-from scipy.signal import firwin, kaiserord, lfilter
+
+from BV_experiments.src.general_platform.Analysis.anal_background import get_background_store, align_background
+from BV_experiments.src.general_platform.Analysis.anal_smoothing import smooth_stack, fir_filter as _fir_filter
 
 
 def create_dataset(file_name: Path, header_lines: int) -> pd.DataFrame:
@@ -70,17 +72,8 @@ def parse_header(clarity_file):
 
 def fir_filter(ndarray, cutoff=1, sample_rate=30, transition_width=5, attenuation=60):
     """Apply a Finite impulse response filter to a NDArray."""
-    nyq_rate = sample_rate / 2.0
-    width = transition_width / nyq_rate
-
-    # Compute the order and Kaiser parameter for the FIR filter.
-    N, beta = kaiserord(attenuation, width)
-
-    # Use firwin with a Kaiser window to create a lowpass FIR filter.
-    taps = firwin(N, cutoff / nyq_rate, window=('kaiser', beta))
-
-    # Use lfilter to filter x with the FIR filter.
-    return lfilter(taps, 1.0, ndarray)
+    # the taps are designed once per parameter set
+    return _fir_filter(ndarray, cutoff, sample_rate, transition_width, attenuation)
 
 
 def hplc_txt_to_peaks(mongo_id: str,
@@ -351,26 +344,26 @@ def bg_subtraction(mongo_id: str,
             r"W:\BS-FlowChemistry\data\exported_chromatograms\16_04_2024_blank_16-Apr-24 3_32_55 AM_149 - DAD 2.1L- Channel 2.txt"
         )
 
-    # parse the background file
-    header_data, header_lines = parse_header(bg_file_path)
-    d_bg = create_dataset(bg_file_path, header_lines)
+    # the background file is parsed once and kept in the store
+    background = get_background_store().get(bg_file_path, channel=1 if wavelength == "254" else 2)
     # parse the raw file
     header_data, header_lines = parse_header(file_path)
     d_raw = create_dataset(file_path, header_lines)
 
+    shift = 0
     if bg_shift:
         logger.debug("Shift the background data to match the raw data.")
         # fixme: shift the background data or raw data?
         # shift the background data
-        shift = find_shift(d_bg, d_raw)
-        d_bg = d_bg.shift(-shift)
+        shift = find_shift(background.to_frame(), d_raw)
 
-    merged_df = pd.merge(d_raw, d_bg, left_index=True, right_index=True, suffixes=("_raw", "_bg"))
-    merged_df.fillna(0, inplace=True)
-
-    # merged_df["Absorbance [mAu]"] = merged_df["Absorbance [mAu]_raw"] - merged_df["Absorbance [mAu]_bg"]
-    col_names = merged_df.columns.to_list()
-    sub_d = pd.DataFrame(merged_df[col_names[0]] - merged_df[col_names[1]], columns=["Absorbance [mAu]"])
+    rt, raw_signal, bg_signal = align_background(d_raw.index.to_numpy(),
+                                                 d_raw["Absorbance [mAu]"].to_numpy(),
+                                                 background,
+                                                 shift=shift)
+    rt = pd.Index(rt, name="time (min.)")
+    merged_df = pd.DataFrame({"Absorbance [mAu]_raw": raw_signal, "Absorbance [mAu]_bg": bg_signal}, index=rt)
+    sub_d = pd.DataFrame({"Absorbance [mAu]": raw_signal - bg_signal}, index=rt)
 
     plot = False
     if plot:
@@ -391,10 +384,9 @@ def bg_subtraction(mongo_id: str,
 
 
 def signal_smooth(d: pd.DataFrame):
-    # Apply median and FIR filter (set!)
-    d = d.apply(signal.medfilt, raw=True, kernel_size=19)
-    d = d.apply(fir_filter, raw=True)
-    return d
+    # Apply median and FIR filter (set!) on all columns at once
+    smoothed = smooth_stack(d.to_numpy().T, sample_rate=30, kernel_size=19)
+    return pd.DataFrame(smoothed.T, index=d.index, columns=d.columns)
 
 def find_peaks(d: pd.DataFrame,
                max_signal: float = None,
@@ -599,8 +591,13 @@ if __name__ == "__main__":
         print(f"{raw_result_215}")
 
 
-    def create_cali_curve(file_list: list | None = None, **kwargs):
-        """cali_curve process"""
+    def create_cali_curve(file_list: list | None = None,
+                          hplc_config=None,
+                          compound: str = "tmob",
+                          cc_is: str = "tol"):
+        """cali_curve process (see anal_calibration.build_calibration)"""
+        import re
+        from BV_experiments.src.general_platform.Analysis.anal_calibration import build_calibration
         cc_215 = [
             r"W:\BS-FlowChemistry\data\exported_chromatograms\15_08_2023_cc_0mM_tol_Htmob_15-Aug-23 10_03_23 AM_202 - DAD 2.1L- Channel 2.txt",
             r"W:\BS-FlowChemistry\data\exported_chromatograms\15_08_2023_cc_2mM_tol_Htmob_15-Aug-23 10_46_21 AM_203 - DAD 2.1L- Channel 2.txt",
@@ -613,20 +610,17 @@ if __name__ == "__main__":
         if not file_list:
             file_list = cc_215
 
-        channel = file_list[1].split("\\")[-1].split("-")[-1].strip().split(".")[0].split("Channel")[-1].strip()
-        import numpy as np
-        # current method
-        channel_wavelength = {"1": "254nm", "2": "215nm"}
-
+        # concentration of the standard from the file name (cc_2mM_...)
+        standards = []
         for file in file_list:
-            find_cc = file.split("\\")[-1].split("-")[0].find("cc")
-            conc_name = file.split("\\")[-1].split("-")[0][find_cc:].strip()
             file_path = Path(file)
+            conc = float(re.search(r"cc_(\d+(?:\.\d+)?)mM", file_path.name).group(1))
+            channel = int(file_path.stem.split("Channel")[-1])
+            standards.append({"file": file_path, "channel": channel, compound: conc})
 
-            std_name = conc_name + "_" + channel_wavelength[channel]
-            result = hplc_txt_to_peaks(std_name, file_path)
-            print(conc_name)
-            print(result)
+        calibration, statistics = build_calibration(standards, hplc_config, cc_is=cc_is)
+        print(statistics)
+        return calibration
 
 
     def current_hplc_spactrum_process():
@@ -440,32 +440,10 @@ def current_hplc_processing_test():
 
 if __name__ == "__main__":
     # current_hplc_processing()
-    # condition
-    control_condition = {'dye_equiv': 0.01, 'activator_equiv': 0.050, 'quencher_equiv': 20, 'oxygen_equiv': 2.2,
-                         'solvent_equiv': 500.0, 'time': 10, 'light': 13, 'pressure': 4.0, 'temperature': 34, }
-
-    from BV_experiments.calc_oper_para import calc_concentration
-    control_condition["concentration"] = calc_concentration(control_condition)
-
-    # to save the serial results
-    def processing_serial(find_word: str, date="20240408"):
-        import pandas as pd
-        log = pd.DataFrame({'acid': 0, 'unk_1': 0, 'ester': 0, 'lactone': 0, 'unk_4': 0, 'SM': 0, 'tmob': 0, 'tol': 0,
-                           'Yield_1': 0, 'Conversion_1': 0, 'Productivity_1': 0, 'Yield_2': 0, 'Conversion_2': 0, 'Productivity_2': 0},
-                           index=["empty"])
-
-        # find all file with the specific suffix
-        for file in Path(r"W:\BS-FlowChemistry\data\exported_chromatograms").rglob(f"*{find_word}* - DAD 2.1L- Channel 2.txt"):
-            print(file.stem)
-            mongo_id = file.stem.split(" - ")[0]
-            result = processing_hplc_file(mongo_id, file, control_condition,  cc_is="tmob")
-            print(result['parsed_result_254'])
-            try:
-                log = pd.concat([log, pd.DataFrame(result['parsed_result_254'], index=[mongo_id])])
-            except:
-                print(f"fail to concat {mongo_id}")
-
-        log.to_csv(f'W:\BS-FlowChemistry\data\exported_chromatograms\plots_wei\{date}_log_{find_word}.csv', header=True)
-
-
-    processing_serial("ctrl_073", date="20240412")
+    # re-analyse the serial results (in parallel, resumable). read with pd.read_parquet(result_dir)
+    from BV_experiments.Example3_debenzylation.db_doc import SecondDebenzylation
+    from BV_experiments.src.general_platform.Analysis.anal_batch_reanalysis import reanalyse
+
+    result_dir = reanalyse(SecondDebenzylation.hplc_config_info,
+                           output_dir=r"W:\BS-FlowChemistry\data\exported_chromatograms\plots_wei\20240412_log_ctrl_073",
+                           pattern="*ctrl_073*")
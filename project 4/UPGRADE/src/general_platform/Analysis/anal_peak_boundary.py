@@ -0,0 +1,68 @@
+"""
+vectorized peak boundary detection and integration
+derivative + find_peaks widths (left_ips/right_ips) -> start/end index of every peak
+"""
+import numpy as np
+from numpy import ndarray
+
+
+def find_peak_boundaries(derivative: ndarray,
+                         left_ips: ndarray,
+                         right_ips: ndarray,
+                         threshold: float = 1e-2,
+                         positional: bool = False,
+                         ) -> tuple[ndarray, ndarray]:
+    """
+    Find the start and end index of all peaks in one pass.
+
+    Same rule as the old per-peak loop: walking left from int(left_ips) the peak starts one point after the
+    first derivative below threshold (+1 ensures non-overlapping peaks); walking right from int(right_ips)
+    the peak ends at the first derivative above -threshold. Failsafe is the first/last point.
+
+    :param derivative: 1st derivative of the (smoothed, baseline corrected) chromatogram
+    :param left_ips: left interpolated positions from scipy.signal.find_peaks
+    :param right_ips: right interpolated positions from scipy.signal.find_peaks
+    :param threshold: slope regarded as flat (original 1e-3)
+    :param positional: rule of the old Chromatogram loop, which sliced its RangeIndex by position (end excluded):
+        the peak starts two points after the last flat point before int(left_ips). default: the DadChromatogram
+        loop (float index, sliced by label): one point after the last flat point at or before int(left_ips)
+    :return: (starts, ends) as positional indices
+    """
+    derivative = np.asarray(derivative, dtype=np.float64)
+    left = np.asarray(left_ips).astype(np.int64)
+    right = np.asarray(right_ips).astype(np.int64)
+
+    # indices where the derivative crosses the threshold, sorted by construction
+    flat_left = np.flatnonzero(derivative < threshold)
+    flat_right = np.flatnonzero(derivative > -threshold)
+
+    # last flat point at (not if positional) or before the left position
+    pos = np.searchsorted(flat_left, left, side="left" if positional else "right") - 1
+    starts = np.zeros(left.shape, dtype=np.int64)
+    found = pos >= 0
+    starts[found] = np.minimum(flat_left[pos[found]] + (2 if positional else 1), len(derivative) - 1)
+
+    # first flat point at or after the right position
+    pos = np.searchsorted(flat_right, right, side="left")
+    ends = np.full(right.shape, len(derivative) - 1, dtype=np.int64)
+    found = pos < len(flat_right)
+    ends[found] = flat_right[pos[found]]
+
+    return starts, ends
+
+
+def integrate_peaks(y: ndarray,
+                    x: ndarray,
+                    starts: ndarray,
+                    ends: ndarray,
+                    ) -> ndarray:
+    """
+    Trapezoidal area of y between starts and ends (both inclusive) for all peaks at once.
+    Empty or single point ranges give 0, like scipy trapezoid on the slice.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    cum_area = np.concatenate(([0.0], np.cumsum(0.5 * (y[1:] + y[:-1]) * np.diff(x))))
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    return np.where(ends > starts, cum_area[ends] - cum_area[np.minimum(starts, ends)], 0.0)
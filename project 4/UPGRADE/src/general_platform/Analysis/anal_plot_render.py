@@ -0,0 +1,95 @@
+"""
+rendering of the chromatogram plot spec (from DadChromatogram.txt_to_peaks) to svg
+the plot spec is a plain dict (lists of floats and strings), so it can be sent to a worker process or saved as json
+"""
+import atexit
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+
+from loguru import logger
+from matplotlib.figure import Figure
+
+
+def render_plot_spec(plot_spec: dict,
+                     plot_file_path: Path | str) -> Path:
+    """
+    Draw the plot spec and save it to plot_file_path.
+    A standalone Figure (not pyplot) is used, so nothing is kept in the pyplot figure registry.
+    """
+    fig = Figure(figsize=plot_spec.get("figsize", (20, 8)))
+    ax = fig.subplots()
+
+    for line in plot_spec["lines"]:
+        ax.plot(line["x"], line["y"],
+                label=line.get("label"),
+                color=line.get("color"),
+                alpha=line.get("alpha", 1.0),
+                linewidth=line.get("linewidth", 1.5))
+
+    # Annotate peak rt/area
+    for note in plot_spec["annotations"]:
+        ax.annotate(note["text"],
+                    xy=(note["x"], note["y"]),
+                    xytext=(-5, 0),
+                    rotation=90,
+                    textcoords="offset points")
+
+    # Plot integration limits
+    for span in plot_spec["spans"]:
+        ax.axvspan(span["start"], span["end"], facecolor="pink", edgecolor="black", alpha=0.5)
+
+    # Plot initial peak width
+    for hline in plot_spec["hlines"]:
+        ax.hlines(hline["y"], hline["xmin"], hline["xmax"], color=hline["color"], linewidth=4)
+
+    if plot_spec.get("xlim"):
+        ax.set_xlim(*plot_spec["xlim"])
+    if plot_spec.get("ylim"):
+        ax.set_ylim(*plot_spec["ylim"])
+    ax.set_xlabel(plot_spec.get("x_label", "time (min.)"))
+    ax.legend(plot_spec.get("legend", ["raw", "smoothed", "baseline_correction"]))
+
+    plot_file_path = Path(plot_file_path)
+    fig.savefig(plot_file_path)
+    return plot_file_path
+
+
+class PlotRenderPool:
+    """
+    Render plot specs in background worker processes, so peak extraction does not wait for the svg.
+    """
+
+    def __init__(self, max_workers: int = 2):
+        self.max_workers = max_workers
+        self._executor: ProcessPoolExecutor | None = None
+
+    def submit(self,
+               plot_spec: dict,
+               plot_file_path: Path | str) -> Future:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        future = self._executor.submit(render_plot_spec, plot_spec, plot_file_path)
+        future.add_done_callback(self._log_failure)
+        return future
+
+    @staticmethod
+    def _log_failure(future: Future):
+        if future.exception() is not None:
+            logger.error(f"plot rendering failed: {future.exception()}")
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+_render_pool: PlotRenderPool | None = None
+
+
+def get_render_pool(max_workers: int = 2) -> PlotRenderPool:
+    """shared pool of the process; pending plots are finished at interpreter exit"""
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = PlotRenderPool(max_workers=max_workers)
+        atexit.register(_render_pool.shutdown)
+    return _render_pool
@@ -0,0 +1,175 @@
+"""
+persistent cache of the chromatogram analysis results (peak table and aligned peaks)
+key: content hash of the export (and background) file + HplcConfig hash + code version + processing options,
+so a changed file, config or analysis code is never served from the cache. The cache is checked before the export
+is parsed; the records are small json files on the local disk, the least recently used are evicted above max_bytes.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+from BV_experiments.src.general_platform.Librarian import HplcConfig
+from BV_experiments.src.general_platform.Analysis.anal_background import hplc_config_hash
+from BV_experiments.src.general_platform.Analysis.anal_hplc_result import PeakAlignment
+
+_digests: dict[tuple[str, int, int], str] = {}
+_code_version: str | None = None
+# modules of the hplc peak pipeline whose code changes the peaks or the aligned areas (not the index, cache, timing
+# or plot modules): only a change of these invalidates the cache
+_PIPELINE_MODULES = (
+    "anal_clarity_reader.py",
+    "anal_background.py",
+    "anal_shift.py",
+    "anal_smoothing.py",
+    "anal_baseline.py",
+    "anal_peak_boundary.py",
+    "anal_hplc_chromatogram.py",
+    "anal_multichannel.py",
+    "anal_hplc_result.py",
+)
+
+
+def file_digest(file_path: Path | str) -> str:
+    """content hash of a file (kept per process while size and mtime do not change)"""
+    file_path = Path(file_path)
+    stat = file_path.stat()
+    key = (str(file_path), stat.st_size, stat.st_mtime_ns)
+    if key not in _digests:
+        _digests[key] = hashlib.blake2b(file_path.read_bytes(), digest_size=20).hexdigest()
+    return _digests[key]
+
+
+def code_version() -> str:
+    """hash of the hplc peak pipeline code (_PIPELINE_MODULES): a code change invalidates the cache"""
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.blake2b(digest_size=16)
+        for name in _PIPELINE_MODULES:
+            source = Path(__file__).parent / name
+            digest.update(name.encode())
+            digest.update(source.read_bytes())
+        _code_version = digest.hexdigest()
+    return _code_version
+
+
+def _default_cache_dir() -> Path:
+    return Path.home() / ".cache" / "BV_experiments" / "results"
+
+
+class ResultCache:
+    """
+    content addressed store of analysis results, one json file per key.
+    a record is a dict, e.g. {"peaks": {rt: area} | False, "aligned": {name: area}}
+    """
+
+    def __init__(self,
+                 cache_dir: Path | str | None = None,
+                 max_bytes: int = 256 * 1024 ** 2,
+                 ):
+        self.cache_dir = Path(cache_dir) if cache_dir else _default_cache_dir()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._size = sum(path.stat().st_size for path in self.cache_dir.glob("*/*.json"))
+
+    @staticmethod
+    def key(file_paths: list[Path | str],
+            hplc_config: HplcConfig | dict[str, Any] | None,
+            **options) -> str:
+        """key of the result of the files (export, background) analysed with the config and options"""
+        content = {"files": [file_digest(file_path) for file_path in file_paths],
+                   "config": hplc_config_hash(hplc_config),
+                   "code": code_version(),
+                   "options": options}
+        return hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> dict | None:
+        path = self._path(key)
+        try:
+            record = json.loads(path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        os.utime(path)  # mtime = last use, for the eviction
+        if record.get("peaks"):
+            record["peaks"] = {rt: area for rt, area in record["peaks"]}
+        return record
+
+    def put(self, key: str, record: dict):
+        record = dict(record)
+        if record.get("peaks"):
+            # float retention times are not json keys
+            record["peaks"] = [[float(rt), float(area)] for rt, area in record["peaks"].items()]
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        previous = path.stat().st_size if path.exists() else 0
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")  # worker processes may write the same record
+        tmp.write_text(json.dumps(record, default=float))
+        tmp.replace(path)
+        self._size += path.stat().st_size - previous
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def update(self, key: str, **fields):
+        """add fields to a record (e.g. the aligned peaks to the peak table)"""
+        record = self.get(key) or {}
+        record.update(fields)
+        self.put(key, record)
+
+    def _evict(self):
+        """remove the least recently used records down to 80 % of max_bytes"""
+        records = sorted((path.stat().st_mtime_ns, path.stat().st_size, path)
+                         for path in self.cache_dir.glob("*/*.json"))
+        self._size = sum(size for _, size, _ in records)
+        removed = 0
+        for _, size, path in records:
+            if self._size <= 0.8 * self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            self._size -= size
+            removed += 1
+        logger.debug(f"result cache: {removed} records evicted, {self._size / 1024 ** 2:.1f} MB kept.")
+
+    def clear(self):
+        for path in self.cache_dir.glob("*/*.json"):
+            path.unlink(missing_ok=True)
+        self._size = 0
+
+    @property
+    def size(self) -> int:
+        """bytes on disk"""
+        return self._size
+
+    def __len__(self):
+        return sum(1 for _ in self.cache_dir.glob("*/*.json"))
+
+
+_result_cache: ResultCache | None = None
+
+
+def get_result_cache() -> ResultCache:
+    """shared result cache of the process"""
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = ResultCache()
+    return _result_cache
+
+
+def cached_align(key: str | None,
+                 raw_result: dict[float, float],
+                 hplc_config: HplcConfig | dict[str, Any],
+                 ) -> dict[str, float]:
+    """PeakAlignment.align of the raw peaks, kept in the record of the key (see DadChromatogram.result_key)"""
+    cache = get_result_cache()
+    record = cache.get(key) if key else None
+    if record is not None and record.get("aligned") is not None:
+        return record["aligned"]
+    aligned = PeakAlignment(raw_result, hplc_config).align()
+    if key:
+        cache.update(key, aligned=aligned)
+    return aligned
@@ -0,0 +1,93 @@
+"""
+retention time shift between two chromatograms by FFT cross-correlation
+the whole chromatogram (or a region of it) is compared instead of single peaks, so an extra small peak does not
+change the result; the correlation maximum is refined to a fraction of a data point by a parabola.
+"""
+import math
+
+import numpy as np
+from numpy import ndarray
+from scipy import fft
+from scipy.ndimage import gaussian_filter1d
+
+
+def estimate_shift(reference: ndarray,
+                   signal: ndarray,
+                   max_lag: int | None = None,
+                   smooth: float = 2.0,
+                   ) -> float | ndarray:
+    """
+    shift of signal against reference on the same grid, in data points: signal[i + shift] ~ reference[i]
+    :param reference: one chromatogram (n_points) or a stack (n_chromatograms x n_points)
+    :param signal: same shape as reference
+    :param max_lag: largest shift searched (data points). default: the whole length
+    :param smooth: sigma (data points) of the gaussian filter against the detector noise, 0: none
+    :return: the shift (one per row for a stack)
+    """
+    reference = np.asarray(reference, dtype=np.float64)
+    signal = np.asarray(signal, dtype=np.float64)
+    if smooth:
+        reference = gaussian_filter1d(reference, smooth, axis=-1)
+        signal = gaussian_filter1d(signal, smooth, axis=-1)
+    # the first difference is compared: offset and slow baseline drift do not count, the peaks do
+    reference, signal = np.diff(reference, axis=-1), np.diff(signal, axis=-1)
+    n = reference.shape[-1]
+    max_lag = n - 1 if max_lag is None else min(int(max_lag), n - 1)
+
+    # zero padded, so the correlation is not circular within +- max_lag
+    n_fft = fft.next_fast_len(n + max_lag, real=True)
+    a = reference - reference.mean(axis=-1, keepdims=True)
+    b = signal - signal.mean(axis=-1, keepdims=True)
+    correlation = fft.irfft(fft.rfft(b, n_fft) * np.conj(fft.rfft(a, n_fft)), n_fft)
+
+    # correlation[..., lag] = sum a[i] * b[i + lag]; negative lags are at the end
+    lags = np.arange(-max_lag, max_lag + 1)
+    correlation = correlation[..., lags]
+    best = correlation.argmax(axis=-1)
+
+    # parabola through the maximum and its neighbours
+    inner = np.clip(best, 1, len(lags) - 2)
+    y0, y1, y2 = (np.take_along_axis(correlation, np.expand_dims(inner + i, -1), -1)[..., 0] for i in (-1, 0, 1))
+    curvature = y0 - 2 * y1 + y2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        delta = np.where((best == inner) & (curvature < 0), 0.5 * (y0 - y2) / curvature, 0.0)
+    shift = lags[best] + delta
+    return float(shift) if shift.ndim == 0 else shift
+
+
+def peak_pattern(retention_times: ndarray,
+                 grid: ndarray,
+                 width: float) -> ndarray:
+    """peak table as a signal on the grid: one gaussian (sigma = width) of height 1 per retention time"""
+    step = grid[1] - grid[0]
+    position = (np.asarray(retention_times, dtype=np.float64) - grid[0]) / step
+    position = position[(position >= 0) & (position <= len(grid) - 1)]
+    # each peak split between its two grid points, so the pattern keeps the sub-step position
+    lower = np.floor(position).astype(int)
+    fraction = position - lower
+    pattern = np.zeros(len(grid) + 1)
+    np.add.at(pattern, lower, 1 - fraction)
+    np.add.at(pattern, lower + 1, fraction)
+    return gaussian_filter1d(pattern[:-1], width / step)
+
+
+def estimate_pattern_shift(reference_rt: ndarray,
+                           found_rt: ndarray,
+                           max_shift: float,
+                           resolution: float = 0.002,
+                           width: float = 0.02,
+                           ) -> float:
+    """
+    shift (min) of the found peaks against the expected retention times: found ~ reference + shift
+    both peak tables are drawn as gaussian patterns on one grid and cross-correlated.
+    :param max_shift: largest shift searched (min)
+    :param resolution: grid step (min)
+    :param width: width of the drawn peaks (min)
+    """
+    rts = np.concatenate([reference_rt, found_rt])
+    margin = max_shift + 4 * width
+    grid = np.arange(rts.min() - margin, rts.max() + margin + resolution, resolution)
+    lag = estimate_shift(peak_pattern(reference_rt, grid, width),
+                         peak_pattern(found_rt, grid, width),
+                         max_lag=math.ceil(max_shift / resolution), smooth=0)
+    return lag * resolution
@@ -0,0 +1,131 @@
+"""
+smoothing of chromatograms: median filter (removes artefacts) + FIR lowpass filter
+the FIR taps are designed once per parameter set; a stack of chromatograms (n_chromatograms x n_points),
+e.g. all DAD channels of one run or a reprocessing batch, is smoothed in one call.
+only the region of interest needs to be smoothed: smooth_region filters the region plus the exact margins of the
+two filters, so the result is the same as smoothing the whole run and cropping afterwards.
+"""
+from functools import lru_cache
+
+import numpy as np
+from numpy import ndarray
+from scipy.signal import firwin, kaiserord, lfilter, medfilt
+
+
+@lru_cache(maxsize=32)
+def _fir_taps(cutoff: float,
+              sample_rate: float,
+              transition_width: float,
+              attenuation: float) -> ndarray:
+    nyq_rate = sample_rate / 2.0
+    width = transition_width / nyq_rate
+
+    # Compute the order and Kaiser parameter for the FIR filter.
+    N, beta = kaiserord(attenuation, width)
+
+    # Use firwin with a Kaiser window to create a lowpass FIR filter.
+    taps = firwin(N, cutoff / nyq_rate, window=("kaiser", beta))
+    taps.flags.writeable = False
+    return taps
+
+
+def fir_taps(cutoff: float = 1,
+             sample_rate: float = 30,
+             transition_width: float = 5,
+             attenuation: float = 60) -> ndarray:
+    """
+    Taps of the Kaiser window lowpass FIR filter (cached, read-only).
+
+    cutoff: cutoff frequency in Hz
+    sample rate: in Hz
+    transition_width: width of transition from path to stop in Hz, rel to nyqvist rate
+    attenuation: attenuation of stopband in dB
+    """
+    return _fir_taps(float(cutoff), float(sample_rate), float(transition_width), float(attenuation))
+
+
+def fir_filter(data: ndarray,
+               cutoff: float = 1,
+               sample_rate: float = 30,
+               transition_width: float = 5,
+               attenuation: float = 60,
+               ) -> ndarray:
+    """Apply the FIR filter along the last axis (one chromatogram or a stack of them)."""
+    taps = fir_taps(cutoff, sample_rate, transition_width, attenuation)
+    return lfilter(taps, 1.0, data, axis=-1)
+
+
+def median_filter(data: ndarray,
+                  kernel_size: int = 19) -> ndarray:
+    """
+    Median filter along the last axis.
+    scipy's 1-D medfilt is much faster than its n-dimensional median filters, so a stack is filtered row by row.
+    """
+    data = np.asarray(data, dtype=np.float64)
+    if data.ndim == 1:
+        return medfilt(data, kernel_size)
+    return np.stack([medfilt(row, kernel_size) for row in data.reshape(-1, data.shape[-1])]).reshape(data.shape)
+
+
+def smooth_stack(data: ndarray,
+                 sample_rate: float = 30,
+                 kernel_size: int = 19,
+                 cutoff: float = 1,
+                 transition_width: float = 5,
+                 attenuation: float = 60,
+                 ) -> ndarray:
+    """
+    Median + FIR filter on a chromatogram (n_points) or a stack of chromatograms (n_chromatograms x n_points)
+    recorded with the same sampling frequency.
+    """
+    return fir_filter(median_filter(data, kernel_size),
+                      cutoff=cutoff,
+                      sample_rate=sample_rate,
+                      transition_width=transition_width,
+                      attenuation=attenuation)
+
+
+def region_slice(time: ndarray,
+                 region: list | tuple) -> slice:
+    """positional slice of the time region [start, end] (both included, like label slicing of a sorted index)"""
+    time = np.asarray(time)
+    return slice(int(np.searchsorted(time, region[0])), int(np.searchsorted(time, region[1], side="right")))
+
+
+def smoothing_margin(kernel_size: int = 19,
+                     n_taps: int = 1) -> tuple[int, int]:
+    """
+    data points needed before and after a region, so the smoothed region does not depend on the cropping.
+    the FIR filter is causal (lfilter, zero initial state): an output point depends on the n_taps - 1 points before
+    it (twice the group delay of the linear phase filter). The median filter depends on kernel_size // 2 points on
+    both sides, for all the points the FIR filter uses.
+    """
+    half_kernel = kernel_size // 2
+    return n_taps - 1 + half_kernel, half_kernel
+
+
+def smooth_region(data: ndarray,
+                  region: slice,
+                  sample_rate: float = 30,
+                  kernel_size: int = 19,
+                  cutoff: float = 1,
+                  transition_width: float = 5,
+                  attenuation: float = 60,
+                  ) -> ndarray:
+    """
+    smooth_stack(data)[..., region], computed on the region and its margins only (same values).
+    :param region: positional slice of the points to return (e.g. the ROI, see region_slice)
+    """
+    data = np.asarray(data, dtype=np.float64)
+    start, stop, _ = region.indices(data.shape[-1])
+    stop = max(start, stop)
+    before, after = smoothing_margin(kernel_size, len(fir_taps(cutoff, sample_rate, transition_width, attenuation)))
+    # at the start and end of the run the filters see their zero padding as before
+    crop_start, crop_stop = max(0, start - before), min(data.shape[-1], stop + after)
+    smoothed = smooth_stack(data[..., crop_start:crop_stop],
+                            sample_rate=sample_rate,
+                            kernel_size=kernel_size,
+                            cutoff=cutoff,
+                            transition_width=transition_width,
+                            attenuation=attenuation)
+    return smoothed[..., start - crop_start:stop - crop_start]
@@ -0,0 +1,88 @@
+"""
+timing of the chromatogram processing stages
+each chromatogram keeps a processing record {stage: {"wall_time": s, "n_points": n}} (DadChromatogram._processing);
+the records of all runs in the process are collected in StageStats to see where the analysis time goes.
+"""
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+import pandas as pd
+
+STAGES = ("read", "bg_sub", "smoothed", "baseline", "peaks_detected", "integration", "plot")
+
+
+def new_processing_record() -> dict[str, dict | None]:
+    """empty record, None: stage not run"""
+    return {stage: None for stage in STAGES}
+
+
+@contextmanager
+def timed_stage(processing: dict[str, dict | None],
+                stage: str,
+                n_points: int | None = None) -> Iterator[dict]:
+    """
+    measure the wall time of the block and keep it in processing[stage].
+    a stage run twice (e.g. peak finding before and after the baseline correction) is summed.
+    the yielded entry can be used to set n_points when it is known at the end of the block.
+    """
+    entry = {"wall_time": 0.0, "n_points": n_points}
+    start = time.perf_counter()
+    try:
+        yield entry
+    finally:
+        entry["wall_time"] = time.perf_counter() - start
+        previous = processing.get(stage)
+        if previous is not None:
+            entry["wall_time"] += previous["wall_time"]
+            entry["n_points"] = entry["n_points"] or previous["n_points"]
+        processing[stage] = entry
+
+
+def total_time(processing: dict[str, dict | None]) -> float:
+    return sum(entry["wall_time"] for entry in processing.values() if entry is not None)
+
+
+class StageStats:
+    """aggregated stage timings of all processed chromatograms"""
+
+    def __init__(self):
+        self._stats: dict[str, dict[str, float]] = {}
+        self.runs = 0
+
+    def add(self, processing: dict[str, dict | None]):
+        self.runs += 1
+        for stage, entry in processing.items():
+            if entry is None:
+                continue
+            stats = self._stats.setdefault(stage, {"count": 0, "total": 0.0, "max": 0.0, "n_points": 0})
+            stats["count"] += 1
+            stats["total"] += entry["wall_time"]
+            stats["max"] = max(stats["max"], entry["wall_time"])
+            stats["n_points"] += entry["n_points"] or 0
+
+    def summary(self) -> pd.DataFrame:
+        """one row per stage: count, total/mean/max wall time (s), mean number of points and share of the total time"""
+        table = pd.DataFrame.from_dict(self._stats, orient="index",
+                                       columns=["count", "total", "max", "n_points"])
+        table = table.reindex([stage for stage in STAGES if stage in self._stats]
+                              + [stage for stage in self._stats if stage not in STAGES])
+        table["mean"] = table["total"] / table["count"]
+        table["n_points"] = table["n_points"] / table["count"]
+        table["share"] = table["total"] / table["total"].sum()
+        return table[["count", "total", "mean", "max", "n_points", "share"]]
+
+    def reset(self):
+        self._stats.clear()
+        self.runs = 0
+
+
+_stage_stats: StageStats | None = None
+
+
+def get_stage_stats() -> StageStats:
+    """shared stage statistics of the process"""
+    global _stage_stats
+    if _stage_stats is None:
+        _stage_stats = StageStats()
+    return _stage_stats
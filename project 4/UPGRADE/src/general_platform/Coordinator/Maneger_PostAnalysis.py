@@ -14,7 +14,7 @@ import math
 from BV_experiments.src.general_platform import IncompleteAnalysis, DatabaseError
 from BV_experiments.src.general_platform.Analysis import FileWatch
 from BV_experiments.src.general_platform.Librarian import DatabaseMongo
-from BV_experiments.src.general_platform.Analysis import DadChromatogram
+from BV_experiments.src.general_platform.Analysis import DadChromatogram, MultiChannelChromatogram
 from BV_experiments.src.general_platform.Librarian.db_models import ExperimentState
 
 
@@ -41,7 +41,17 @@ class PostAnalManeger:
         # {3.911666666666666: 18.718628756766925, 7.485: 70.24261115428475,
         # 7.903333333333332: 2.0332566029157366,
         # 8.59: 1.679635659626054, 9.26666666666667: 5.739512237518956}
-        return chrom.txt_to_peaks()
+        # the svg is drawn by a worker process, the peaks go straight to the parsing
+        return chrom.txt_to_peaks(render="background")
+
+    def all_channels_to_peaks(self,
+                              mongo_id: str | PydanticObjectId) -> dict:
+        """
+        peaks of all channels {channel: {rt: area}}, with one directory scan and one smoothing call
+        """
+        chroms = MultiChannelChromatogram(mongo_id,
+                                          self._base_exp_info.hplc_config_info)
+        return chroms.txt_to_peaks(render="background")
 
     def parse_exp_result(self,
                          raw_peak_dict: dict) -> dict | bool:
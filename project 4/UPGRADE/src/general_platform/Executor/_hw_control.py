@@ -1,4 +1,8 @@
+import asyncio
 import contextlib
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 from loguru import logger
@@ -87,3 +91,91 @@ def command_session():
     with requests.Session() as session:
         session.hooks["response"] = [log_responses, check_for_errors]
         yield session
+
+
+class AsyncCommandSession:
+    """
+    command_session for coroutines: the requests run in a small pool of threads with one requests.Session each
+    (the connections are kept open), so a slow reply does not stall the other coroutines of the event loop.
+    same hooks as command_session (log the reply, raise for an error status).
+    """
+
+    def __init__(self,
+                 timeout: float | tuple[float, float] = (3.05, 60),
+                 max_workers: int = 4):
+        """
+        :param timeout: seconds to connect and to wait for the reply (requests timeout), per request
+        :param max_workers: requests in flight at the same time
+        """
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="command_session")
+        self._local = threading.local()
+        self._sessions: list[requests.Session] = []
+        self._lock = threading.Lock()
+
+    def _session(self) -> requests.Session:
+        """session of the worker thread"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.hooks["response"] = [log_responses, check_for_errors]
+            self._local.session = session
+            with self._lock:
+                self._sessions.append(session)
+        return session
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        return self._session().request(method, url, **kwargs)
+
+    async def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(self._request, method, url, **kwargs))
+
+    async def get(self, url: str, **kwargs) -> requests.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def put(self, url: str, **kwargs) -> requests.Response:
+        return await self.request("PUT", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> requests.Response:
+        return await self.request("POST", url, **kwargs)
+
+    def _close(self):
+        self._executor.shutdown(wait=True)
+        for session in self._sessions:
+            session.close()
+
+    async def aclose(self):
+        # waits for the requests in flight without blocking the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self._close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
+class FlowIRClient(AsyncCommandSession):
+    """async client of the flowir (ReactIR) endpoints"""
+
+    def __init__(self,
+                 endpoint: str = flowir_endpoint,
+                 timeout: float | tuple[float, float] = (3.05, 60),
+                 max_workers: int = 2):
+        super().__init__(timeout=timeout, max_workers=max_workers)
+        self.endpoint = endpoint
+
+    async def spectrum_count(self) -> int:
+        return (await self.get(self.endpoint + "/ir-control/spectrum-count")).json()
+
+    async def acquire_spectrum(self, treated: bool = True) -> dict:
+        """:return: {"wavenumber": [...], "intensity": [...]}"""
+        reply = await self.put(self.endpoint + f"/ir-control/acquire-spectrum?treated={str(treated).lower()}")
+        return reply.json()
+
+    async def acquire(self, treated: bool = True) -> tuple[int, dict]:
+        """spectrum count and spectrum; the count is read before the acquisition (as with command_session)"""
+        count = await self.spectrum_count()
+        return count, await self.acquire_spectrum(treated)
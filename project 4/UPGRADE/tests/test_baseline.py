@@ -0,0 +1,76 @@
+"""
+batched modpoly baseline against pybaselines.polynomial.modpoly, which it replaced
+(run from the folder holding BV_experiments: python -m pytest BV_experiments/tests)
+"""
+import numpy as np
+import pybaselines
+import pytest
+from scipy import stats
+
+from BV_experiments.src.general_platform.Analysis.anal_baseline import modpoly_baseline
+
+TIME = np.round(np.arange(1.5, 13.5, 1 / 600), 6)  # ROI grid of a 10 Hz DAD run
+
+
+def chromatogram(rng: np.random.Generator, time: np.ndarray = TIME, n_peaks: int = 8) -> np.ndarray:
+    """drifting baseline, gaussian peaks and noise"""
+    signal = np.polynomial.polynomial.polyval(time - time.mean(), rng.normal(0, [1, 0.3, 0.05, 0.005]))
+    for rt in rng.uniform(time[0], time[-1], n_peaks):
+        signal += rng.uniform(0.5, 10) * stats.norm.pdf(time, loc=rt, scale=rng.uniform(0.02, 0.06))
+    return signal + rng.normal(0, 0.02, time.size)
+
+
+def peak_weights(rng: np.random.Generator, n: int, n_masked: int = 10) -> np.ndarray:
+    """0 in a few random windows (the peaks), 1 elsewhere"""
+    weights = np.ones(n)
+    for start in rng.integers(0, n - 60, n_masked):
+        weights[start:start + rng.integers(10, 60)] = 0
+    return weights
+
+
+def reference(data, time, weights=None, poly_order=3, tol=1e-3, max_iter=250):
+    return pybaselines.polynomial.modpoly(data, time, poly_order=poly_order, tol=tol, max_iter=max_iter,
+                                          weights=weights)[0]
+
+
+@pytest.mark.parametrize("poly_order", [1, 3, 5])
+@pytest.mark.parametrize("with_weights", [False, True])
+def test_single_chromatogram(poly_order, with_weights):
+    rng = np.random.default_rng(poly_order)
+    for _ in range(5):
+        data = chromatogram(rng)
+        weights = peak_weights(rng, data.size) if with_weights else None
+        np.testing.assert_allclose(modpoly_baseline(data, TIME, poly_order=poly_order, weights=weights),
+                                   reference(data, TIME, weights, poly_order), rtol=1e-8, atol=1e-8)
+
+
+@pytest.mark.parametrize("tol, max_iter", [(1e-3, 250), (1e-6, 1000), (1e-3, 3)])
+def test_stack_fits_each_chromatogram_as_pybaselines(tol, max_iter):
+    rng = np.random.default_rng(1)
+    stack = np.array([chromatogram(rng) for _ in range(12)])
+    weights = np.array([peak_weights(rng, TIME.size) for _ in range(12)])
+    baselines = modpoly_baseline(stack, TIME, weights=weights, tol=tol, max_iter=max_iter)
+    assert baselines.shape == stack.shape
+    for data, row_weights, baseline in zip(stack, weights, baselines):
+        np.testing.assert_allclose(baseline, reference(data, TIME, row_weights, tol=tol, max_iter=max_iter),
+                                   rtol=1e-8, atol=1e-8)
+
+
+def test_too_few_baseline_points_falls_back_to_pybaselines():
+    rng = np.random.default_rng(2)
+    stack = np.array([chromatogram(rng) for _ in range(3)])
+    weights = np.ones_like(stack)
+    weights[1] = 0
+    weights[1, [10, 3000]] = 1  # 2 points for a 3rd order polynomial
+    baselines = modpoly_baseline(stack, TIME, weights=weights)
+    for data, row_weights, baseline in zip(stack, weights, baselines):
+        np.testing.assert_allclose(baseline, reference(data, TIME, row_weights), rtol=1e-8, atol=1e-8)
+
+
+def test_chromatograms_on_different_grids():
+    rng = np.random.default_rng(3)
+    grids = [TIME, TIME[:-7], np.round(np.arange(1.5, 13.5, 1 / 300), 6)]
+    data = [chromatogram(rng, grid) for grid in grids]
+    baselines = modpoly_baseline(data, grids)
+    for grid, chrom, baseline in zip(grids, data, baselines):
+        np.testing.assert_allclose(baseline, reference(chrom, grid), rtol=1e-8, atol=1e-8)
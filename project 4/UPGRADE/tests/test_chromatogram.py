@@ -0,0 +1,77 @@
+"""
+Chromatogram against the peak tables of the DataFrame implementation it replaced
+(run from the folder holding BV_experiments: python -m pytest BV_experiments/tests)
+
+data/chromatogram_reference.json: the peak tables of the former Chromatogram (per-peak boundary loop on a DataFrame) on
+the synthetic runs of anal_benchmark (seed 1, runs 0-2 of the small, typical and dense method), keyed
+"<case>_<run>_<full|roi>".
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from BV_experiments.src.general_platform.Analysis.anal_benchmark import CASES, SyntheticMethod
+from BV_experiments.src.general_platform.Analysis.anal_Chromatogram import Chromatogram
+from BV_experiments.src.general_platform.Analysis.anal_clarity_reader import read_clarity_ascii
+
+REFERENCE = json.loads((Path(__file__).parent / "data" / "chromatogram_reference.json").read_text())
+N_RUNS = 3
+
+
+@pytest.fixture(scope="module")
+def synthetic_runs(tmp_path_factory) -> dict[str, tuple[pd.DataFrame, list]]:
+    """{"<case>_<run>": (export as DataFrame, roi of the method)}"""
+    folder = tmp_path_factory.mktemp("chromatograms")
+    runs = {}
+    for case in ("small", "typical", "dense"):
+        method = SyntheticMethod(folder, case, seed=1, **CASES[case])
+        for run in range(N_RUNS):
+            file_path, _ = method.make_run(run)
+            export = read_clarity_ascii(file_path)
+            runs[f"{case}_{run}"] = (pd.DataFrame({"time (min.)": np.array(export.time),
+                                                   "Absorbance [mAu]": np.array(export.signal)}), method.roi)
+    return runs
+
+
+def assert_same_peaks(chrom: Chromatogram, expected: dict):
+    table = chrom.return_peak_table()
+    assert table.index.tolist() == expected["index"]
+    np.testing.assert_allclose(table.to_numpy(), expected["peaks"], rtol=1e-7, atol=1e-9)
+    bounds = np.column_stack([chrom.peaks["lower"], chrom.peaks["upper"], chrom.peaks["width"]])
+    np.testing.assert_allclose(bounds, expected["bounds"], rtol=1e-7, atol=1e-9)
+
+
+@pytest.mark.parametrize("key", sorted(REFERENCE))
+def test_peak_table_matches_former_implementation(synthetic_runs, key):
+    case, run, region = key.rsplit("_", 2)
+    frame, roi = synthetic_runs[f"{case}_{run}"]
+    chrom = Chromatogram(frame, "Absorbance [mAu]", "time (min.)",
+                         region_of_interest=roi if region == "roi" else None)
+    chrom.process_chromatogram(detector_frequency=10)
+    assert_same_peaks(chrom, REFERENCE[key])
+
+
+def test_from_arrays_matches_dataframe(synthetic_runs):
+    frame, roi = synthetic_runs["typical_0"]
+    chrom = Chromatogram.from_arrays(frame["time (min.)"].to_numpy(), frame["Absorbance [mAu]"].to_numpy(),
+                                     region_of_interest=roi)
+    chrom.process_chromatogram(detector_frequency=10)
+    assert_same_peaks(chrom, REFERENCE["typical_0_roi"])
+
+
+def test_input_frame_is_not_modified(synthetic_runs):
+    frame, roi = synthetic_runs["small_0"]
+    before = frame.copy()
+    Chromatogram(frame, "Absorbance [mAu]", "time (min.)", region_of_interest=roi).process_chromatogram(
+        detector_frequency=10)
+    pd.testing.assert_frame_equal(frame, before)
+
+
+def test_derivative_follows_the_baseline_correction(synthetic_runs):
+    frame, roi = synthetic_runs["typical_0"]
+    chrom = Chromatogram(frame, "Absorbance [mAu]", "time (min.)", region_of_interest=roi)
+    chrom.process_chromatogram(detector_frequency=10)
+    np.testing.assert_array_equal(chrom.derivative, np.append(np.diff(chrom.mod_signal), 0))
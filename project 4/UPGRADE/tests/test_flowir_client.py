@@ -0,0 +1,108 @@
+"""
+FlowIRClient against a fake flowir server (run from the folder holding BV_experiments: python -m pytest BV_experiments/tests)
+"""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from BV_experiments.src.general_platform.Executor._hw_control import FlowIRClient
+
+N_POINTS = 900
+REPLY_DELAY = 0.2  # seconds the fake instrument takes for each reply
+
+
+class FakeFlowIR(BaseHTTPRequestHandler):
+    """the flowir endpoints: the spectrum count goes up with every acquired spectrum"""
+    protocol_version = "HTTP/1.1"
+    count = 0
+    calls: list[tuple[str, float, float]] = []  # (method, start, end)
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, content):
+        start = time.perf_counter()
+        time.sleep(REPLY_DELAY)
+        if self.command == "PUT":
+            type(self).count += 1
+        body = json.dumps(content() if callable(content) else content).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.calls.append((self.command, start, time.perf_counter()))
+
+    def do_GET(self):
+        if self.path == "/flowir/ir-control/spectrum-count":
+            self._reply(lambda: type(self).count)
+        else:
+            self.send_error(404)
+
+    def do_PUT(self):
+        if self.path.startswith("/flowir/ir-control/acquire-spectrum"):
+            self._reply({"wavenumber": list(range(N_POINTS)), "intensity": [0.1] * N_POINTS})
+        else:
+            self.send_error(404)
+
+
+@pytest.fixture
+def flowir_endpoint():
+    FakeFlowIR.count, FakeFlowIR.calls = 0, []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeFlowIR)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/flowir"
+    server.shutdown()
+    server.server_close()
+
+
+def test_acquire_reads_the_count_before_the_acquisition(flowir_endpoint):
+    async def acquire_twice():
+        async with FlowIRClient(flowir_endpoint) as flowir:
+            return [await flowir.acquire() for _ in range(2)]
+
+    (count_1, spc), (count_2, _) = asyncio.run(acquire_twice())
+    assert (count_1, count_2) == (0, 1)
+    assert len(spc["intensity"]) == N_POINTS
+    assert [method for method, _, _ in FakeFlowIR.calls] == ["GET", "PUT", "GET", "PUT"]
+    # the acquisition starts after the count was replied
+    (_, _, count_end), (_, put_start, _) = FakeFlowIR.calls[:2]
+    assert count_end <= put_start
+
+
+def test_acquire_does_not_block_the_event_loop(flowir_endpoint):
+    async def acquire_while_ticking():
+        gaps, done = [], asyncio.Event()
+
+        async def ticker():
+            last = time.perf_counter()
+            while not done.is_set():
+                await asyncio.sleep(0.01)
+                now = time.perf_counter()
+                gaps.append(now - last)
+                last = now
+
+        task = asyncio.create_task(ticker())
+        async with FlowIRClient(flowir_endpoint) as flowir:
+            await flowir.acquire()
+        done.set()
+        await task
+        return gaps
+
+    gaps = asyncio.run(acquire_while_ticking())
+    assert max(gaps) < REPLY_DELAY
+
+
+def test_reply_later_than_the_timeout_raises(flowir_endpoint):
+    async def acquire():
+        async with FlowIRClient(flowir_endpoint, timeout=(1, REPLY_DELAY / 4)) as flowir:
+            return await flowir.acquire()
+
+    with pytest.raises(requests.exceptions.Timeout):
+        asyncio.run(acquire())
@@ -0,0 +1,158 @@
+"""
+PeakAlignment against the loops it replaced (run from the folder holding BV_experiments: python -m pytest BV_experiments/tests)
+"""
+import numpy as np
+import pytest
+
+from BV_experiments.src.general_platform.Analysis.anal_hplc_result import PeakAlignment, RetentionTimeIndex
+
+CONFIG = {
+    "HPLC_RUNTIME": 15,
+    "ACQUISITION": {"wavelength": {"channel_1": "254"}, "sampling_frequency": "10 Hz"},
+    "PEAK_RT": {"is": 3.81, "product": 6.9, "side-product": 8.28, "sm": 8.64},
+    "PEAK_RT_2": {},
+    "ACCEPTED_SHIFT": 0.22,
+}
+
+
+def reference_peak_finder(peaks: dict, check_peak_rt: float, int_shift=None, max_shift=0.9, step=0.05):
+    """the stepping loop of peak_finder before the rewrite"""
+    shift = int_shift if int_shift is not None else step
+    while shift <= max_shift:
+        found = [rt for rt in peaks if check_peak_rt - shift < rt < check_peak_rt + shift]
+        if len(found) == 1:
+            return found[0]
+        shift += step
+    return False
+
+
+def reference_align(raw_peak_dict: dict, new_rt: dict, shift_levels: list) -> dict:
+    """the window loop of align before the rewrite (without the shift finding)"""
+    ali_peaks = {key: 0 for key in new_rt}
+    for peak_name, expected_rt in new_rt.items():
+        assigned = False
+        final_candidates = []
+        for shift in shift_levels:
+            rt_min = expected_rt - shift
+            rt_max = expected_rt + shift
+            candidates = [(float(rt), intensity) for rt, intensity in raw_peak_dict.items()
+                          if rt_min <= float(rt) <= rt_max]
+            if len(candidates) == 1:
+                ali_peaks[peak_name] = candidates[0][1]
+                assigned = True
+                break
+            elif len(candidates) > 1:
+                final_candidates = candidates
+        if not assigned and final_candidates:
+            ali_peaks[peak_name] = max(final_candidates, key=lambda x: x[1])[1]
+    return ali_peaks
+
+
+def random_peaks(rng: np.random.Generator, n: int) -> dict[float, float]:
+    rts = np.round(rng.uniform(2, 12, n), rng.choice([2, 3, 6]))
+    return {float(rt): float(area) for rt, area in zip(rts, rng.uniform(0.1, 50, n))}
+
+
+def crowded_peaks(rng: np.random.Generator, peak_rt: dict, shift_levels: list) -> dict[float, float]:
+    """peaks around the expected ones, some exactly on a window edge, with tied areas"""
+    peaks = {}
+    for expected_rt in peak_rt.values():
+        for _ in range(int(rng.integers(0, 4))):
+            if rng.random() < 0.3:
+                rt = expected_rt + rng.choice([-1, 1]) * rng.choice(shift_levels)  # on the edge of a window
+            else:
+                rt = expected_rt + rng.uniform(-0.5, 0.5)
+            peaks[float(rt)] = float(rng.choice([1.0, 2.0, 5.0]))  # ties of the highest area
+    return peaks
+
+
+def test_peak_finder_matches_stepping_loop():
+    rng = np.random.default_rng(0)
+    alignment = PeakAlignment({}, CONFIG)
+    for _ in range(3000):
+        peaks = random_peaks(rng, int(rng.integers(0, 12)))
+        target = float(np.round(rng.uniform(2, 12), 2))
+        int_shift = rng.choice([None, 0.25])
+        found = alignment.peak_finder(peaks, target, int_shift=int_shift)
+        expected = reference_peak_finder(peaks, target, int_shift=int_shift)
+        assert (found[0] if found else False) == expected
+
+
+def test_neighbour_of_missing_is_does_not_shift_the_table():
+    # the IS is too small to be among the top peaks, a large peak 0.6 min later is
+    peaks = {3.81: 0.5, 4.41: 40.0, 6.9: 20.0, 8.28: 10.0, 8.64: 12.0, 10.5: 30.0}
+    alignment = PeakAlignment(peaks, CONFIG)
+    aligned = alignment.align()
+    assert alignment.found_shift == 0
+    assert aligned == {"is": 0.5, "product": 20.0, "side-product": 10.0, "sm": 12.0}
+
+
+@pytest.mark.parametrize("shift", [-0.15, 0.0, 0.1, 0.2])
+def test_shift_of_the_is_within_accepted_shift_is_applied(shift):
+    peaks = {rt + shift: area for rt, area in {3.81: 30.0, 6.9: 20.0, 8.28: 10.0, 8.64: 12.0}.items()}
+    alignment = PeakAlignment(peaks, CONFIG)
+    aligned = alignment.align()
+    assert alignment.found_shift == pytest.approx(shift)
+    assert aligned == {"is": 30.0, "product": 20.0, "side-product": 10.0, "sm": 12.0}
+
+
+@pytest.mark.parametrize("shift_levels", [[0.35, 0.22, 0.15, 0.1, 0.05, 0.0], [0.3, 0.1], [0.0]])
+def test_align_windows_match_the_former_loop(shift_levels):
+    rng = np.random.default_rng(1)
+    for _ in range(2000):
+        peaks = crowded_peaks(rng, CONFIG["PEAK_RT"], shift_levels)
+        if rng.random() < 0.3:
+            peaks.update(random_peaks(rng, int(rng.integers(0, 6))))
+        aligned = PeakAlignment(peaks, CONFIG).align(shift_levels=shift_levels, checked_shift_peak=None)
+        assert aligned == reference_align(peaks, CONFIG["PEAK_RT"], shift_levels)
+
+
+def test_align_without_peaks():
+    aligned = PeakAlignment({}, CONFIG).align(checked_shift_peak=None)
+    assert aligned == {name: 0 for name in CONFIG["PEAK_RT"]}
+
+
+def test_retention_time_index_windows_and_nearest():
+    rng = np.random.default_rng(2)
+    for _ in range(500):
+        peaks = random_peaks(rng, int(rng.integers(1, 15)))
+        index = RetentionTimeIndex(peaks)
+        rts = list(peaks)
+        rt_min = rng.uniform(1, 12, 5)
+        rt_max = rt_min + rng.choice([0.0, 0.1, 1.0], 5)
+        # windows on existing retention times: closed and open edges
+        rt_min[:2] = rng.choice(rts, 2)
+        for closed in (True, False):
+            starts, ends = index.windows(rt_min, rt_max, closed=closed)
+            for low, high, start, end in zip(rt_min, rt_max, starts, ends):
+                inside = [rt for rt in rts if (low <= rt <= high if closed else low < rt < high)]
+                assert sorted(index.rt[start:end].tolist()) == sorted(inside)
+        target = float(rng.uniform(1, 13))
+        nearest = index.nearest(target, k=2)
+        assert [distance for _, distance in nearest] == sorted(abs(rt - target) for rt in rts)[:2]
+
+
+@pytest.mark.parametrize("shift", [-0.2, -0.05, 0.0, 0.12])
+def test_xcorr_shift_with_a_missing_peak(shift):
+    # the side-product is missing, an unknown peak is extra
+    peaks = {rt + shift: area for rt, area in {3.81: 30.0, 6.9: 20.0, 8.64: 12.0, 11.1: 8.0}.items()}
+    alignment = PeakAlignment(peaks, CONFIG)
+    aligned = alignment.align(shift_method="xcorr")
+    assert alignment.found_shift == pytest.approx(shift, abs=0.002)
+    assert aligned == {"is": 30.0, "product": 20.0, "side-product": 0, "sm": 12.0}
+
+
+@pytest.mark.parametrize("peaks", [{12.0: 5.0}, {1.0: 5.0, 12.0: 3.0, 14.2: 1.0}])
+def test_xcorr_without_common_peak_does_not_shift(peaks):
+    alignment = PeakAlignment(peaks, CONFIG)
+    alignment.align(shift_method="xcorr")
+    assert alignment.found_shift == 0
+    assert alignment.new_rt == CONFIG["PEAK_RT"]
+
+
+def test_xcorr_shift_larger_than_accepted_shift_is_not_applied():
+    # within the searched range (0.3 min) but beyond ACCEPTED_SHIFT (0.22 min)
+    peaks = {rt + 0.27: area for rt, area in {3.81: 30.0, 6.9: 20.0, 8.28: 10.0, 8.64: 12.0}.items()}
+    alignment = PeakAlignment(peaks, CONFIG)
+    alignment.align(shift_method="xcorr")
+    assert alignment.found_shift == 0
@@ -0,0 +1,49 @@
+"""
+retention time shift by cross-correlation (anal_shift)
+(run from the folder holding BV_experiments: python -m pytest BV_experiments/tests)
+"""
+import numpy as np
+import pytest
+from scipy import stats
+
+from BV_experiments.src.general_platform.Analysis.anal_shift import (estimate_pattern_shift, estimate_shift,
+                                                                      peak_pattern)
+
+TIME = np.arange(0, 10, 1 / 600)  # 10 Hz, min
+
+
+def chromatogram(shift: float = 0.0, rts=(2.0, 4.5, 6.1, 8.0)) -> np.ndarray:
+    return sum(stats.norm.pdf(TIME, loc=rt + shift, scale=0.03) for rt in rts) + 0.01 * TIME
+
+
+@pytest.mark.parametrize("shift_points", [-37.0, -2.5, 0.0, 0.4, 12.0])
+def test_estimate_shift_of_a_moved_chromatogram(shift_points):
+    shift = estimate_shift(chromatogram(), chromatogram(shift_points / 600), max_lag=60)
+    assert shift == pytest.approx(shift_points, abs=0.1)
+
+
+def test_estimate_shift_of_a_stack():
+    shifts = np.array([-20.0, 0.0, 7.5])
+    reference = np.array([chromatogram()] * 3)
+    signal = np.array([chromatogram(shift / 600) for shift in shifts])
+    np.testing.assert_allclose(estimate_shift(reference, signal, max_lag=60), shifts, atol=0.1)
+
+
+def test_estimate_shift_is_limited_to_max_lag():
+    # moved further than searched: the best match is at the limit
+    assert abs(estimate_shift(chromatogram(), chromatogram(100 / 600), max_lag=30)) == 30
+
+
+def test_peak_pattern_keeps_the_position_between_grid_points():
+    grid = np.arange(0, 1, 0.01)
+    pattern = peak_pattern(np.array([0.503]), grid, width=0.02)
+    assert np.sum(pattern * grid) / np.sum(pattern) == pytest.approx(0.503, abs=1e-4)
+    # retention times outside the grid are left out
+    assert not peak_pattern(np.array([-1.0, 2.0]), grid, width=0.02).any()
+
+
+@pytest.mark.parametrize("shift", [-0.25, -0.031, 0.0, 0.1])
+def test_estimate_pattern_shift_with_missing_and_extra_peaks(shift):
+    expected = np.array([3.81, 6.9, 8.28, 8.64])
+    found = np.array([3.81, 6.9, 8.64, 10.2]) + shift  # 8.28 missing, 10.2 extra
+    assert estimate_pattern_shift(expected, found, max_shift=0.3) == pytest.approx(shift, abs=0.002)